@@ -1,4 +1,5 @@
 # endpoints/dependencies.py
+from asgiref.sync import sync_to_async
 from django.http import HttpRequest
 from ninja.security import HttpBearer
 from ninja_jwt.tokens import Token, AccessToken
@@ -16,6 +17,30 @@ class AuthBearer(HttpBearer):
         except Exception:
             raise HttpError(401, "Invalid or expired token")
 
+class AsyncAuthBearer(AuthBearer):
+    """
+    AuthBearer для async-эндпоинтов (поток событий): запрос к БД уходит в sync_to_async.
+    Браузерный EventSource не умеет заголовки, поэтому вместо JWT принимается ?ticket= -
+    короткоживущий билет из POST /api/events/ticket (сам токен в URL не передается)
+    """
+    def __call__(self, request: HttpRequest):
+        if not request.headers.get(self.header) and request.GET.get('ticket'):
+            return self.authenticate_ticket(request, request.GET['ticket'])
+        return super().__call__(request)
+
+    async def authenticate(self, request: HttpRequest, token: str):
+        return await sync_to_async(AuthBearer.authenticate)(self, request, token)
+
+    async def authenticate_ticket(self, request: HttpRequest, ticket: str):
+        from back.services.event_bus_service import EventService
+
+        user_id = EventService.ticket_user_id(ticket)
+        user = await User.objects.filter(id=user_id).afirst() if user_id is not None else None
+        if user is None:
+            raise HttpError(401, "Invalid or expired ticket")
+        request.user = user
+        return user
+
 # Дополнительные зависимости
 def get_current_user(request):
     """Зависимость для получения текущего пользователя"""
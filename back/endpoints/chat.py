@@ -12,9 +12,10 @@ def send_chat_message(request, repair_request_id: int, data: ChatMessageSchemaIn
     return ChatService.send_message(repair_request_id, data.message, request.user)
 
 @router.get("/request/{repair_request_id}", response=list[ChatMessageSchemaOut])
-def get_chat_messages(request, repair_request_id: int):
-    """Get chat messages for repair request"""
-    return ChatService.get_chat_messages(repair_request_id, request.user)
+def get_chat_messages(request, repair_request_id: int, since_id: int = None, before_id: int = None,
+                      limit: int = ChatService.DEFAULT_PAGE_SIZE):
+    """Get chat messages for repair request: newer than since_id or older than before_id, at most limit"""
+    return ChatService.get_chat_messages(repair_request_id, request.user, since_id, before_id, limit)
 
 @router.post("/request/{repair_request_id}/read", response=dict)
 def mark_chat_as_read(request, repair_request_id: int):
@@ -0,0 +1,28 @@
+# Поток событий в реальном времени (Server-Sent Events)
+from django.http import StreamingHttpResponse
+from ninja import Router
+
+from back.dependencies import AsyncAuthBearer
+from back.services.event_bus_service import EventService
+
+router = Router(tags=["Events"])
+
+
+@router.post("/ticket", response=dict)
+def issue_stream_ticket(request):
+    """Короткоживущий билет для подключения EventSource: /api/events/stream?ticket=..."""
+    return EventService.issue_ticket(request.user)
+
+
+@router.get("/stream", auth=AsyncAuthBearer())
+async def event_stream(request):
+    """
+    Новые сообщения чата и уведомления текущего пользователя (text/event-stream).
+    Работает только под ASGI (uvicorn/daphne core.asgi:application); соединение держит корутина, а не поток
+    """
+    subscription = EventService.bus.subscribe(request.auth.id)
+    response = StreamingHttpResponse(EventService.stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,10 +1,14 @@
+from django.conf import settings
 from ninja import Router
+from ninja.errors import HttpError
 from typing import List, Optional
 from back.schemas import (
     LocationSchema, LocationUpdateSchema, NearbyWorkersResponse,
-    PartsShopSchema, GeocodeResponse, LocationResponse, Message
+    PartsShopSchema, GeocodeResponse, LocationResponse, Message, RouteSchema
 )
 from back.services.geolocation_service import LocationService
+from back.services.route_service import RouteService
+from back.services.service_area_service import ServiceAreaService
 from back.dependencies import customer_required, worker_required
 
 router = Router(tags=["Geolocation"])
@@ -23,10 +27,13 @@ def get_my_location(request):
 
 
 @router.get("/workers/nearby", response=List[NearbyWorkersResponse])
-def get_nearby_workers(request, address: str, max_distance: int = 10):
+def get_nearby_workers(request, address: str, max_distance: int = 10, limit: Optional[int] = None):
     """Найти работников поблизости"""
     from back.services.geolocation_service import DGisService
 
+    if limit is not None and limit < 1:
+        raise HttpError(400, "limit must be at least 1")
+
     dgis = DGisService()
     geocode_result = dgis.geocode_address(address)
 
@@ -36,31 +43,37 @@ def get_nearby_workers(request, address: str, max_distance: int = 10):
     return LocationService.find_nearby_workers(
         geocode_result['latitude'],
         geocode_result['longitude'],
-        max_distance
+        max_distance,
+        limit
     )
 
 
 @router.get("/shops/parts/nearby", response=List[PartsShopSchema])
-def get_nearby_parts_shops(request, lat: float, lon: float, part_name: Optional[str] = None):
-    """Найти магазины запчастей поблизости"""
-    return LocationService.search_nearby_parts_shops(lat, lon, part_name)
+def get_nearby_parts_shops(request, lat: float, lon: float, part_name: Optional[str] = None, radius: int = 5000):
+    """Найти магазины запчастей поблизости (radius в метрах)"""
+    return LocationService.search_nearby_parts_shops(lat, lon, part_name, radius)
+
+
+@router.get("/route/me", response=RouteSchema)
+def get_my_route(request, lat: Optional[float] = None, lon: Optional[float] = None,
+                 time_budget_ms: Optional[int] = None):
+    """Порядок объезда заявок, где принят мой отклик (старт - lat/lon или моя локация)"""
+    worker = worker_required(request)
+    return RouteService.plan_worker_route(worker, lat, lon, time_budget_ms)
 
 
 @router.post("/workers/{worker_id}/service-area", response=Message)
 def add_service_area(request, worker_id: int, city: str, radius_km: int = 10):
     """Добавить зону обслуживания для работника"""
-    from back.models.geolocation_models import ServiceArea
     from django.contrib.auth.models import User
 
     worker = User.objects.get(id=worker_id)
     if worker != request.user and not request.user.is_staff:
         return 403, {"message": "Permission denied"}
+    if not 1 <= radius_km <= settings.SERVICE_AREA_MAX_RADIUS_KM:
+        raise HttpError(400, f"radius_km must be between 1 and {settings.SERVICE_AREA_MAX_RADIUS_KM}")
 
-    ServiceArea.objects.create(
-        worker=worker,
-        city=city,
-        radius_km=radius_km
-    )
+    ServiceAreaService.add_service_area(worker, city, radius_km)
 
     return {"message": "Service area added successfully"}
 
@@ -68,11 +81,6 @@ def add_service_area(request, worker_id: int, city: str, radius_km: int = 10):
 @router.delete("/location/me", response=Message)
 def delete_my_location(request):
     """Удалить мою локацию"""
-    from back.models.geolocation_models import UserLocation
-
-    try:
-        user_location = UserLocation.objects.get(user=request.user)
-        user_location.delete()
+    if LocationService.delete_user_location(request.user):
         return {"message": "Location deleted successfully"}
-    except UserLocation.DoesNotExist:
-        return {"message": "Location not found"}
\ No newline at end of file
+    return {"message": "Location not found"}
\ No newline at end of file
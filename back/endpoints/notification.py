@@ -1,18 +1,23 @@
 from ninja import Router
+from back.schemas import NotificationPageSchema, NotificationIdsSchema
 from back.services import NotificationService
 
 router = Router(tags=["Notifications"])
 
-@router.get("/", response=list[dict])
-def get_notifications(request):
-    notifications = NotificationService.get_user_notifications(request.user)
-    return [{
-        'id': n.id,
-        'message': n.message,
-        'is_read': n.is_read,
-        'created_at': n.created_at,
-        'type': n.notification_type
-    } for n in notifications]
+@router.get("/", response=NotificationPageSchema)
+def get_notifications(request, cursor: str = None, limit: int = 20, unread_only: bool = False):
+    """Notifications newest first, one page per call; pass next_cursor to get the next page"""
+    return NotificationService.get_notifications_page(request.user, cursor, limit, unread_only)
+
+@router.post("/read-all", response=dict)
+def mark_all_notifications_read(request):
+    updated = NotificationService.mark_many_as_read(request.user)
+    return {"message": "Notifications marked as read", "updated": updated}
+
+@router.post("/read", response=dict)
+def mark_notifications_read(request, data: NotificationIdsSchema):
+    updated = NotificationService.mark_many_as_read(request.user, data.ids)
+    return {"message": "Notifications marked as read", "updated": updated}
 
 @router.post("/{notification_id}/read", response=dict)
 def mark_notification_read(request, notification_id: int):
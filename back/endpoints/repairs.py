@@ -2,35 +2,48 @@ from typing import Optional, List
 
 from ninja import Router, UploadedFile, File, Form
 from back.services import RepairRequestService
-from back.schemas import RepairRequestSchemaIn, RepairRequestSchemaOut
-from ..dependencies import customer_required
+from back.schemas import RepairRequestSchemaIn, RepairRequestSchemaOut, RepairRequestPageSchema, RepairMapSchema
+from back.services.repair_map_service import RepairMapService
+from ..dependencies import customer_required, worker_required
 
 router = Router(tags=["Repairs"])
 
-@router.get("/", response=list[RepairRequestSchemaOut], auth=None)
-def list_repair_requests(request):
-    """Получить все заявки на ремонт"""
-    return RepairRequestService.get_all_requests()
-@router.get("/search", response=list[RepairRequestSchemaOut], auth=None)
-def search_repair_requests(request, search: str = None, device_type: str = None, status: str = None):
-    """Поиск заявок по ключевым словам, типу устройства и статусу"""
-    return RepairRequestService.search_requests(search, device_type, status)
+@router.get("/", response=RepairRequestPageSchema, auth=None)
+def list_repair_requests(request, cursor: str = None, limit: int = 20):
+    """Получить заявки на ремонт (постранично, по курсору)"""
+    return RepairRequestService.cached_requests_page(cursor, limit)
+@router.get("/search", response=RepairRequestPageSchema, auth=None)
+def search_repair_requests(request, search: str = None, device_type: str = None, status: str = None,
+                           cursor: str = None, limit: int = 20, order: str = None):
+    """Поиск заявок по ключевым словам, типу устройства и статусу; order: relevance (по умолчанию при search) или newest"""
+    return RepairRequestService.cached_search_page(search, device_type, status, cursor, limit, order)
 
 @router.get("/filters", response=dict, auth=None)
 def get_available_filters(request):
     """Получить доступные фильтры для заявок"""
-    return RepairRequestService.get_available_filters()
+    return RepairRequestService.cached_available_filters()
+
+@router.get("/map", response=RepairMapSchema, auth=None)
+def get_repairs_map(request, min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int):
+    """Кластеры открытых заявок в видимой области карты"""
+    return RepairMapService.get_clusters(min_lat, min_lon, max_lat, max_lon, zoom)
+
+@router.get("/feed", response=RepairRequestPageSchema)
+def get_repairs_feed(request, cursor: str = None, limit: int = 20):
+    """Лента открытых заявок для работника: ближе, по специализации и свежие - выше"""
+    worker = worker_required(request)
+    return RepairRequestService.get_feed_page(worker, cursor, limit)
 
 
 @router.get("/{request_id}", response=RepairRequestSchemaOut, auth=None)
 def get_repair_request(request, request_id: int):
     """Получить конкретную заявку по ID"""
-    return RepairRequestService.get_request_by_id(request_id)
+    return RepairRequestService.cached_request_by_id(request_id)
 
-@router.get("/my/requests", response=list[RepairRequestSchemaOut])
-def get_my_requests(request):
-    """Получить все заявки текущего пользователя"""
-    return RepairRequestService.get_user_requests(request.user)
+@router.get("/my/requests", response=RepairRequestPageSchema)
+def get_my_requests(request, cursor: str = None, limit: int = 20):
+    """Получить заявки текущего пользователя (постранично, по курсору)"""
+    return RepairRequestService.get_user_requests_page(request.user, cursor, limit)
 
 @router.post("/", response=RepairRequestSchemaOut)
 def create_repair_request(
@@ -59,12 +72,13 @@ def delete_repair_request(request, request_id: int):
     """Удалить заявку (только автор может удалить)"""
     return RepairRequestService.delete_request(request_id, request.user)
 
-@router.get("/search",operation_id="repairs_search_requests", response=list[RepairRequestSchemaOut], auth=None)
-def search_repair_requests(request, search: str = None, device_type: str = None, status: str = None):
-    """Поиск заявок по ключевым словам, типу устройства и статусу"""
-    return RepairRequestService.search_requests(search, device_type, status)
+@router.get("/search",operation_id="repairs_search_requests", response=RepairRequestPageSchema, auth=None)
+def search_repair_requests(request, search: str = None, device_type: str = None, status: str = None,
+                           cursor: str = None, limit: int = 20, order: str = None):
+    """Поиск заявок по ключевым словам, типу устройства и статусу; order: relevance (по умолчанию при search) или newest"""
+    return RepairRequestService.cached_search_page(search, device_type, status, cursor, limit, order)
 
 @router.get("/filters", operation_id="repairs_get_filters",response=dict, auth=None)
 def get_available_filters(request):
     """Получить доступные фильтры для заявок"""
-    return RepairRequestService.get_available_filters()
+    return RepairRequestService.cached_available_filters()
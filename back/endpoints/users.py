@@ -6,9 +6,10 @@ from ninja import File, UploadedFile, Router
 from back.schemas import (
     UserDetailSchema, CustomerProfileUpdate, WorkerProfileUpdate,
     PasswordChangeSchema, AvatarUploadSchema, UserActivitySchema,
-    UserStatsSchema
+    UserStatsSchema, UnreadCountsSchema
 )
 from back.services import UserProfileService, track_activity
+from back.services.unread_service import UnreadService
 from back.services.user_service import ActivityService
 
 router=Router(tags=["users"])
@@ -88,5 +89,7 @@ def get_my_stats(request):
     return UserProfileService.get_user_stats(request.user)
 
 
-
-
+@router.get("/me/unread", response=UnreadCountsSchema)
+def get_my_unread(request):
+    """Unread chat messages per repair request and unread notifications per type"""
+    return UnreadService.get_unread(request.user)
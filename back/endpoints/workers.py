@@ -2,6 +2,7 @@ from ninja import Router
 from django.contrib.auth.models import User
 from back.models import WorkerProfile
 from back.schemas import UserSchema
+from back.services.user_service import UserService
 
 router = Router(tags=["Workers"])
 
@@ -11,4 +12,4 @@ def get_top_workers(request):
         is_verified=True
     ).order_by('-rating').values_list('user_id', flat=True)[:10]
 
-    return User.objects.filter(id__in=worker_ids)
+    return User.objects.filter(id__in=worker_ids).select_related(*UserService.user_type_relations())
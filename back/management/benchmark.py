@@ -0,0 +1,49 @@
+"""Общие утилиты для management-команд bench_*"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(verbosity: int = 0):
+    """
+    Временная тестовая БД (как у test runner'а), чтобы бенчмарк
+    не засорял рабочую базу сгенерированными данными
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def measure(func, repeat: int = 20, warmup: int = 1) -> list:
+    """Время выполнения func в секундах для каждого из repeat запусков"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples: list) -> dict:
+    """Сводка по замерам в миллисекундах"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[p95_index] * 1000,
+    }
+
+
+def format_row(label: str, stats: dict) -> str:
+    return (f"{label:<32} mean={stats['mean_ms']:9.3f} ms  "
+            f"p50={stats['p50_ms']:9.3f} ms  p95={stats['p95_ms']:9.3f} ms")
@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from ninja_jwt.tokens import AccessToken
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import RepairRequest, Response
+from back.models.chat_model import ChatMessage
+from back.services.chat_service import ChatService
+
+
+class QueryCounter:
+    """Считает запросы через execute_wrapper: CaptureQueriesContext сбрасывается на request_started"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def legacy_access(repair_request_id: int, user) -> bool:
+    """Проверка как раньше: заявка, автор заявки, отдельный exists() по откликам"""
+    repair_request = RepairRequest.objects.get(id=repair_request_id)
+    if repair_request.created_by == user:
+        return True
+    return Response.objects.filter(repair_request=repair_request, worker=user).exists()
+
+
+class Command(BaseCommand):
+    help = "Проверка доступа к чату: запросы и время опроса since_id без кэша, с одним запросом и с кэшем"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            customer = User.objects.create(username='bench_customer')
+            worker = User.objects.create(username='bench_worker')
+            repair = RepairRequest.objects.create(
+                title='Чат', description='-', device_type='fridge', address='-', created_by=customer
+            )
+            Response.objects.create(repair_request=repair, worker=worker, message='-', status='accepted')
+            ChatMessage.objects.bulk_create([
+                ChatMessage(repair_request=repair, sender=customer, message=f'msg {i}')
+                for i in range(options['messages'])
+            ])
+            last_id = ChatMessage.objects.filter(repair_request=repair).latest('id').id
+
+            client = Client()
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(worker)}'}
+            url = f'/api/chat/request/{repair.id}'
+
+            def poll():
+                return client.get(url, {'since_id': last_id}, secure=True, **headers)
+
+            rows = [
+                ('legacy check (3 queries)', lambda: legacy_access(repair.id, worker), 0),
+                ('annotated check (no cache)', lambda: ChatService.check_chat_access(repair.id, worker), 0),
+                ('cached check', lambda: ChatService.check_chat_access(repair.id, worker), 30),
+                ('poll since_id, no cache', poll, 0),
+                ('poll since_id, cached', poll, 30),
+            ]
+            self.stdout.write(f"messages={options['messages']}")
+            # Кэш доступа работает только на общем для процессов backend - файловый во временном каталоге
+            location = tempfile.mkdtemp()
+            shared = {**settings.CACHES, 'shared': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+            }}
+            for label, func, ttl in rows:
+                with override_settings(CACHES=shared, CHAT_ACCESS_CACHE='shared', CHAT_ACCESS_CACHE_TTL=ttl):
+                    caches['shared'].clear()
+                    func()
+                    queries = QueryCounter()
+                    with connection.execute_wrapper(queries):
+                        func()
+                    stats = summarize(measure(func, repeat=options['repeat']))
+                self.stdout.write(f"  {format_row(label, stats)}  queries={queries.count}")
+            shutil.rmtree(location, ignore_errors=True)
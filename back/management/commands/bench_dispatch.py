@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from back.management.benchmark import benchmark_database
+from back.models import WorkerProfile, UserLocation, ServiceArea, RepairRequest, Notification
+from back.services.dispatch_service import RequestDispatcher
+from back.services.geolocation_service import LocationService
+from back.services.outbox_service import OutboxService
+from back.services.repair_request_service import RepairRequestService
+from back.services.service_area_service import ServiceAreaService
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+DEVICE_TYPES = ['fridge', 'washer', 'oven', 'dishwasher', 'other']
+
+
+class Command(BaseCommand):
+    help = "Рассылка новых заявок работникам: сквозная задержка и пропускная способность"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=20_000)
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        with benchmark_database():
+            customer = self._seed(options['workers'], rnd)
+            LocationService.worker_index.ensure_fresh()
+            ServiceAreaService.index.ensure_fresh()
+            requests = self._requests(customer, options['requests'], rnd)
+            self.stdout.write(f"workers={options['workers']} requests={len(requests)}")
+
+            # По одной заявке и по Notification.objects.create на получателя - как без пакетной рассылки
+            dispatcher = RequestDispatcher()
+            sample = requests[:50]
+            started = time.perf_counter()
+            created = 0
+            for repair_request in sample:
+                for worker_id in dispatcher.match_workers(repair_request):
+                    Notification.objects.create(user_id=worker_id, message=repair_request.title,
+                                                notification_type='new_request')
+                    created += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {'per-row create':<28} {len(sample) / elapsed:8.1f} req/s "
+                              f"{created / elapsed:10.1f} notifications/s")
+
+            for batch_size in (1, 10, 50):
+                dispatcher = RequestDispatcher()
+                for start in range(0, len(requests), batch_size):
+                    dispatcher.dispatch(requests[start:start + batch_size])
+                self._report(f"bulk, batch={batch_size} (backlog)", dispatcher.stats())
+
+            # Как в приложении: событие outbox на заявку, рассылку выполняет воркер outbox.
+            # Задержка - от создания заявки (включая ожидание в очереди) до записи уведомлений
+            RepairRequest.objects.filter(id__in=[r.id for r in requests]).update(created_at=timezone.now())
+            for repair_request in requests:
+                OutboxService.enqueue('request_created', repair_request_id=repair_request.id)
+            RepairRequestService.dispatcher.reset_stats()
+            OutboxService.process_pending()
+            self._report("outbox worker (backlog)", RepairRequestService.dispatcher.stats())
+
+    def _report(self, label, stats):
+        self.stdout.write(
+            f"  {label:<28} {stats['requests_per_second']:8.1f} req/s {stats['notifications_per_second']:10.1f} "
+            f"notifications/s  latency p50={stats['latency_p50_ms']:.1f} ms p95={stats['latency_p95_ms']:.1f} ms "
+            f"batches={stats['batches']}"
+        )
+
+    def _seed(self, size: int, rnd: random.Random):
+        customer = User.objects.create(username='bench_customer')
+        users = User.objects.bulk_create([User(username=f'bench_worker_{i}') for i in range(size)], batch_size=5000)
+        WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, specialization=', '.join(rnd.sample(DEVICE_TYPES, 2))) for user in users
+        ], batch_size=5000)
+        UserLocation.objects.bulk_create([
+            UserLocation(user=user, latitude=CENTER[0] + rnd.gauss(0, 0.15), longitude=CENTER[1] + rnd.gauss(0, 0.2))
+            for user in users
+        ], batch_size=5000)
+        ServiceArea.objects.bulk_create([
+            ServiceArea(worker=user, city='Алматы', radius_km=rnd.choice([3, 5, 10])) for user in users
+        ], batch_size=5000)
+        return customer
+
+    def _requests(self, customer, count: int, rnd: random.Random):
+        return RepairRequest.objects.bulk_create([
+            RepairRequest(
+                title=f"Заявка {i}", description='-', device_type=rnd.choice(DEVICE_TYPES), address='Алматы',
+                latitude=CENTER[0] + rnd.gauss(0, 0.1), longitude=CENTER[1] + rnd.gauss(0, 0.15),
+                status='new', created_by=customer,
+            )
+            for i in range(count)
+        ])
@@ -0,0 +1,93 @@
+import random
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import WorkerProfile, UserLocation
+from back.services.distance_service import DistanceService
+from back.services.geolocation_service import LocationService
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+
+
+def legacy_nearby(origin, destinations, max_distance_km):
+    """Прежний расчет: haversine в цикле на Python + сортировка списка"""
+    def haversine(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    nearby = []
+    for j, destination in enumerate(destinations):
+        distance = round(haversine(origin[0], origin[1], destination[0], destination[1]), 2)
+        if distance <= max_distance_km:
+            nearby.append((distance, j))
+    nearby.sort()
+    return nearby
+
+
+class Command(BaseCommand):
+    help = "Сравнение векторизованного поиска ближайших работников с циклом на Python"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+        parser.add_argument('--radius', type=float, default=10.0)
+        parser.add_argument('--top', type=int, default=50)
+        parser.add_argument('--db-workers', type=int, default=10_000,
+                            help="Размер выборки для замера find_nearby_workers целиком (0 - пропустить)")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        for size in options['sizes']:
+            points = np.column_stack([
+                CENTER[0] + rng.normal(0, 0.15, size),
+                CENTER[1] + rng.normal(0, 0.2, size),
+            ])
+            repeat = 3 if size >= 1_000_000 else 10
+            destinations = points.tolist()
+
+            legacy = summarize(measure(
+                lambda: legacy_nearby(CENTER, destinations, options['radius']), repeat=repeat
+            ))
+            vectorized = summarize(measure(
+                lambda: DistanceService.nearest(
+                    DistanceService.haversine_km(CENTER[0], CENTER[1], points[:, 0], points[:, 1]),
+                    k=options['top'], max_distance=options['radius']
+                ),
+                repeat=repeat
+            ))
+            self.stdout.write(f"workers={size}")
+            self.stdout.write('  ' + format_row('python loop', legacy))
+            self.stdout.write('  ' + format_row(f"numpy + top-{options['top']}", vectorized))
+            self.stdout.write(f"  speedup x{legacy['p50_ms'] / max(vectorized['p50_ms'], 1e-6):.1f}")
+
+        if options['db_workers']:
+            self._bench_service(options['db_workers'], options['radius'], options['top'])
+
+    def _bench_service(self, size, radius, top):
+        rnd = random.Random(42)
+        with benchmark_database():
+            users = User.objects.bulk_create([User(username=f'bench_worker_{i}') for i in range(size)])
+            WorkerProfile.objects.bulk_create([WorkerProfile(user=user) for user in users])
+            locations = [
+                UserLocation(
+                    user=user,
+                    latitude=CENTER[0] + rnd.gauss(0, 0.15),
+                    longitude=CENTER[1] + rnd.gauss(0, 0.2),
+                )
+                for user in users
+            ]
+            for location in locations:
+                location.refresh_geohash()  # bulk_create не вызывает save()
+            UserLocation.objects.bulk_create(locations, batch_size=5000)
+
+            self.stdout.write(f"find_nearby_workers, {size} workers in DB (geohash prefilter)")
+            for km in sorted({1.0, 3.0, radius}):
+                stats = summarize(measure(
+                    lambda: LocationService.find_nearby_workers(CENTER[0], CENTER[1], km, limit=top), repeat=10
+                ))
+                self.stdout.write('  ' + format_row(f"radius {km:g} km, top-{top}", stats))
@@ -0,0 +1,112 @@
+import asyncio
+import resource
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from ninja_jwt.tokens import AccessToken
+
+from back.management.benchmark import benchmark_database
+from back.services.event_bus_service import EventService
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux), иначе пиковый"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Connection:
+    """Клиент SSE, подключенный напрямую к ASGI-приложению (без сервера и сокетов)"""
+
+    def __init__(self, application, token: str):
+        self.application = application
+        self.token = token
+        self.status = None
+        self.chunks = []
+        self.opened = asyncio.Event()
+        self.received = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.task = None
+        self._request_sent = False
+
+    def open(self):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'https', 'path': '/api/events/stream', 'raw_path': b'/api/events/stream',
+            'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {self.token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 443),
+        }
+        self.task = asyncio.ensure_future(self.application(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self._request_sent:
+            self._request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self.chunks.append(message.get('body', b''))
+            if len(self.chunks) == 1:
+                self.opened.set()
+            else:
+                self.received.set()
+
+
+class Command(BaseCommand):
+    help = "Поток событий (SSE): сколько простаивающих соединений держит один процесс, память и рассылка"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[1000, 5000, 10000])
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            users = User.objects.bulk_create([
+                User(username=f'bench_events_{i}') for i in range(max(options['connections']))
+            ])
+            tokens = [str(AccessToken.for_user(user)) for user in users]
+            application = ASGIHandler()
+            for count in options['connections']:
+                asyncio.run(self._run(application, [user.id for user in users[:count]], tokens[:count]))
+
+    async def _run(self, application, user_ids, tokens):
+        count = len(tokens)
+        before = rss_mb()
+
+        started = time.perf_counter()
+        connections = [Connection(application, token) for token in tokens]
+        for connection in connections:
+            connection.open()
+        await asyncio.gather(*(connection.opened.wait() for connection in connections))
+        opened = time.perf_counter() - started
+        failed = sum(1 for connection in connections if connection.status != 200)
+        held = rss_mb()
+
+        # Одно событие каждому пользователю из синхронного кода, как это делает обработчик запроса
+        started = time.perf_counter()
+        await sync_to_async(EventService.bus.publish)(user_ids, 'notification', {'message': 'ping'})
+        await asyncio.gather(*(connection.received.wait() for connection in connections))
+        fanout = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for connection in connections:
+            connection.disconnected.set()
+        await asyncio.gather(*(connection.task for connection in connections), return_exceptions=True)
+        closed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"connections={count:>6}  open {opened * 1000:8.1f} ms ({count / opened:7.0f}/s)  "
+            f"failed={failed}  rss +{held - before:6.1f} MB ({(held - before) * 1024 / count:5.1f} KB/conn)  "
+            f"fan-out {fanout * 1000:7.1f} ms  close {closed * 1000:7.1f} ms  "
+            f"left subscribed={EventService.bus.connections()}"
+        )
@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from back.management.fake_dgis import FakeDGisServer
+from back.services.batch_geocoder_service import BatchGeocoder
+
+
+class Command(BaseCommand):
+    help = "Пакетное геокодирование против последовательного на локальном поддельном 2GIS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--addresses', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.05, help="Задержка ответа поддельного 2GIS, с")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+        parser.add_argument('--rate', type=float, default=1000.0, help="Лимит запросов в секунду")
+
+    def handle(self, *args, **options):
+        os.environ.setdefault('DGIS_API_KEY', 'bench')
+        from back.services.geolocation_service import DGisService
+
+        addresses = [f'ул. Тестовая, {i}' for i in range(options['addresses'])]
+        with FakeDGisServer(latency=options['latency']) as server:
+            dgis = DGisService()
+            dgis.GEOCODE_URL = server.url
+
+            started = time.perf_counter()
+            for address in addresses:
+                dgis._fetch_geocode(address)
+            sequential = time.perf_counter() - started
+            self.stdout.write(f"addresses={len(addresses)} latency={options['latency'] * 1000:.0f} ms")
+            self.stdout.write(f"  {'sequential':<24} {sequential * 1000:9.1f} ms  "
+                              f"{len(addresses) / sequential:8.1f} req/s")
+
+            for concurrency in options['concurrency']:
+                server.reset()
+                geocoder = BatchGeocoder(dgis, concurrency=concurrency, rate=options['rate'],
+                                         burst=concurrency, use_cache=False)
+                geocoder.geocode_many(addresses)
+                run = geocoder.last_run
+                self.stdout.write(
+                    f"  {f'batch, concurrency={concurrency}':<24} {run['elapsed_ms']:9.1f} ms  "
+                    f"{run['fetch_per_second']:8.1f} req/s  max_in_flight={server.max_in_flight}  "
+                    f"speedup x{sequential * 1000 / run['elapsed_ms']:.1f}"
+                )
+
+            # Лимит частоты: фактический темп не превышает заданный
+            server.reset()
+            limit = max(1.0, min(options['rate'], 20.0))
+            geocoder = BatchGeocoder(dgis, concurrency=16, rate=limit, burst=1, use_cache=False)
+            geocoder.geocode_many(addresses[:int(limit * 2)])
+            times = server.request_times
+            observed = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 else 0.0
+            self.stdout.write(f"  rate limit {limit:g}/s: observed {observed:.1f} req/s over {len(times)} requests")
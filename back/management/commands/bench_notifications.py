@@ -0,0 +1,103 @@
+import random
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from ninja_jwt.tokens import AccessToken
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import Notification
+from back.services.notification_service import NotificationService
+from back.services.unread_service import UnreadService
+
+
+def legacy_list(user):
+    """Как было: все уведомления пользователя списком словарей"""
+    return [{
+        'id': n.id,
+        'message': n.message,
+        'is_read': n.is_read,
+        'created_at': n.created_at,
+        'type': n.notification_type,
+    } for n in NotificationService.get_user_notifications(user)]
+
+
+def legacy_mark(user, ids):
+    """Как было: по HTTP-вызову и save() на каждое уведомление"""
+    for notification_id in ids:
+        notification = Notification.objects.get(id=notification_id, user=user)
+        notification.is_read = True
+        notification.save()
+
+
+class Command(BaseCommand):
+    help = "Уведомления: весь список против страницы по курсору, отметка по одному против одного UPDATE"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        with benchmark_database():
+            user = self._seed(options['rows'], rnd)
+            client = Client()
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+            def page(**params):
+                return lambda: client.get('/api/notifications/', params, secure=True, **headers)
+
+            middle = client.get('/api/notifications/', {'limit': 100}, secure=True, **headers).json()['next_cursor']
+            self.stdout.write(f"notifications={options['rows']} "
+                              f"unread={UnreadService.get_unread(user)['total_notifications']}")
+            self.stdout.write('  ' + format_row('legacy: whole list', summarize(measure(lambda: legacy_list(user),
+                                                                                         repeat=3))))
+            self.stdout.write('  ' + format_row('page 1 (20)', summarize(measure(page(), repeat=options['repeat']))))
+            self.stdout.write('  ' + format_row('page after cursor', summarize(measure(
+                page(cursor=middle), repeat=options['repeat']))))
+            self.stdout.write('  ' + format_row('unread_only page 1', summarize(measure(
+                page(unread_only=True), repeat=options['repeat']))))
+
+            self.stdout.write('  ' + format_row('unread badge (/users/me/unread)', summarize(measure(
+                lambda: client.get('/api/users/me/unread', secure=True, **headers), repeat=options['repeat']))))
+
+            for label, func in (('legacy: 100 x save()', legacy_mark),
+                                ('mark-read(ids[100])', NotificationService.mark_many_as_read)):
+                self.stdout.write('  ' + format_row(label, summarize(measure(
+                    lambda: self._rolled_back(lambda: func(user, self._unread_ids(user, 100))), repeat=5
+                ))))
+            self.stdout.write('  ' + format_row('mark-all-read', summarize(measure(
+                lambda: self._rolled_back(lambda: NotificationService.mark_many_as_read(user)), repeat=5
+            ))))
+
+    @staticmethod
+    def _unread_ids(user, count):
+        return list(Notification.objects.filter(user=user, is_read=False).values_list('id', flat=True)[:count])
+
+    @staticmethod
+    def _rolled_back(func):
+        """Выполнить и откатить, чтобы каждый замер видел те же непрочитанные"""
+        try:
+            with transaction.atomic():
+                func()
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rows: int, rnd: random.Random):
+        user = User.objects.create(username='bench_busy')
+        others = User.objects.bulk_create([User(username=f'bench_other{i}') for i in range(20)])
+        types = ['new_request', 'new_response', 'new_message', 'response_accepted']
+        for owner in [user] + others:
+            count = rows if owner is user else rows // 20
+            notifications = Notification.objects.bulk_create([
+                Notification(user=owner, message=f'Уведомление {i}', notification_type=rnd.choice(types),
+                             is_read=rnd.random() < 0.8)
+                for i in range(count)
+            ], batch_size=5000)
+            NotificationService.notifications_created(notifications)
+        return user
+
+
+class _Rollback(Exception):
+    pass
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import RepairRequest, Response
+from back.services.chat_service import ChatService
+from back.services.outbox_service import OutboxService
+from back.services.userlist_service import UserListService
+
+
+class Command(BaseCommand):
+    help = "Outbox: время записи в запросе (только основная запись) против записи с побочными эффектами, скорость воркера"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 500])
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            customer = User.objects.create(username='bench_customer')
+            worker = User.objects.create(username='bench_worker')
+            UserListService.get_or_create_user_lists(worker)
+            repair = RepairRequest.objects.create(
+                title='Чат', description='-', device_type='fridge', address='-', created_by=customer
+            )
+            Response.objects.create(repair_request=repair, worker=worker, message='-', status='accepted')
+
+            def send():
+                ChatService.send_message(repair.id, 'Когда приедете?', customer)
+
+            def send_inline():
+                # Как было: уведомление пишется в том же запросе
+                send()
+                OutboxService.process_pending()
+
+            self.stdout.write("send_message")
+            self.stdout.write('  ' + format_row('message + side effects inline', summarize(measure(
+                send_inline, repeat=options['repeat']))))
+            OutboxService.process_pending()
+            self.stdout.write('  ' + format_row('message + outbox event', summarize(measure(
+                send, repeat=options['repeat']))))
+
+            self.stdout.write("worker drain")
+            for batch_size in options['batch_sizes']:
+                for _ in range(2000):
+                    send()
+                pending = OutboxService.stats()['pending']
+                started = time.perf_counter()
+                OutboxService.process_pending(batch_size)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  batch={batch_size:>4}: {pending} events in {elapsed * 1000:8.1f} ms "
+                                  f"({pending / elapsed:7.0f} events/s), {OutboxService.stats()}")
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from back.management.benchmark import benchmark_database
+from back.models import CustomerProfile, RepairRequest
+from back.services.repair_request_service import RepairRequestService
+
+
+class Command(BaseCommand):
+    help = "Пропускная способность публичных эндпоинтов заявок с кэшем и без"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            ids = self._seed(options['rows'])
+            rnd = random.Random(options['seed'])
+            urls = ['/api/repairs/', '/api/repairs/filters', '/api/repairs/search?search=fridge']
+            urls += [f'/api/repairs/{rnd.choice(ids)}' for _ in range(20)]
+            workload = [rnd.choice(urls) for _ in range(options['requests'])]
+
+            client = Client()
+            cache_was_enabled = RepairRequestService.cache.enabled
+            try:
+                for enabled in (False, True):
+                    RepairRequestService.cache.enabled = enabled
+                    RepairRequestService.cache.reset_stats()
+                    cache.clear()
+
+                    started = time.perf_counter()
+                    for url in workload:
+                        client.get(url, secure=True)
+                    elapsed = time.perf_counter() - started
+
+                    label = 'cache on ' if enabled else 'cache off'
+                    self.stdout.write(
+                        f"{label}: {len(workload) / elapsed:8.1f} req/s  "
+                        f"({elapsed * 1000 / len(workload):.2f} ms/req)  {RepairRequestService.cache.stats()}"
+                    )
+            finally:
+                RepairRequestService.cache.enabled = cache_was_enabled
+
+    def _seed(self, rows: int) -> list:
+        user = User.objects.create_user('bench_customer', 'bench@example.com', 'bench')
+        CustomerProfile.objects.create(user=user)
+        device_types = [choice[0] for choice in RepairRequest.DEVICE_TYPES]
+        RepairRequest.objects.bulk_create([
+            RepairRequest(
+                title=f"Заявка {i} {device_types[i % len(device_types)]}",
+                description='Не включается после переезда',
+                device_type=device_types[i % len(device_types)],
+                address=f"ул. Тестовая, {i}",
+                created_by=user,
+            )
+            for i in range(rows)
+        ], batch_size=5000)
+        return list(RepairRequest.objects.values_list('id', flat=True))
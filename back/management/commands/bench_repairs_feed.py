@@ -0,0 +1,89 @@
+import random
+from datetime import timedelta
+from math import exp
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+from ninja_jwt.tokens import AccessToken
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import RepairRequest, WorkerProfile, UserLocation
+from back.services.distance_service import DistanceService
+from back.services.repair_feed_service import RepairFeedService
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+
+
+def rank_in_python(worker_location, specialization):
+    """Без индекса: все открытые заявки из БД и оценка в цикле"""
+    ranked = []
+    for request_id, latitude, longitude, device_type in RepairRequest.objects.filter(status='new').values_list(
+            'id', 'latitude', 'longitude', 'device_type'):
+        score = 2.0 if device_type in specialization else 0.0
+        if latitude is not None:
+            score += 3.0 * exp(-float(DistanceService.haversine_km(*worker_location, latitude, longitude)) / 5.0)
+        ranked.append((score, request_id))
+    ranked.sort(reverse=True)
+    return ranked[:20]
+
+
+class Command(BaseCommand):
+    help = "Лента /repairs/feed: первый запрос, кэш оценок, догрузка новых заявок и ранжирование в Python"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        with benchmark_database():
+            customer, worker = self._seed(options['rows'], rnd)
+            client = Client()
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(worker)}'}
+            RepairFeedService.index.refresh_interval = 0
+
+            def feed():
+                return client.get('/api/repairs/feed', secure=True, **headers)
+
+            def cold():
+                RepairFeedService.index.invalidate()
+                return feed()
+
+            def arrivals():
+                self._requests(customer, 10, rnd)
+                return feed()
+
+            self.stdout.write(f"open requests={options['rows']}")
+            self.stdout.write('  ' + format_row('cold (index + all scores)', summarize(measure(cold, repeat=5))))
+            self.stdout.write('  ' + format_row('cached scores', summarize(measure(feed, repeat=options['repeat']))))
+            self.stdout.write('  ' + format_row('+10 new requests each call',
+                                                summarize(measure(arrivals, repeat=options['repeat']))))
+            self.stdout.write('  ' + format_row('python loop over ORM rows', summarize(measure(
+                lambda: rank_in_python(CENTER, 'fridge, washer'), repeat=3
+            ))))
+            self.stdout.write(f"  {RepairFeedService.index.stats()}")
+
+    def _seed(self, rows: int, rnd: random.Random):
+        customer = User.objects.create(username='bench_customer')
+        worker = User.objects.create(username='bench_worker')
+        WorkerProfile.objects.create(user=worker, specialization='fridge, washer')
+        UserLocation.objects.create(user=worker, latitude=CENTER[0], longitude=CENTER[1])
+        for _ in range(0, rows, 10_000):
+            self._requests(customer, min(10_000, rows), rnd)
+        # Заявки накапливались раньше - иначе все они попадают в окно догрузки по updated_at
+        RepairRequest.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        return customer, worker
+
+    def _requests(self, customer, count: int, rnd: random.Random):
+        device_types = [choice[0] for choice in RepairRequest.DEVICE_TYPES]
+        RepairRequest.objects.bulk_create([
+            RepairRequest(
+                title='Заявка', description='-', device_type=rnd.choice(device_types), address='-',
+                latitude=CENTER[0] + rnd.gauss(0, 0.1), longitude=CENTER[1] + rnd.gauss(0, 0.15),
+                created_by=customer,
+            )
+            for _ in range(count)
+        ])
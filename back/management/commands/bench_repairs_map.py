@@ -0,0 +1,79 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import RepairRequest
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+
+# Видимая область ~ окно 1280x800 на разных масштабах (градусы)
+VIEWPORTS = {10: (0.6, 1.2), 13: (0.08, 0.15), 16: (0.01, 0.02)}
+
+
+class Command(BaseCommand):
+    help = "Эндпоинт /repairs/map: холодный кэш, повторный запрос и сдвиг карты"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500_000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self._seed(options['rows'])
+            client = Client()
+            self.stdout.write(f"rows={options['rows']}")
+
+            for zoom, (height, width) in VIEWPORTS.items():
+                def viewport(shift=0.0):
+                    return {
+                        'min_lat': CENTER[0] - height / 2, 'max_lat': CENTER[0] + height / 2,
+                        'min_lon': CENTER[1] - width / 2 + shift * width,
+                        'max_lon': CENTER[1] + width / 2 + shift * width, 'zoom': zoom,
+                    }
+
+                def cold():
+                    cache.clear()
+                    return client.get('/api/repairs/map', viewport(), secure=True)
+
+                total = cold().json()['total']
+                cold_stats = summarize(measure(cold, repeat=options['repeat']))
+                warm_stats = summarize(measure(
+                    lambda: client.get('/api/repairs/map', viewport(), secure=True), repeat=options['repeat']
+                ))
+                shifts = iter(range(1, 10_000))
+                pan_stats = summarize(measure(
+                    lambda: client.get('/api/repairs/map', viewport(next(shifts) * 0.25), secure=True),
+                    repeat=options['repeat'], warmup=0
+                ))
+
+                self.stdout.write(f"zoom={zoom} viewport {height}x{width} deg, {total} open requests visible")
+                self.stdout.write('  ' + format_row('cold (all tiles computed)', cold_stats))
+                self.stdout.write('  ' + format_row('same viewport (cached)', warm_stats))
+                self.stdout.write('  ' + format_row('pan by 1/4 viewport', pan_stats))
+
+    def _seed(self, rows: int):
+        rnd = random.Random(42)
+        user = User.objects.create_user('bench_customer', 'bench@example.com', 'bench')
+        device_types = [choice[0] for choice in RepairRequest.DEVICE_TYPES]
+        batch = []
+        for i in range(rows):
+            batch.append(RepairRequest(
+                title=f"Заявка {i}",
+                description='-',
+                device_type=rnd.choice(device_types),
+                address='-',
+                latitude=CENTER[0] + rnd.gauss(0, 0.1),
+                longitude=CENTER[1] + rnd.gauss(0, 0.15),
+                status='new' if rnd.random() < 0.7 else 'completed',
+                created_by=user,
+            ))
+            if len(batch) == 10_000:
+                RepairRequest.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            RepairRequest.objects.bulk_create(batch)
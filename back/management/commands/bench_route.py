@@ -0,0 +1,44 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import measure, summarize, format_row
+from back.services.distance_service import DistanceService
+from back.services.route_service import RoutePlanner
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+
+
+class Command(BaseCommand):
+    help = "Маршрут по заявкам: ближайший сосед + 2-opt на 10, 100 и 1000 точках"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--budgets', type=int, nargs='+', default=[100, 500, 5000],
+                            help="Бюджеты времени 2-opt, мс")
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        for size in options['sizes']:
+            points = [(CENTER[0] + rnd.gauss(0, 0.1), CENTER[1] + rnd.gauss(0, 0.15)) for _ in range(size)]
+            start = CENTER
+
+            matrix = summarize(measure(lambda: DistanceService.distance_matrix(points, points), repeat=5))
+            unordered = float(DistanceService.haversine_km(
+                *np.array([start] + points[:-1]).T, *np.array(points).T
+            ).sum())
+            self.stdout.write(f"stops={size}  in request order: {unordered:.1f} km")
+            self.stdout.write('  ' + format_row('distance matrix (numpy)', matrix))
+
+            for budget in options['budgets']:
+                started = time.perf_counter()
+                plan = RoutePlanner.plan(points, start, time_budget_ms=budget)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(
+                    f"  budget={budget:>5} ms: nearest neighbour {plan['initial_distance_km']:8.1f} km -> "
+                    f"2-opt {plan['distance_km']:8.1f} km ({plan['distance_km'] / unordered:.0%} of request order) "
+                    f"in {elapsed:7.1f} ms, passes={plan['passes']} completed={plan['completed']}"
+                )
@@ -0,0 +1,70 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import RepairRequest
+from back.services.search_service import SearchIndexService
+
+WORDS = [
+    'холодильник', 'морозилка', 'стиральная', 'машина', 'духовка', 'посудомойка',
+    'не', 'включается', 'течет', 'шумит', 'греет', 'морозит', 'сливает', 'отжим',
+    'барабан', 'компрессор', 'дверца', 'уплотнитель', 'термостат', 'насос', 'фильтр',
+    'ошибка', 'код', 'дисплей', 'кнопка', 'таймер', 'лампочка', 'вода', 'запах', 'лед',
+]
+
+BRANDS = ['bosch', 'samsung', 'lg', 'indesit', 'atlant', 'beko', 'electrolux', 'whirlpool',
+          'gorenje', 'siemens', 'hotpoint', 'candy', 'haier', 'miele', 'zanussi', 'hansa']
+
+# От частых слов до почти уникальных (номер модели встречается в одной-двух заявках)
+QUERIES = ['холод', 'течет вода', 'miele', 'miele компрессор', 'sn4217', 'sn42']
+
+
+class Command(BaseCommand):
+    help = "Сравнение полнотекстового индекса с поиском через icontains"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self._seed(options['rows'], options['seed'])
+            self.stdout.write(f"rows={options['rows']} backend={SearchIndexService.backend()}")
+
+            base = RepairRequest.objects.all()
+            for term in QUERIES:
+                legacy = summarize(measure(
+                    lambda: list(SearchIndexService.filter_icontains(base, term).values_list('id', flat=True)),
+                    repeat=options['repeat']
+                ))
+                indexed = summarize(measure(
+                    lambda: list(SearchIndexService.filter(base, term).values_list('id', flat=True)),
+                    repeat=options['repeat']
+                ))
+                self.stdout.write(f"query={term!r}")
+                self.stdout.write('  ' + format_row('icontains', legacy))
+                self.stdout.write('  ' + format_row('index (ranked)', indexed))
+                self.stdout.write(f"  speedup x{legacy['p50_ms'] / max(indexed['p50_ms'], 1e-6):.1f}")
+
+    def _seed(self, rows: int, seed: int):
+        rnd = random.Random(seed)
+        user = User.objects.create_user('bench_customer', 'bench@example.com', 'bench')
+        device_types = [choice[0] for choice in RepairRequest.DEVICE_TYPES]
+
+        batch = []
+        for i in range(rows):
+            batch.append(RepairRequest(
+                title=f"{rnd.choice(WORDS).capitalize()} {rnd.choice(BRANDS)} sn{rnd.randrange(rows)}",
+                description=' '.join(rnd.choices(WORDS, k=12)),
+                device_type=rnd.choice(device_types),
+                address=f"ул. Тестовая, {i}",
+                created_by=user,
+            ))
+            if len(batch) == 5000:
+                RepairRequest.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            RepairRequest.objects.bulk_create(batch)
@@ -0,0 +1,82 @@
+import random
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import WorkerProfile, UserLocation, ServiceArea
+from back.services.distance_service import DistanceService
+from back.services.service_area_service import ServiceAreaIndex
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+CITIES = ['Алматы', 'Астана', 'Шымкент', 'Караганда', 'Актобе']
+DEVICE_TYPES = ['fridge', 'washer', 'oven', 'dishwasher', 'other']
+
+
+def scan_matching(latitude, longitude, device_type):
+    """Без индекса: все зоны с координатами работников из БД и проверка расстояния"""
+    rows = np.array(ServiceArea.objects.filter(
+        worker__location__latitude__isnull=False,
+        worker__worker_profile__specialization__contains=device_type,
+    ).values_list('worker_id', 'worker__location__latitude', 'worker__location__longitude', 'radius_km'),
+        dtype=np.float64).reshape(-1, 4)
+    distances = DistanceService.haversine_km(latitude, longitude, rows[:, 1], rows[:, 2])
+    return rows[distances <= rows[:, 3], 0]
+
+
+class Command(BaseCommand):
+    help = "Подбор работников по зонам обслуживания: инвертированный индекс против перебора зон"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=50_000)
+        parser.add_argument('--lookups', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        with benchmark_database():
+            self._seed(options['workers'], rnd)
+            index = ServiceAreaIndex(max_age=None)
+
+            started = time.perf_counter()
+            index.ensure_fresh()
+            build_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"workers={options['workers']} build={build_ms:.0f} ms {index.stats()}")
+
+            queries = [
+                (CENTER[0] + rnd.gauss(0, 0.1), CENTER[1] + rnd.gauss(0, 0.15), rnd.choice(DEVICE_TYPES))
+                for _ in range(options['lookups'])
+            ]
+            queries_iter = iter(queries)
+            indexed = summarize(measure(
+                lambda: index.match(*next(queries_iter), 'Алматы, Абая 10'), repeat=options['lookups'], warmup=0
+            ))
+            matched = [len(index.match(lat, lon, device, 'Алматы, Абая 10')) for lat, lon, device in queries[:50]]
+
+            scan_queries = iter(queries)
+            scanned = summarize(measure(
+                lambda: scan_matching(*next(scan_queries)), repeat=min(20, options['lookups']), warmup=0
+            ))
+            self.stdout.write(f"  avg workers matched: {sum(matched) / len(matched):.0f}")
+            self.stdout.write('  ' + format_row('inverted index', indexed))
+            self.stdout.write('  ' + format_row('scan all areas (ORM)', scanned))
+            self.stdout.write(f"  speedup x{scanned['p50_ms'] / max(indexed['p50_ms'], 1e-6):.1f}")
+
+    def _seed(self, size: int, rnd: random.Random):
+        users = User.objects.bulk_create([User(username=f'bench_worker_{i}') for i in range(size)], batch_size=5000)
+        WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, specialization=', '.join(rnd.sample(DEVICE_TYPES, 2))) for user in users
+        ], batch_size=5000)
+
+        # 80% работников с координатами (зона - круг), остальные обслуживают город целиком
+        located = users[:int(size * 0.8)]
+        UserLocation.objects.bulk_create([
+            UserLocation(user=user, latitude=CENTER[0] + rnd.gauss(0, 0.15), longitude=CENTER[1] + rnd.gauss(0, 0.2))
+            for user in located
+        ], batch_size=5000)
+        ServiceArea.objects.bulk_create([
+            ServiceArea(worker=user, city=rnd.choice(CITIES), radius_km=rnd.choice([3, 5, 10, 15]))
+            for user in users
+        ], batch_size=5000)
@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from back.management.benchmark import benchmark_database, measure, summarize, format_row
+from back.models import WorkerProfile, UserLocation
+from back.services.geolocation_service import LocationService
+from back.services.worker_index_service import WorkerLocationIndex
+
+# Центр Алматы
+CENTER = (43.2389, 76.8897)
+
+
+class Command(BaseCommand):
+    help = "Поиск работников поблизости: индекс в памяти (k-d дерево) против запросов к БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=50_000)
+        parser.add_argument('--radii', type=float, nargs='+', default=[1.0, 3.0, 10.0])
+        parser.add_argument('--top', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self._seed(options['workers'])
+            index = WorkerLocationIndex(max_age=None)
+
+            started = time.perf_counter()
+            index.ensure_fresh()
+            self.stdout.write(f"workers={options['workers']} build={(time.perf_counter() - started) * 1000:.1f} ms "
+                              f"memory={index.memory_bytes() / 1024 / 1024:.1f} MiB")
+
+            top = options['top']
+            for km in options['radii']:
+                orm = summarize(measure(
+                    lambda: LocationService.find_nearby_workers_db(CENTER[0], CENTER[1], km, limit=top),
+                    repeat=options['repeat']
+                ))
+                memory = summarize(measure(
+                    lambda: index.find_nearby(CENTER[0], CENTER[1], km, limit=top), repeat=options['repeat']
+                ))
+                self.stdout.write(f"radius {km:g} km, top-{top}")
+                self.stdout.write('  ' + format_row('ORM (geohash prefilter)', orm))
+                self.stdout.write('  ' + format_row('k-d tree in memory', memory))
+                self.stdout.write(f"  speedup x{orm['p50_ms'] / max(memory['p50_ms'], 1e-6):.1f}")
+
+            knn = summarize(measure(lambda: index.k_nearest(CENTER[0], CENTER[1], top), repeat=options['repeat']))
+            self.stdout.write(format_row(f"k-nearest, k={top}", knn))
+
+            # Инкрементальные обновления: перемещение работника без перестройки дерева
+            locations = list(UserLocation.objects.select_related('user', 'user__worker_profile')[:1000])
+            rnd = random.Random(1)
+            started = time.perf_counter()
+            for location in locations:
+                location.latitude = CENTER[0] + rnd.gauss(0, 0.15)
+                location.longitude = CENTER[1] + rnd.gauss(0, 0.2)
+                index.upsert(location)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"upsert: {elapsed * 1e6 / len(locations):.1f} us/update")
+            after = summarize(measure(
+                lambda: index.find_nearby(CENTER[0], CENTER[1], 3.0, limit=top), repeat=options['repeat']
+            ))
+            self.stdout.write(format_row(f"radius 3 km, {len(locations)} pending", after))
+            self.stdout.write(str(index.stats()))
+
+    def _seed(self, size: int):
+        rnd = random.Random(42)
+        users = User.objects.bulk_create([User(username=f'bench_worker_{i}') for i in range(size)], batch_size=5000)
+        WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, specialization='fridge', rating=rnd.randint(0, 5)) for user in users
+        ], batch_size=5000)
+        locations = [
+            UserLocation(
+                user=user,
+                latitude=CENTER[0] + rnd.gauss(0, 0.15),
+                longitude=CENTER[1] + rnd.gauss(0, 0.2),
+                address=f"ул. Тестовая, {i}",
+            )
+            for i, user in enumerate(users)
+        ]
+        for location in locations:
+            location.refresh_geohash()  # bulk_create не вызывает save()
+        UserLocation.objects.bulk_create(locations, batch_size=5000)
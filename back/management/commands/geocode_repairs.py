@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from back.models import RepairRequest
+from back.services.batch_geocoder_service import BatchGeocoder
+from back.services.geocoding_queue_service import RepairGeocodingQueue
+
+
+class Command(BaseCommand):
+    help = ("Заполнить координаты заявок без latitude/longitude по адресу: пачками с продолжением после остановки; "
+            "внутри пачки - параллельные запросы к 2GIS, а запросы следующей пачки идут, пока пишется текущая")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=None, help="Одновременных запросов к 2GIS")
+        parser.add_argument('--rate', type=float, default=None, help="Запросов к 2GIS в секунду")
+        parser.add_argument('--state-file', default='geocode_repairs.progress.json',
+                            help="Файл с id последней обработанной заявки")
+        parser.add_argument('--restart', action='store_true', help="Начать сначала, игнорируя сохраненный прогресс")
+        parser.add_argument('--limit', type=int, default=None, help="Обработать не больше N заявок")
+
+    def handle(self, *args, **options):
+        if not os.getenv('DGIS_API_KEY'):
+            raise CommandError("DGIS_API_KEY not found in environment variables")
+
+        state_file = options['state_file']
+        last_id = 0 if options['restart'] else self._load_state(state_file)
+        geocoder = BatchGeocoder(concurrency=options['concurrency'], rate=options['rate'])
+
+        pending = RepairRequest.objects.filter(latitude__isnull=True).exclude(address='').order_by('id')
+        total = pending.filter(id__gt=last_id).count()
+        if options['limit'] is not None:
+            total = min(total, options['limit'])
+        self.stdout.write(f"to process: {total} (after id {last_id})")
+
+        processed = updated = 0
+        started = time.perf_counter()
+        # Конвейер: пока пишутся координаты пачки N, запросы к 2GIS для пачки N+1 уже идут
+        # в отдельном потоке (там только сеть; кэш и заявки в БД - в этом потоке)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocode-chunk') as executor:
+            in_flight = self._submit(executor, geocoder, pending, last_id, min(options['chunk_size'], total))
+            while in_flight is not None:
+                chunk, jobs, batch, fetching = in_flight
+                results = geocoder.store(batch, fetching.result())
+
+                # Следующая пачка ищется в кэше уже после записи этой - повторы адресов не запрашиваются
+                size = min(options['chunk_size'], total - processed - len(chunk))
+                in_flight = self._submit(executor, geocoder, pending, chunk[-1][0], size) if size > 0 else None
+
+                updated += RepairGeocodingQueue.apply(jobs, results)
+                processed += len(chunk)
+                last_id = chunk[-1][0]
+                self._save_state(state_file, last_id)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {processed}/{total} processed, {updated} geocoded, "
+                    f"{processed / elapsed:.1f} rows/s, last id {last_id}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"done: {processed} processed, {updated} geocoded"))
+
+    @staticmethod
+    def _submit(executor, geocoder, pending, after_id: int, size: int):
+        """Прочитать следующую пачку, найти адреса в кэше и отправить остальное в 2GIS в фоне"""
+        chunk = list(pending.filter(id__gt=after_id).values_list('id', 'address')[:size])
+        if not chunk:
+            return None
+        # Одинаковые адреса внутри пачки геокодируются один раз
+        jobs = {}
+        for request_id, address in chunk:
+            jobs.setdefault(address, []).append(request_id)
+        batch = geocoder.lookup(list(jobs))
+        return chunk, jobs, batch, executor.submit(geocoder.fetch, batch)
+
+    @staticmethod
+    def _load_state(path: str) -> int:
+        try:
+            with open(path) as f:
+                return int(json.load(f)['last_id'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    @staticmethod
+    def _save_state(path: str, last_id: int):
+        # Через временный файл: прерывание не оставит испорченный прогресс
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,34 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from back.services.event_bus_service import EventBroker
+
+
+class Command(BaseCommand):
+    help = ("Локальный брокер событий для нескольких ASGI-процессов: "
+            "процессы запускаются с тем же EVENTS_BROKER_URL")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.EVENTS_BROKER_URL,
+                            help="unix:///path.sock или tcp://127.0.0.1:port (по умолчанию EVENTS_BROKER_URL)")
+        parser.add_argument('--allow-remote', action='store_true',
+                            help="Разрешить TCP на не-loopback адресе (клиенты все равно проверяются секретом)")
+
+    def handle(self, *args, **options):
+        if not options['url']:
+            raise CommandError("Укажите --url или EVENTS_BROKER_URL")
+        try:
+            asyncio.run(self._serve(options['url'], options['allow_remote']))
+        except ValueError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            pass
+
+    async def _serve(self, url: str, allow_remote: bool):
+        broker = EventBroker(url, allow_remote=allow_remote)
+        server = await broker.start()
+        self.stdout.write(f"Event broker listening on {url}")
+        async with server:
+            await server.serve_forever()
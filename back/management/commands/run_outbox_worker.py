@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from back.services.event_bus_service import EventService
+from back.services.geocode_cache_service import GeocodeCache
+from back.services.outbox_service import OutboxService
+
+
+class Command(BaseCommand):
+    help = "Воркер outbox: выполняет побочные эффекты записей (уведомления, списки, история) пачками с повторами"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help="Пауза, когда очередь пуста (секунды)")
+        parser.add_argument('--once', action='store_true',
+                            help="Выполнить готовые события, очистку (как раз в час в цикле) и выйти")
+        parser.add_argument('--check', action='store_true',
+                            help="Только проверить отставание очереди: код выхода 1, если самое старое "
+                                 "ожидающее событие старше OUTBOX_ALERT_AGE (для healthcheck/мониторинга)")
+        parser.add_argument('--without-broker', action='store_true',
+                            help="Запустить без EVENTS_BROKER_URL: созданные уведомления не доставляются "
+                                 "открытым соединениям (SSE), клиенты увидят их только при запросе списка")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            stats = OutboxService.stats()
+            self.stdout.write(f"Outbox: {stats}")
+            if OutboxService.is_lagging(stats):
+                raise CommandError(
+                    f"Outbox is lagging: oldest pending event is {stats['oldest_pending_seconds']}s old "
+                    f"(limit {settings.OUTBOX_ALERT_AGE}s) - is run_outbox_worker running?"
+                )
+            return
+
+        # У процесса воркера нет SSE-подписчиков: без брокера события уведомлений никуда не уходят
+        if not EventService.bus.broker_url and not options['without_broker']:
+            raise CommandError(
+                "EVENTS_BROKER_URL is not set: notifications created by the outbox worker would not reach "
+                "connected clients. Run manage.py run_event_broker and set EVENTS_BROKER_URL for web and "
+                "the worker, or pass --without-broker"
+            )
+
+        if options['once']:
+            processed = OutboxService.process_pending(options['batch_size'])
+            self.stdout.write(f"Processed {processed} outbox events, {OutboxService.stats()}")
+            self.purge()
+            return
+
+        self.stdout.write("Outbox worker started")
+        purged_at = checked_at = 0.0
+        try:
+            while True:
+                try:
+                    taken = OutboxService.process_batch(options['batch_size'])
+                    if time.monotonic() - checked_at > 60:
+                        self.check_lag()
+                        checked_at = time.monotonic()
+                    if time.monotonic() - purged_at > 3600:
+                        self.purge()
+                        purged_at = time.monotonic()
+                except Exception as e:
+                    # База недоступна и т.п. - подождать и продолжить
+                    self.stderr.write(f"Outbox worker error: {e}")
+                    taken = 0
+                finally:
+                    close_old_connections()
+                if not taken:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox worker stopped")
+
+    def purge(self):
+        """Раз в час: выполненные события outbox и истекшие записи кэша геокодирования"""
+        events = OutboxService.purge()
+        geocode_entries = GeocodeCache.purge_expired()
+        self.stdout.write(f"Purged {events} outbox events, {geocode_entries} expired geocode cache entries")
+
+    def check_lag(self):
+        """Раз в минуту: предупредить, если воркер не успевает или события упали окончательно"""
+        stats = OutboxService.stats()
+        if OutboxService.is_lagging(stats):
+            self.stderr.write(f"Outbox worker is lagging: oldest pending event is "
+                              f"{stats['oldest_pending_seconds']}s old, {stats['pending']} pending")
+        if stats['failed']:
+            self.stderr.write(f"Outbox has {stats['failed']} failed events (attempts exhausted), see last_error")
@@ -0,0 +1,91 @@
+"""Локальный поддельный 2GIS для бенчмарков и тестов геокодирования"""
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeDGisHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # иначе keep-alive ответы ждут delayed ACK (~40 мс)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.request_times.append(time.monotonic())
+        try:
+            time.sleep(server.latency)
+            query = parse_qs(urlparse(self.path).query)
+            address = query.get('q', [''])[0]
+            if address.startswith('nowhere'):
+                payload = {'meta': {'code': 404}}
+            else:
+                # Детерминированные координаты в окрестностях Алматы
+                digest = zlib.crc32(address.encode())
+                payload = {'result': {'items': [{
+                    'point': {'lat': 43.2 + (digest % 1000) / 10000, 'lon': 76.8 + (digest // 1000 % 1000) / 10000},
+                    'full_name': f'Алматы, {address}',
+                }]}}
+            self._send(200, payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDGisServer:
+    """
+    with FakeDGisServer(latency=0.05) as server:
+        dgis.GEOCODE_URL = server.url
+    Запоминает время запросов и максимум одновременных запросов
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeDGisHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}/3.0'
+
+    @property
+    def hits(self) -> int:
+        return len(self.httpd.request_times)
+
+    @property
+    def max_in_flight(self) -> int:
+        return self.httpd.max_in_flight
+
+    @property
+    def request_times(self) -> list:
+        return list(self.httpd.request_times)
+
+    def reset(self):
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.request_times = []
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
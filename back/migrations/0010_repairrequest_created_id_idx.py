@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0009_repairrequest_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['created_at', 'id'], name='repair_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0010_repairrequest_created_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['status', 'created_at'], name='repair_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['device_type', 'created_at'], name='repair_device_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['created_by', 'created_at'], name='repair_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['created_by', 'status', 'device_type'], name='repair_author_stats_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['latitude', 'longitude'], name='repair_lat_lon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['worker', 'status'], name='response_worker_status_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+from back.models.geohash import encode
+
+
+def fill_geohash(apps, schema_editor):
+    for model_name in ('RepairRequest', 'UserLocation'):
+        model = apps.get_model('back', model_name)
+        rows = model.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            row.geohash = encode(row.latitude, row.longitude)
+            batch.append(row)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['geohash'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0012_userlocation_servicearea'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repairrequest',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlocation',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['geohash'], name='repair_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlocation',
+            index=models.Index(fields=['geohash'], name='userlocation_geohash_idx'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0013_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('geocode', 'Адрес -> координаты'), ('reverse', 'Координаты -> адрес')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('query', models.TextField()),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='geocode_cache_kind_key_uniq')],
+            },
+        ),
+    ]
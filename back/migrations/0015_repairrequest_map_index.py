@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0014_geocodecacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['status', 'latitude', 'longitude', 'device_type'], name='repair_map_idx'),
+        ),
+    ]
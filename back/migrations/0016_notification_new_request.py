@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0015_repairrequest_map_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('new_response', 'New Response'), ('response_accepted', 'Response Accepted'), ('new_review', 'New Review'), ('new_request', 'New Request')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0016_notification_new_request'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['updated_at'], name='repair_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0017_repairrequest_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['repair_request', 'id'], name='chat_request_id_idx'),
+        ),
+    ]
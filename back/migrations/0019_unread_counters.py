@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Notification = apps.get_model('back', 'Notification')
+    ChatMessage = apps.get_model('back', 'ChatMessage')
+    RepairRequest = apps.get_model('back', 'RepairRequest')
+    Response = apps.get_model('back', 'Response')
+    UnreadChatCounter = apps.get_model('back', 'UnreadChatCounter')
+    UnreadNotificationCounter = apps.get_model('back', 'UnreadNotificationCounter')
+
+    UnreadNotificationCounter.objects.bulk_create([
+        UnreadNotificationCounter(user_id=row['user_id'], notification_type=row['notification_type'], count=row['n'])
+        for row in Notification.objects.filter(is_read=False).values('user_id', 'notification_type').annotate(n=Count('id'))
+    ], batch_size=2000)
+
+    # Непрочитанное участником чата - сообщения остальных участников с is_read=False
+    unread = {}
+    for row in ChatMessage.objects.filter(is_read=False).values('repair_request_id', 'sender_id').annotate(n=Count('id')):
+        unread.setdefault(row['repair_request_id'], {})[row['sender_id']] = row['n']
+    participants = {request_id: {author_id} for request_id, author_id in
+                    RepairRequest.objects.filter(id__in=list(unread)).values_list('id', 'created_by_id')}
+    for request_id, worker_id in Response.objects.filter(repair_request_id__in=list(unread)).values_list(
+            'repair_request_id', 'worker_id'):
+        participants[request_id].add(worker_id)
+
+    counters = []
+    for request_id, users in participants.items():
+        for user_id in users:
+            count = sum(n for sender_id, n in unread[request_id].items() if sender_id != user_id)
+            if count:
+                counters.append(UnreadChatCounter(user_id=user_id, repair_request_id=request_id, count=count))
+    UnreadChatCounter.objects.bulk_create(counters, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0018_chatmessage_request_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadChatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('repair_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to='back.repairrequest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_chats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'repair_request'), name='unread_chat_user_request_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'notification_type'), name='unread_notification_user_type_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
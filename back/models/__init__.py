@@ -7,4 +7,7 @@ from .repair_requests_models import RepairRequest, RepairRequestFile
 from .response_models import Response  # добавьте эту строку
 from .userlist_model import UserList,ListItem
 from .chat_model import ChatMessage
-__all__ = ['RepairRequest', 'RepairRequestFile', 'Response','CustomerProfile','WorkerProfile','UserActivity','UserList','ListItem']
\ No newline at end of file
+from .geolocation_models import UserLocation, ServiceArea, GeocodeCacheEntry
+from .unread_models import UnreadChatCounter, UnreadNotificationCounter
+from .outbox_models import OutboxEvent
+__all__ = ['RepairRequest', 'RepairRequestFile', 'Response','CustomerProfile','WorkerProfile','UserActivity','UserList','ListItem','UserLocation','ServiceArea','GeocodeCacheEntry','UnreadChatCounter','UnreadNotificationCounter','OutboxEvent']
\ No newline at end of file
@@ -13,6 +13,10 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Синхронизация чата по курсору: since_id / before_id внутри одной заявки
+            models.Index(fields=['repair_request', 'id'], name='chat_request_id_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} for request #{self.repair_request.id}"
\ No newline at end of file
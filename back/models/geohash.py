@@ -0,0 +1,135 @@
+"""
+Geohash: кодирование координат в строку, у которой общий префикс означает
+общую ячейку сетки. Позволяет искать "рядом" обычным B-tree индексом.
+"""
+from math import cos, radians
+
+from django.db import models
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9  # ~4.8 x 4.8 м
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude: float, longitude: float, precision: int = PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # биты чередуются: долгота, широта, долгота...
+
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            bounds[0] = middle
+        else:
+            bits <<= 1
+            bounds[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def decode_bounds(cell: str) -> tuple:
+    """Границы ячейки: (мин. широта, макс. широта, мин. долгота, макс. долгота)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if bits >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_size_deg(precision: int) -> tuple:
+    """Размер ячейки (высота, ширина) в градусах"""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lon_bits = total_bits - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> list:
+    """
+    Ячейки, покрывающие круг радиуса radius_km: выбирается самая мелкая сетка,
+    где ячейка не меньше радиуса, и берутся центральная ячейка и 8 соседних.
+    Пустой список - радиус настолько велик, что фильтровать по ячейкам бессмысленно.
+    """
+    # Ячейки сужаются к полюсам, считаем по самой "северной" широте круга
+    worst_latitude = min(89.9, abs(latitude) + radius_km / KM_PER_DEGREE)
+    km_per_lon_degree = KM_PER_DEGREE * cos(radians(worst_latitude))
+
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size_deg(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * km_per_lon_degree >= radius_km:
+            break
+    else:
+        return []
+
+    cells = set()
+    for d_lat in (-height, 0.0, height):
+        for d_lon in (-width, 0.0, width):
+            lat = max(-90.0, min(90.0, latitude + d_lat))
+            lon = (longitude + d_lon + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def cells_q(cells: list, field: str = 'geohash') -> models.Q:
+    """Условие 'geohash начинается с одной из ячеек' в виде диапазонов (работает по B-tree индексу)"""
+    condition = models.Q()
+    for cell in cells:
+        # '~' больше любого символа алфавита geohash
+        condition |= models.Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return condition
+
+
+class GeohashQuerySet(models.QuerySet):
+    def near(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Кандидаты в радиусе: только строки из ячеек, покрывающих круг.
+        Точное расстояние проверяет вызывающий код.
+        """
+        cells = covering_cells(latitude, longitude, radius_km)
+        if not cells:
+            return self.filter(geohash__isnull=False)
+        return self.filter(cells_q(cells))
+
+
+class GeohashedModel(models.Model):
+    """Абстрактная модель с latitude/longitude и поддерживаемым при save() geohash"""
+    geohash = models.CharField(max_length=PRECISION, null=True, blank=True, editable=False)
+
+    objects = GeohashQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def refresh_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = encode(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.refresh_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
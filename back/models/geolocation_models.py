@@ -1,8 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .geohash import GeohashedModel
 
-class UserLocation(models.Model):
+
+class UserLocation(GeohashedModel):
     """Модель для хранения местоположения пользователей"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='location')
     latitude = models.FloatField(null=True, blank=True)
@@ -15,6 +17,7 @@ class UserLocation(models.Model):
         indexes = [
             models.Index(fields=['latitude', 'longitude']),
             models.Index(fields=['city']),
+            models.Index(fields=['geohash'], name='userlocation_geohash_idx'),
         ]
 
     def __str__(self):
@@ -29,4 +32,26 @@ class ServiceArea(models.Model):
     radius_km = models.PositiveIntegerField(default=10)
 
     def __str__(self):
-        return f"{self.worker.username} - {self.city} ({self.radius_km}km)"
\ No newline at end of file
+        return f"{self.worker.username} - {self.city} ({self.radius_km}km)"
+
+class GeocodeCacheEntry(models.Model):
+    """Результат геокодирования 2GIS (второй уровень кэша, общий для всех процессов)"""
+    KINDS = [
+        ('geocode', 'Адрес -> координаты'),
+        ('reverse', 'Координаты -> адрес'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    key = models.CharField(max_length=64)  # sha256 нормализованного запроса
+    query = models.TextField()
+    result = models.JSONField(null=True, blank=True)  # null - "не найдено" (негативный кэш)
+    created_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='geocode_cache_kind_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.query}"
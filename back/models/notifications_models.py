@@ -12,8 +12,24 @@ class Notification(models.Model):
             ('new_response', 'New Response'),
             ('response_accepted', 'Response Accepted'),
             ('new_review', 'New Review'),
+            ('new_request', 'New Request'),
         ]
     )
+    # Повторяющиеся уведомления (чат заявки, отклики на заявку) склеиваются в одну строку
+    # по (user, notification_type, target) - например 'chat:12'; count - сколько событий в ней
+    target = models.CharField(max_length=64, blank=True, default='')
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'notification_type', 'target'], name='notification_coalesce_idx'),
+            # Страницы уведомлений по курсору (created_at, id): все подряд и только непрочитанные.
+            # Для непрочитанных индекс частичный: filter(is_read=False) в SQL - "NOT is_read",
+            # по такому условию SQLite не ищет в составном (user, is_read, created_at)
+            models.Index(fields=['user', 'created_at'], name='notification_user_created_idx'),
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_read=False),
+                         name='notification_unread_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message[:50]}"
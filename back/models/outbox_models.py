@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """
+    Побочный эффект записи (уведомление, перенос в список, запись активности),
+    сохраненный в той же транзакции, что и сама запись. Выполняет его
+    отдельный процесс: python manage.py run_outbox_worker
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('done', 'Выполнено'),
+        ('failed', 'Ошибка, попытки исчерпаны'),
+    ]
+
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Не раньше этого момента (отложенная повторная попытка или аренда взявшего событие воркера)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.status})"
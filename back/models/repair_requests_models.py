@@ -3,8 +3,10 @@ from django.contrib.auth.models import User
 from imagekit.models import ImageSpecField
 from pilkit.processors import ResizeToFill
 
+from .geohash import GeohashedModel
 
-class RepairRequest(models.Model):
+
+class RepairRequest(GeohashedModel):
     STATUS_CHOICES = [
         ('new', 'New'),
         ('active', 'In Progress'),
@@ -32,6 +34,25 @@ class RepairRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset-пагинация по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='repair_created_id_idx'),
+            # search_requests: фильтр по статусу / типу устройства + тот же порядок
+            models.Index(fields=['status', 'created_at'], name='repair_status_created_idx'),
+            models.Index(fields=['device_type', 'created_at'], name='repair_device_created_idx'),
+            # get_user_requests
+            models.Index(fields=['created_by', 'created_at'], name='repair_author_created_idx'),
+            # get_user_stats: счётчики по статусу и группировка по типу устройства
+            models.Index(fields=['created_by', 'status', 'device_type'], name='repair_author_stats_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='repair_lat_lon_idx'),
+            models.Index(fields=['geohash'], name='repair_geohash_idx'),
+            # Карта: открытые заявки в bbox, группировка по типу устройства без чтения таблицы
+            models.Index(fields=['status', 'latitude', 'longitude', 'device_type'], name='repair_map_idx'),
+            # Лента работника: догрузка измененных заявок по updated_at
+            models.Index(fields=['updated_at'], name='repair_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -38,6 +38,10 @@ class Response(models.Model):
 
     class Meta:
         unique_together = ['repair_request', 'worker']  # один работник - один отклик на заявку
+        indexes = [
+            # get_user_stats: отклики работника по статусу
+            models.Index(fields=['worker', 'status'], name='response_worker_status_idx'),
+        ]
 
     def __str__(self):
         return f"Response from {self.worker.username} for request #{self.repair_request.id}"
\ No newline at end of file
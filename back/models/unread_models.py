@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from back.models import RepairRequest
+
+
+class UnreadChatCounter(models.Model):
+    """Непрочитанные сообщения пользователя в чате заявки (денормализованный счетчик для /users/me/unread)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='unread_chats')
+    repair_request = models.ForeignKey(RepairRequest, on_delete=models.CASCADE, related_name='unread_counters')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'repair_request'], name='unread_chat_user_request_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} / request #{self.repair_request_id}: {self.count}"
+
+
+class UnreadNotificationCounter(models.Model):
+    """Непрочитанные уведомления пользователя одного типа"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='unread_notifications')
+    notification_type = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification_type'], name='unread_notification_user_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} / {self.notification_type}: {self.count}"
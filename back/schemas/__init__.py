@@ -1,11 +1,13 @@
 from .base_schema import Message
 from .users_schema import (UserSchema, UserCreate,CustomerProfileSchema,WorkerProfileSchema,UserDetailSchema,
                            CustomerProfileUpdate,WorkerProfileUpdate,UserActivitySchema,PasswordChangeSchema,
-                           AvatarUploadSchema,UserStatsSchema)
+                           AvatarUploadSchema,UserStatsSchema,UnreadCountsSchema)
 from .auth_schema import LoginInput, TokenOutput
-from .repair_requests_schema import RepairRequestSchemaIn, RepairRequestSchemaOut
+from .repair_requests_schema import (RepairRequestSchemaIn, RepairRequestSchemaOut, RepairRequestPageSchema,
+                                     MapClusterSchema, RepairMapSchema)
 from .responses_schema import ResponseSchemaIn, ResponseSchemaOut
 from .reviews_schema import ReviewSchemaIn, ReviewSchemaOut
 from .chat_schema import ChatMessageSchemaIn,ChatMessageSchemaOut
+from .notifications_schema import NotificationSchemaOut,NotificationPageSchema,NotificationIdsSchema
 from .userlist_schema import UserListSchemaIn,UserListSchemaOut,UserListDetailSchema,ListItemSchemaOut,ListItemSchemaIn
-from .geolocation_schema import LocationSchema,LocationUpdateSchema,NearbyWorkersResponse,GeocodeResponse,PartsShopSchema,LocationResponse
\ No newline at end of file
+from .geolocation_schema import LocationSchema,LocationUpdateSchema,NearbyWorkersResponse,GeocodeResponse,PartsShopSchema,LocationResponse,RouteSchema
\ No newline at end of file
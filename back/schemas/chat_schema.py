@@ -17,4 +17,4 @@ class ChatMessageSchemaOut(Schema):
 
     @staticmethod
     def resolve_sender(obj):
-        return UserSchema.from_orm(obj.sender)
\ No newline at end of file
+        return obj.sender
\ No newline at end of file
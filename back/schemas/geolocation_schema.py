@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from ninja import Schema
 
@@ -35,4 +35,23 @@ class GeocodeResponse(Schema):
 
 class LocationResponse(Schema):
     exists: bool
-    location: Optional[LocationSchema] = None
\ No newline at end of file
+    location: Optional[LocationSchema] = None
+
+class RoutePointSchema(Schema):
+    latitude: float
+    longitude: float
+
+class RouteStopSchema(Schema):
+    request_id: int
+    title: str
+    address: str
+    latitude: float
+    longitude: float
+    distance_from_previous_km: float
+
+class RouteSchema(Schema):
+    start: Optional[RoutePointSchema] = None
+    stops: List[RouteStopSchema]
+    total_distance_km: float
+    unlocated_request_ids: List[int]
+    optimized: bool
\ No newline at end of file
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import List, Optional
+
+from ninja import Schema
+
+
+class NotificationSchemaOut(Schema):
+    id: int
+    message: str
+    is_read: bool
+    created_at: datetime
+    type: str
+    target: str
+    count: int
+
+    @staticmethod
+    def resolve_type(obj):
+        return obj.notification_type
+
+class NotificationPageSchema(Schema):
+    items: List[NotificationSchemaOut]
+    next_cursor: Optional[str] = None
+    has_next: bool
+
+class NotificationIdsSchema(Schema):
+    ids: List[int]
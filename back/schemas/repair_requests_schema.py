@@ -1,5 +1,5 @@
 from ninja import Schema
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import date, datetime
 from .users_schema import UserSchema
 
@@ -23,7 +23,7 @@ class FileSchemaOut(Schema):
 
     @staticmethod
     def resolve_uploaded_by(obj):
-        return UserSchema.from_orm(obj.uploaded_by)
+        return obj.uploaded_by
 
 class RepairRequestSchemaOut(Schema):
     id: int
@@ -41,8 +41,25 @@ class RepairRequestSchemaOut(Schema):
     files: List[FileSchemaOut] = []
     @staticmethod
     def resolve_created_by(obj):
-        return UserSchema.from_orm(obj.created_by)
+        return obj.created_by
 
     @staticmethod
     def resolve_files(obj):
-        return obj.files.all()
\ No newline at end of file
+        return obj.files.all()
+
+class RepairRequestPageSchema(Schema):
+    items: List[RepairRequestSchemaOut]
+    next_cursor: Optional[str] = None
+    has_next: bool
+
+class MapClusterSchema(Schema):
+    latitude: float
+    longitude: float
+    count: int
+    device_types: Dict[str, int]
+    request_id: Optional[int] = None
+
+class RepairMapSchema(Schema):
+    zoom: int
+    total: int
+    clusters: List[MapClusterSchema]
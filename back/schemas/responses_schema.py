@@ -18,4 +18,4 @@ class ResponseSchemaOut(Schema):
 
     @staticmethod
     def resolve_worker(obj):
-        return UserSchema.from_orm(obj.worker)
+        return obj.worker
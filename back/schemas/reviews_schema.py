@@ -17,8 +17,8 @@ class ReviewSchemaOut(Schema):
 
     @staticmethod
     def resolve_customer(obj):
-        return UserSchema.from_orm(obj.customer)
+        return obj.customer
 
     @staticmethod
     def resolve_worker(obj):
-        return UserSchema.from_orm(obj.worker)
+        return obj.worker
@@ -36,7 +36,7 @@ class ListItemSchemaOut(Schema):
 
     @staticmethod
     def resolve_repair_request(obj):
-        return RepairRequestSchemaOut.from_orm(obj.repair_request)
+        return obj.repair_request
 
 class UserListDetailSchema(Schema):
     list_info: UserListSchemaOut
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 from ninja import Schema
 
@@ -131,3 +131,14 @@ class UserStatsSchema(Schema):
     average_rating: float = 0.0
     favorite_categories: List[str] = []
 
+
+class UnreadChatSchema(Schema):
+    repair_request_id: int
+    count: int
+
+
+class UnreadCountsSchema(Schema):
+    chats: List[UnreadChatSchema] = []
+    notifications: Dict[str, int] = {}
+    total_chat_messages: int = 0
+    total_notifications: int = 0
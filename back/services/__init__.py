@@ -6,4 +6,5 @@ from .review_service import ReviewService
 from .notification_service import NotificationService
 from .chat_service import ChatService
 from .userlist_service import UserListService
-from .pagination_service import PaginationService
\ No newline at end of file
+from .pagination_service import PaginationService, CursorPaginationService
+from .search_service import SearchIndexService
\ No newline at end of file
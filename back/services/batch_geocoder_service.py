@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from back.services.geocode_cache_service import MISSING
+
+
+class TokenBucket:
+    """
+    Ограничение частоты: rate запросов в секунду в среднем, не больше burst подряд.
+    Потокобезопасен: вызовы из разных потоков и циклов событий (очередь геокодирования,
+    команда geocode_repairs, воркер outbox) делят одну квоту. Каждый вызов под блокировкой
+    резервирует себе момент отправки, а ждет его уже без блокировки
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, rate: float, burst: int = 1) -> 'TokenBucket':
+        """Один bucket на процесс для квоты (rate, burst) - общий для всех BatchGeocoder"""
+        with cls._shared_lock:
+            bucket = cls._shared.get((rate, burst))
+            if bucket is None:
+                bucket = cls._shared[(rate, burst)] = cls(rate, burst)
+            return bucket
+
+    def reserve(self) -> float:
+        """Занять токен; возвращает, сколько секунд подождать до отправки (токены уходят в долг)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class BatchGeocoder:
+    """
+    Пакетное геокодирование: уникальные адреса сначала ищутся в кэше геокодирования,
+    остальные запрашиваются у 2GIS параллельно (не больше concurrency одновременно)
+    с ограничением частоты под квоту 2GIS: token bucket общий для всех геокодеров процесса
+    с теми же (rate, burst).
+
+    HTTP-клиент синхронный (общий пул соединений DGisService), поэтому запросы
+    выполняются в пуле потоков, а asyncio управляет параллелизмом и темпом.
+    Работа с БД (кэш) - только в вызывающем потоке, вне цикла событий.
+    """
+
+    def __init__(self, dgis=None, concurrency: int = None, rate: float = None, burst: int = None,
+                 use_cache: bool = True):
+        from back.services.geolocation_service import DGisService
+
+        self.dgis = dgis or DGisService()
+        self.concurrency = concurrency or settings.DGIS_GEOCODE_CONCURRENCY
+        self.rate = rate or settings.DGIS_RATE_LIMIT
+        self.burst = burst or settings.DGIS_RATE_BURST
+        # Квота 2GIS - на процесс, а не на вызов: геокодеры создаются на каждую пачку
+        self.bucket = TokenBucket.shared(self.rate, self.burst)
+        self.use_cache = use_cache
+        self.last_run = {}
+
+    def geocode_many(self, addresses: List[str], city: str = None) -> List[Optional[Dict]]:
+        """
+        Синхронный фасад для Django-кода.
+        Результаты в порядке addresses; None - не найдено или ошибка запроса (ошибки не кэшируются)
+        """
+        batch = self.lookup(addresses, city)
+        return self.store(batch, self.fetch(batch))
+
+    # geocode_many по шагам: lookup и store работают с БД (только в вызывающем потоке),
+    # fetch - только сеть, его можно выполнять в другом потоке, пока пишется предыдущая пачка
+
+    def lookup(self, addresses: List[str], city: str = None) -> SimpleNamespace:
+        """Нормализация и поиск в кэше; что не нашлось - в batch.to_fetch"""
+        batch = SimpleNamespace(addresses=addresses, city=city, started=time.perf_counter(),
+                                queries=[], results={}, to_fetch={})
+        cache = self.dgis.geocode_cache
+        batch.queries = [cache.normalize_address(address, city) for address in addresses]
+        for address, query in zip(addresses, batch.queries):
+            if query in batch.results or query in batch.to_fetch:
+                continue
+            value = cache.get('geocode', query) if self.use_cache else MISSING
+            if value is MISSING:
+                batch.to_fetch[query] = address
+            else:
+                batch.results[query] = value
+        return batch
+
+    def fetch(self, batch: SimpleNamespace) -> list:
+        """Запросы к 2GIS для того, чего нет в кэше (без БД)"""
+        if not batch.to_fetch:
+            return []
+        return async_to_sync(self.fetch_many)(list(batch.to_fetch.values()), batch.city)
+
+    def store(self, batch: SimpleNamespace, fetched: list) -> List[Optional[Dict]]:
+        """Записать полученное в кэш; результаты в порядке addresses"""
+        cache = self.dgis.geocode_cache
+        results = batch.results
+        errors = 0
+        for query, value in zip(batch.to_fetch, fetched):
+            if isinstance(value, Exception):
+                errors += 1
+                results[query] = None
+                continue
+            results[query] = value
+            if self.use_cache:
+                cache.set('geocode', query, value)
+
+        elapsed = time.perf_counter() - batch.started
+        unique = len(set(batch.queries))
+        self.last_run = {
+            'requested': len(batch.addresses),
+            'unique': unique,
+            'cached': unique - len(batch.to_fetch),
+            'fetched': len(batch.to_fetch),
+            'errors': errors,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'fetch_per_second': round(len(batch.to_fetch) / elapsed, 1) if elapsed else 0.0,
+        }
+        return [results[query] for query in batch.queries]
+
+    async def fetch_many(self, addresses: List[str], city: str = None) -> list:
+        """Запросы к 2GIS без кэша; для каждого адреса - результат, None или исключение"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='geocode') as executor:
+            async def fetch(address):
+                async with semaphore:
+                    await self.bucket.acquire()
+                    try:
+                        return await loop.run_in_executor(executor, self.dgis._fetch_geocode, address, city)
+                    except requests.exceptions.RequestException as e:
+                        return e
+
+            return await asyncio.gather(*(fetch(address) for address in addresses))
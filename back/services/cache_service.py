@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from ninja.responses import NinjaJSONEncoder
+
+
+class VersionedCache:
+    """
+    Кэш с версионированными ключами.
+    Ключи содержат текущую версию пространства имён, поэтому bump()
+    одной операцией делает недействительными все ранее сохранённые значения.
+    """
+
+    def __init__(self, namespace: str, timeout: int = 300, alias: str = 'default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.alias = alias
+        self.enabled = timeout != 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self) -> str:
+        return f'{self.namespace}:version'
+
+    @staticmethod
+    def _fresh_version() -> int:
+        # Версия от текущего времени: если ключ версии вытеснят из кэша,
+        # новая версия не совпадёт ни с одной из уже использованных
+        return int(time.time() * 1000)
+
+    def version(self) -> int:
+        version = self.backend.get(self.version_key)
+        if version is None:
+            self.backend.add(self.version_key, self._fresh_version(), None)
+            version = self.backend.get(self.version_key)
+        return version
+
+    def bump(self):
+        """Инвалидировать всё пространство имён"""
+        try:
+            self.backend.incr(self.version_key)
+        except ValueError:
+            self.backend.set(self.version_key, self._fresh_version(), None)
+
+    def make_key(self, name: str, params=()) -> str:
+        digest = hashlib.md5(json.dumps(params, default=str).encode()).hexdigest()
+        return f'{self.namespace}:v{self.version()}:{name}:{digest}'
+
+    def get_or_set(self, name: str, params, producer):
+        if not self.enabled:
+            return producer()
+
+        key = self.make_key(name, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+
+        self._count(hit=False)
+        value = producer()
+        self.backend.set(key, value, self.timeout)
+        return value
+
+    def json_response(self, name: str, params, schema, producer) -> HttpResponse:
+        """
+        Закэшировать уже отрендеренный JSON ответа.
+        При попадании в кэш не выполняется ни одного запроса к БД и сериализации.
+        """
+        content = self.get_or_set(name, params, lambda: self.render(schema, producer()))
+        return HttpResponse(content, content_type='application/json; charset=utf-8')
+
+    @staticmethod
+    def render(schema, value) -> bytes:
+        """Отрендерить значение так же, как это делает ninja для response=schema"""
+        if schema is not None:
+            value = schema.from_orm(value).model_dump()
+        return json.dumps(value, cls=NinjaJSONEncoder).encode()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'namespace': self.namespace,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
@@ -1,95 +1,187 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from ninja.errors import HttpError
 
 from back import models
 from back.models import RepairRequest, Response
 from back.models.chat_model import ChatMessage
+from back.services.event_bus_service import EventService
 from back.services.notification_service import NotificationService
+from back.services.outbox_service import OutboxService
+from back.services.unread_service import UnreadService
+from back.services.user_service import UserService
 
 
 class ChatService:
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
     @staticmethod
     def send_message(repair_request_id: int, message_text: str, sender):
-        try:
-            repair_request = RepairRequest.objects.get(id=repair_request_id)
+        repair_request = ChatService._load_chat(repair_request_id, sender)
 
-            # Проверяем, что пользователь имеет доступ к чату
-            if not ChatService._has_chat_access(repair_request, sender):
-                raise HttpError(403, "No access to this chat")
+        # Проверяем, что пользователь имеет доступ к чату
+        if not ChatService._remember_access(repair_request, sender):
+            raise HttpError(403, "No access to this chat")
 
+        participants = ChatService._participant_ids(repair_request)
+        with transaction.atomic():
             message = ChatMessage.objects.create(
                 repair_request=repair_request,
                 sender=sender,
                 message=message_text
             )
+            UnreadService.chat_message_sent(repair_request.id, participants - {sender.id})
 
-            # Отправляем уведомление другому участнику
-            ChatService._notify_new_message(repair_request, message, sender)
+            # Уведомление другому участнику - в воркере outbox
+            OutboxService.enqueue('chat_message_sent', message_id=message.id)
+            # Открытым соединениям участников (и другим вкладкам отправителя) - сразу
+            EventService.chat_message_created(message, participants)
 
-            return message
+        return message
+
+    @staticmethod
+    def _has_chat_access(repair_request, user):
+        # Доступ имеют: автор заявки и откликнувшиеся работники
+        if repair_request.created_by_id == user.id:
+            return True
+        # has_response уже посчитан в _load_chat, иначе - отдельный запрос
+        has_response = getattr(repair_request, 'has_response', None)
+        if has_response is None:
+            has_response = models.Response.objects.filter(repair_request=repair_request, worker=user).exists()
+        return has_response
 
+    @staticmethod
+    def _load_chat(repair_request_id: int, user):
+        """Заявка вместе с признаком отклика пользователя - один запрос"""
+        try:
+            return RepairRequest.objects.annotate(
+                has_response=Exists(Response.objects.filter(repair_request=OuterRef('pk'), worker_id=user.id))
+            ).get(id=repair_request_id)
         except RepairRequest.DoesNotExist:
             raise HttpError(404, "Repair request not found")
 
     @staticmethod
-    def _has_chat_access(repair_request, user):
-        # Доступ имеют: автор заявки и принятый работник
-        if repair_request.created_by == user:
-            return True
-        if models.Response.objects.filter(repair_request=repair_request, worker=user).exists():
-            return True
-        # Проверяем, есть ли принятый отклик от этого пользователя
-        return False
+    def _access_key(repair_request_id: int, user_id: int) -> str:
+        return f'chat_access:{repair_request_id}:{user_id}'
+
+    @staticmethod
+    def _access_cache():
+        """
+        Кэш решений о доступе или None. forget_access сбрасывает решение только в том кэше,
+        где оно лежит, поэтому подходит лишь общий для всех процессов backend: с кэшем в памяти
+        процесса другие воркеры gunicorn отдавали бы устаревший 403 или 200 по удаленной заявке
+        """
+        if not settings.CHAT_ACCESS_CACHE_TTL or settings.CHAT_ACCESS_CACHE not in settings.CACHES:
+            return None
+        backend = caches[settings.CHAT_ACCESS_CACHE]
+        if isinstance(backend, (LocMemCache, DummyCache)):
+            return None
+        return backend
+
+    @staticmethod
+    def _remember_access(repair_request, user) -> bool:
+        allowed = ChatService._has_chat_access(repair_request, user)
+        access_cache = ChatService._access_cache()
+        if access_cache is not None:
+            access_cache.set(ChatService._access_key(repair_request.id, user.id), allowed,
+                             settings.CHAT_ACCESS_CACHE_TTL)
+        return allowed
+
+    @staticmethod
+    def check_chat_access(repair_request_id: int, user):
+        """
+        403/404, если пользователь не может читать чат. С общим кэшем (CHAT_ACCESS_CACHE)
+        решение кэшируется на CHAT_ACCESS_CACHE_TTL секунд по (заявка, пользователь): опрос чата
+        при попадании в кэш не делает ни одного запроса на проверку; без него - один запрос
+        """
+        access_cache = ChatService._access_cache()
+        allowed = None
+        if access_cache is not None:
+            allowed = access_cache.get(ChatService._access_key(repair_request_id, user.id))
+        if allowed is None:
+            allowed = ChatService._remember_access(ChatService._load_chat(repair_request_id, user), user)
+        if not allowed:
+            raise HttpError(403, "No access to this chat")
+
+    @staticmethod
+    def forget_access(repair_request_id: int, user_ids):
+        """Сбросить закэшированный доступ после коммита (новый/принятый отклик, удаление заявки)"""
+        access_cache = ChatService._access_cache()
+        if access_cache is None:
+            return
+        keys = [ChatService._access_key(repair_request_id, user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: access_cache.delete_many(keys))
+
+    @staticmethod
+    def _participant_ids(repair_request) -> set:
+        """Все, у кого есть доступ к чату: автор заявки и откликнувшиеся работники"""
+        workers = models.Response.objects.filter(repair_request=repair_request).values_list('worker_id', flat=True)
+        return {repair_request.created_by_id, *workers}
 
     @staticmethod
     def _notify_new_message(repair_request, message, sender):
         # Определяем получателя уведомления
-        if sender == repair_request.created_by:
+        recipient = None
+        if sender.id == repair_request.created_by_id:
             # Отправляем работнику
             accepted_response = Response.objects.filter(
                 repair_request=repair_request,
                 status='accepted'
-            ).first()
+            ).select_related('worker').first()
             if accepted_response:
                 recipient = accepted_response.worker
         else:
             # Отправляем автору заявки
             recipient = repair_request.created_by
+        if recipient is None:
+            # Отклик еще не принят - уведомлять некого
+            return
 
+        # Серия сообщений склеивается в одно уведомление со счетчиком
         NotificationService.create_notification(
             recipient,
             f"Новое сообщение в чате по заявке '{repair_request.title}'",
-            'new_message'
+            'new_message',
+            target=f'chat:{repair_request.id}'
         )
 
     @staticmethod
-    def get_chat_messages(repair_request_id: int, user):
-        try:
-            repair_request = RepairRequest.objects.get(id=repair_request_id)
-
-            if not ChatService._has_chat_access(repair_request, user):
-                raise HttpError(403, "No access to this chat")
-
-            return ChatMessage.objects.filter(
-                repair_request=repair_request
-            ).select_related('sender').order_by('created_at')
-
-        except RepairRequest.DoesNotExist:
-            raise HttpError(404, "Repair request not found")
+    def get_chat_messages(repair_request_id: int, user, since_id: int = None, before_id: int = None,
+                          limit: int = DEFAULT_PAGE_SIZE):
+        """
+        Сообщения чата по возрастанию id, не больше limit за раз.
+        since_id - только новее (для опроса: передается id последнего полученного),
+        before_id - более старые (прокрутка истории вверх); без них - последние limit сообщений.
+        Выборка идет по индексу (repair_request, id), поэтому опрос стоит O(новых сообщений)
+        """
+        ChatService.check_chat_access(repair_request_id, user)
+
+        limit = max(1, min(limit, ChatService.MAX_PAGE_SIZE))
+        messages = ChatMessage.objects.filter(
+            repair_request_id=repair_request_id
+        ).select_related(*UserService.user_type_relations('sender'))
+        if before_id is not None:
+            messages = messages.filter(id__lt=before_id)
+        if since_id is not None:
+            return messages.filter(id__gt=since_id).order_by('id')[:limit]
+
+        # Последние limit сообщений (до before_id), отдаются по возрастанию
+        return list(messages.order_by('-id')[:limit])[::-1]
 
     @staticmethod
     def mark_messages_as_read(repair_request_id: int, user):
-        try:
-            repair_request = RepairRequest.objects.get(id=repair_request_id)
+        ChatService.check_chat_access(repair_request_id, user)
 
-            if not ChatService._has_chat_access(repair_request, user):
-                raise HttpError(403, "No access to this chat")
-
-            # Помечаем все сообщения не от пользователя как прочитанные
+        # Помечаем все сообщения не от пользователя как прочитанные
+        with transaction.atomic():
             ChatMessage.objects.filter(
                 repair_request_id=repair_request_id
             ).exclude(sender=user).update(is_read=True)
+            UnreadService.chat_read(repair_request_id, user)
 
-            return {"message": "Messages marked as read"}
-
-        except RepairRequest.DoesNotExist:
-            raise HttpError(404, "Repair request not found")
\ No newline at end of file
+        return {"message": "Messages marked as read"}
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from back.models import Notification
+from back.services.notification_service import NotificationService
+
+
+class RequestDispatcher:
+    """
+    Рассылка новых заявок подходящим работникам.
+    create_request записывает событие outbox 'request_created' в той же транзакции, что и заявку,
+    поэтому рассылка не теряется при рестарте или падении процесса. Воркер outbox дополняет
+    координаты (если геокодирование еще не успело) и передает сюда уже загруженные заявки:
+    dispatch подбирает работников (рядом по координатам + по зонам обслуживания, с учетом
+    специализации) и создает уведомления одним bulk_create на вызов.
+    """
+
+    NOTIFICATION_TYPE = 'new_request'
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, radius_km: float = 10, max_workers: int = 200):
+        self.radius_km = radius_km
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def dispatch(self, repair_requests: List) -> int:
+        """
+        Разослать заявки (с title, device_type, address, latitude/longitude, created_by_id, created_at);
+        возвращает число созданных уведомлений
+        """
+        started = time.perf_counter()
+        notifications = []
+        for repair_request in repair_requests:
+            message = f"Новая заявка рядом: '{repair_request.title}'"
+            notifications.extend(
+                Notification(user_id=worker_id, message=message, notification_type=self.NOTIFICATION_TYPE)
+                for worker_id in self.match_workers(repair_request)
+            )
+
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+            NotificationService.notifications_created(notifications)
+
+        finished = timezone.now()
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(repair_requests)
+            self._stats['notifications'] += len(notifications)
+            self._stats['busy_seconds'] += time.perf_counter() - started
+            self._latencies.extend(
+                (finished - repair_request.created_at).total_seconds() for repair_request in repair_requests
+            )
+        return len(notifications)
+
+    def match_workers(self, repair_request) -> List[int]:
+        """Работники в радиусе с подходящей специализацией, затем по зонам обслуживания; без автора заявки"""
+        from back.services.geolocation_service import LocationService
+        from back.services.service_area_service import ServiceAreaService
+
+        latitude, longitude = repair_request.latitude, repair_request.longitude
+        device_type = repair_request.device_type.lower()
+        workers = []
+        if latitude is not None and longitude is not None and LocationService.worker_index.enabled:
+            # +1: автор заявки может оказаться среди ближайших
+            workers = LocationService.worker_index.nearby_ids(
+                latitude, longitude, self.radius_km, device_type=device_type, limit=self.max_workers + 1
+            )
+        elif latitude is not None and longitude is not None:
+            workers = [
+                worker['worker_id'] for worker in LocationService.find_nearby_workers_db(latitude, longitude, self.radius_km)
+                if not worker['specialization'] or device_type in worker['specialization'].lower()
+            ]
+        workers += ServiceAreaService.find_matching_workers(repair_request)
+
+        workers = [worker_id for worker_id in dict.fromkeys(workers) if worker_id != repair_request.created_by_id]
+        return workers[:self.max_workers]
+
+    def stats(self) -> Dict:
+        """Сквозная задержка (от создания заявки до записи уведомлений) и пропускная способность"""
+        with self._lock:
+            stats = {key: value for key, value in self._stats.items() if key != 'busy_seconds'}
+            latencies = sorted(self._latencies)
+            busy = self._stats['busy_seconds']
+        if latencies:
+            stats['latency_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats['latency_p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+        stats['requests_per_second'] = round(stats['requests'] / busy, 1) if busy else 0.0
+        stats['notifications_per_second'] = round(stats['notifications'] / busy, 1) if busy else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'batches': 0, 'requests': 0, 'notifications': 0, 'busy_seconds': 0.0}
+            self._latencies = deque(maxlen=self.LATENCY_WINDOW)
@@ -0,0 +1,47 @@
+from typing import Optional
+
+import numpy as np
+
+
+class DistanceService:
+    """Векторизованный расчет расстояний по прямой (haversine, км)"""
+
+    EARTH_RADIUS_KM = 6371.0
+
+    @staticmethod
+    def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+        """
+        Расстояние между точками; аргументы - числа или массивы,
+        совместимые по broadcasting (например, (n, 1) и (m,) дают матрицу n x m)
+        """
+        lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return DistanceService.EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    @staticmethod
+    def distance_matrix(origins, destinations) -> np.ndarray:
+        """Матрица расстояний len(origins) x len(destinations) для списков пар (lat, lon)"""
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        return DistanceService.haversine_km(
+            origins[:, 0:1], origins[:, 1:2],
+            destinations[:, 0], destinations[:, 1]
+        )
+
+    @staticmethod
+    def nearest(distances: np.ndarray, k: Optional[int] = None, max_distance: Optional[float] = None) -> np.ndarray:
+        """
+        Индексы ближайших точек по возрастанию расстояния.
+        Отбор k лучших через argpartition - O(n), сортируются только они.
+        """
+        if k is not None and k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        candidates = np.arange(len(distances))
+        if max_distance is not None:
+            candidates = np.flatnonzero(distances <= max_distance)
+
+        if k is not None and k < len(candidates):
+            top = np.argpartition(distances[candidates], k - 1)[:k]
+            candidates = candidates[top]
+
+        return candidates[np.argsort(distances[candidates], kind='stable')]
@@ -0,0 +1,353 @@
+import asyncio
+import hmac
+import ipaddress
+import itertools
+import json
+import socket
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+from ninja.responses import NinjaJSONEncoder
+
+
+def broker_address(url: str) -> tuple:
+    """'unix:///run/events.sock' -> ('unix', path); 'tcp://127.0.0.1:8765' -> ('tcp', (host, port))"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'unix':
+        return 'unix', parsed.path
+    if parsed.scheme == 'tcp' and parsed.hostname and parsed.port is not None:
+        return 'tcp', (parsed.hostname, parsed.port)
+    raise ValueError(f"Unsupported broker url: {url}")
+
+
+def broker_secret() -> str:
+    """Общий секрет брокера: EVENTS_BROKER_SECRET или производный от SECRET_KEY"""
+    return settings.EVENTS_BROKER_SECRET or salted_hmac('back.events.broker', 'broker').hexdigest()
+
+
+class Subscription:
+    """Подписка одного соединения: очередь событий в event loop этого соединения"""
+
+    def __init__(self, user_id: int, loop, queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, event: Dict):
+        # Медленный клиент не должен копить память: теряем самое старое событие
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """
+    Pub/sub внутри процесса для доставки событий открытым соединениям (SSE).
+
+    publish() потокобезопасен: синхронный код (обработчики запросов, фоновые потоки)
+    передает событие в event loop подписчика через call_soon_threadsafe.
+    Если задан broker_url, события идут через брокер (команда run_event_broker),
+    который рассылает их всем процессам - и этот процесс получает свои события обратно.
+    Первой строкой соединения с брокером отправляется общий секрет.
+    Без брокера события видят только соединения этого процесса.
+    """
+
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, queue_size: int = 100, broker_url: str = '', broker_secret: str = None):
+        self.queue_size = queue_size
+        self.broker_url = broker_url
+        self._broker_secret = broker_secret
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._publisher = None
+        self._publisher_lock = threading.Lock()
+        self._listener_loop = None
+        self._listener = None
+        self._stats = {'published': 0, 'delivered': 0, 'broker_errors': 0}
+
+    # Подписчики (вызываются из event loop соединения)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, loop, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        if self.broker_url:
+            self._ensure_listener(loop)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    # Публикация (из любого потока)
+
+    def publish(self, user_ids: Iterable[int], event_type: str, data: Dict):
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        self._stats['published'] += 1
+        event = {'type': event_type, 'data': data}
+        if self.broker_url and self._publish_to_broker(user_ids, event):
+            return
+        self.deliver(user_ids, event)
+
+    def publish_on_commit(self, user_ids: Iterable[int], event_type: str, data: Dict):
+        user_ids = list(user_ids)
+        transaction.on_commit(lambda: self.publish(user_ids, event_type, data))
+
+    def deliver(self, user_ids: Iterable[int], event: Dict):
+        """Раздать событие подписчикам этого процесса"""
+        with self._lock:
+            targets = [s for user_id in user_ids for s in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            item = {**event, 'id': next(self._sequence)}
+            subscription.loop.call_soon_threadsafe(subscription.push, item)
+        self._stats['delivered'] += len(targets)
+
+    def stats(self) -> Dict:
+        return {**self._stats, 'connections': self.connections()}
+
+    # Брокер
+
+    def _publish_to_broker(self, user_ids, event) -> bool:
+        line = json.dumps({'users': user_ids, 'event': event}, cls=NinjaJSONEncoder).encode() + b'\n'
+        with self._publisher_lock:
+            for _ in range(2):  # одно переподключение, если брокер перезапускался
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    self._publisher.sendall(line)
+                    return True
+                except OSError:
+                    self._stats['broker_errors'] += 1
+                    self._close_publisher()
+        # Брокер недоступен - доставляем хотя бы своим соединениям
+        return False
+
+    def _auth_line(self) -> bytes:
+        return (self._broker_secret or broker_secret()).encode() + b'\n'
+
+    def _connect(self) -> socket.socket:
+        kind, address = broker_address(self.broker_url)
+        family = socket.AF_UNIX if kind == 'unix' else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(settings.EVENTS_BROKER_TIMEOUT)
+        sock.connect(address)
+        sock.sendall(self._auth_line())
+        return sock
+
+    def _close_publisher(self):
+        if self._publisher is not None:
+            try:
+                self._publisher.close()
+            except OSError:
+                pass
+            self._publisher = None
+
+    def _ensure_listener(self, loop):
+        with self._lock:
+            if self._listener_loop is loop:
+                return
+            self._listener_loop = loop
+        self._listener = loop.create_task(self._listen(loop))
+
+    def close(self):
+        """Отключиться от брокера (остановка процесса, тесты)"""
+        with self._publisher_lock:
+            self._close_publisher()
+        self._listener_loop = None
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self, loop):
+        """Читать события брокера и раздавать их подписчикам процесса"""
+        kind, address = broker_address(self.broker_url)
+        while self._listener_loop is loop:
+            try:
+                if kind == 'unix':
+                    reader, writer = await asyncio.open_unix_connection(address)
+                else:
+                    reader, writer = await asyncio.open_connection(*address)
+                try:
+                    writer.write(self._auth_line())
+                    await writer.drain()
+                    while line := await reader.readline():
+                        message = json.loads(line)
+                        self.deliver(message['users'], message['event'])
+                finally:
+                    writer.close()
+            except (OSError, ValueError, KeyError):
+                self._stats['broker_errors'] += 1
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+
+class EventBroker:
+    """
+    Локальный брокер для нескольких процессов: каждая строка (JSON) от любого клиента
+    пересылается всем подключенным клиентам. Клиент, который не успевает читать, отключается.
+
+    Первая строка клиента - общий секрет (broker_secret); без него соединение закрывается,
+    не получив и не разослав ни одного события. TCP слушает только loopback-адрес,
+    если явно не разрешено другое (allow_remote)
+    """
+
+    MAX_CLIENT_BUFFER = 1024 * 1024
+
+    def __init__(self, url: str, secret: str = None, allow_remote: bool = False):
+        self.url = url
+        self.secret = secret or broker_secret()
+        self.allow_remote = allow_remote
+        self.clients = set()
+        self.forwarded = 0
+        self.rejected = 0
+        self.server = None
+
+    async def start(self):
+        kind, address = broker_address(self.url)
+        if kind == 'unix':
+            self.server = await asyncio.start_unix_server(self._handle, path=address)
+        else:
+            if not self.allow_remote and not self.is_loopback(address[0]):
+                raise ValueError(f"Broker must listen on a loopback address, got {address[0]}")
+            self.server = await asyncio.start_server(self._handle, *address)
+        return self.server
+
+    @staticmethod
+    def is_loopback(host: str) -> bool:
+        if host == 'localhost':
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    async def _authenticate(self, reader) -> bool:
+        try:
+            line = await asyncio.wait_for(reader.readline(), settings.EVENTS_BROKER_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return hmac.compare_digest(line.rstrip(b'\n'), self.secret.encode())
+
+    async def _handle(self, reader, writer):
+        try:
+            if not await self._authenticate(reader):
+                self.rejected += 1
+                writer.close()
+                return
+        except (ConnectionError, ValueError):
+            writer.close()
+            return
+
+        self.clients.add(writer)
+        try:
+            while line := await reader.readline():
+                self.forwarded += 1
+                for client in list(self.clients):
+                    if client.transport.get_write_buffer_size() > self.MAX_CLIENT_BUFFER:
+                        client.close()
+                        self.clients.discard(client)
+                        continue
+                    client.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+class EventService:
+    """События для клиентов в реальном времени: новые сообщения чата и уведомления"""
+
+    bus = EventBus(queue_size=settings.EVENTS_QUEUE_SIZE, broker_url=settings.EVENTS_BROKER_URL)
+    TICKET_SALT = 'back.events.stream-ticket'
+
+    @staticmethod
+    def issue_ticket(user) -> Dict:
+        """
+        Билет для EventSource (?ticket=): браузер не умеет заголовки, а JWT в URL попал бы
+        в логи и историю. Билет подписан, живет EVENTS_TICKET_TTL секунд и годится только для потока
+        """
+        return {
+            'ticket': signing.dumps({'user_id': user.id}, salt=EventService.TICKET_SALT, compress=True),
+            'expires_in': settings.EVENTS_TICKET_TTL,
+        }
+
+    @staticmethod
+    def ticket_user_id(ticket: str) -> Optional[int]:
+        """id пользователя из билета или None, если билет подделан или просрочен"""
+        try:
+            payload = signing.loads(ticket, salt=EventService.TICKET_SALT, max_age=settings.EVENTS_TICKET_TTL)
+        except signing.BadSignature:
+            return None
+        return payload.get('user_id') if isinstance(payload, dict) else None
+
+    @staticmethod
+    def notification_payload(notification) -> Dict:
+        return {
+            'id': notification.id,
+            'message': notification.message,
+            'type': notification.notification_type,
+            'count': notification.count,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at,
+        }
+
+    @staticmethod
+    def notifications_created(notifications: Iterable):
+        """Разослать после коммита; вызывать внутри транзакции, где уведомления созданы"""
+        for notification in notifications:
+            EventService.bus.publish_on_commit(
+                [notification.user_id], 'notification', EventService.notification_payload(notification)
+            )
+
+    @staticmethod
+    def chat_message_created(message, recipient_ids: Iterable[int]):
+        EventService.bus.publish_on_commit(recipient_ids, 'chat_message', {
+            'id': message.id,
+            'repair_request_id': message.repair_request_id,
+            'sender_id': message.sender_id,
+            'message': message.message,
+            'created_at': message.created_at,
+        })
+
+    @staticmethod
+    def format_sse(event: Dict) -> str:
+        data = json.dumps(event['data'], cls=NinjaJSONEncoder, ensure_ascii=False)
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    @staticmethod
+    async def stream(subscription: Subscription, keepalive: Optional[float] = None):
+        """Тело ответа text/event-stream; подписка снимается, когда клиент отключился"""
+        keepalive = settings.EVENTS_KEEPALIVE if keepalive is None else keepalive
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    # Комментарий SSE - не дает прокси закрыть простаивающее соединение
+                    yield f': ping {int(time.time())}\n\n'
+                    continue
+                yield EventService.format_sse(event)
+        finally:
+            EventService.bus.unsubscribe(subscription)
@@ -0,0 +1,168 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+# Отличает "в кэше нет" от закэшированного "не найдено" (None)
+MISSING = object()
+
+
+class GeocodeCache:
+    """
+    Двухуровневый кэш геокодирования:
+    1) LRU в памяти процесса - без обращений к БД;
+    2) таблица GeocodeCacheEntry - общая для процессов и переживает рестарт.
+    "Не найдено" тоже кэшируется (с отдельным, более коротким TTL),
+    ошибки сети и API - нет. Истекшие строки таблицы раз в час удаляет
+    воркер outbox (purge_expired), иначе она растет без ограничений.
+    """
+
+    COORDINATE_PRECISION = 4  # ~11 м: соседние точки дают один ключ обратного геокодирования
+
+    def __init__(self, ttl: int = 30 * 24 * 3600, negative_ttl: int = 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.enabled = ttl != 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @staticmethod
+    def normalize_address(address: str, city: str = None) -> str:
+        """Регистр, пробелы и знаки препинания не влияют на ключ"""
+        def normalize(text):
+            return re.sub(r'[\s,.;]+', ' ', (text or '').lower().replace('ё', 'е')).strip()
+        return f"{normalize(city)}|{normalize(address)}"
+
+    @classmethod
+    def coordinates_query(cls, lat: float, lon: float) -> str:
+        return f"{round(lat, cls.COORDINATE_PRECISION):.{cls.COORDINATE_PRECISION}f}," \
+               f"{round(lon, cls.COORDINATE_PRECISION):.{cls.COORDINATE_PRECISION}f}"
+
+    @staticmethod
+    def make_key(query: str) -> str:
+        return hashlib.sha256(query.encode()).hexdigest()
+
+    def get(self, kind: str, query: str):
+        """Значение из кэша (в т.ч. None - "не найдено") или MISSING"""
+        if not self.enabled:
+            return MISSING
+
+        value = self._memory_get((kind, query))
+        if value is not MISSING:
+            self._count('memory_hits', negative=value is None)
+            return value
+
+        value = self._db_get(kind, query)
+        if value is not MISSING:
+            self._count('db_hits', negative=value is None)
+            return value
+
+        self._count('misses')
+        return MISSING
+
+    def set(self, kind: str, query: str, value):
+        if not self.enabled:
+            return
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._memory_set((kind, query), value, ttl)
+        self._db_set(kind, query, value, ttl)
+
+    def get_or_fetch(self, kind: str, query: str, fetch):
+        """
+        Значение из кэша или результат fetch().
+        fetch должен выбрасывать исключение при ошибке, чтобы сбой API не закэшировался как "не найдено"
+        """
+        value = self.get(kind, query)
+        if value is MISSING:
+            value = fetch()
+            self.set(kind, query, value)
+        return value
+
+    def _memory_get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[cache_key]
+                return MISSING
+            self._entries.move_to_end(cache_key)
+            return value
+
+    def _memory_set(self, cache_key, value, ttl: int):
+        with self._lock:
+            self._entries[cache_key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _db_get(self, kind: str, query: str):
+        from back.models.geolocation_models import GeocodeCacheEntry
+
+        entry = GeocodeCacheEntry.objects.filter(
+            kind=kind, key=self.make_key(query), expires_at__gt=timezone.now()
+        ).values_list('result', 'expires_at').first()
+        if entry is None:
+            return MISSING
+
+        value, expires_at = entry
+        # В памяти держим не дольше, чем запись в БД
+        self._memory_set((kind, query), value, (expires_at - timezone.now()).total_seconds())
+        return value
+
+    def _db_set(self, kind: str, query: str, value, ttl: int):
+        from back.models.geolocation_models import GeocodeCacheEntry
+
+        defaults = {
+            'query': query,
+            'result': value,
+            'expires_at': timezone.now() + timedelta(seconds=ttl),
+        }
+        try:
+            with transaction.atomic():
+                GeocodeCacheEntry.objects.update_or_create(kind=kind, key=self.make_key(query), defaults=defaults)
+        except IntegrityError:  # ту же запись одновременно вставил другой процесс
+            pass
+
+    @staticmethod
+    def purge_expired(chunk_size: int = 1000) -> int:
+        """Удалить истекшие записи второго уровня - порциями, чтобы не держать блокировку записи долго"""
+        from back.models.geolocation_models import GeocodeCacheEntry
+
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(GeocodeCacheEntry.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            deleted += GeocodeCacheEntry.objects.filter(id__in=ids).delete()[0]
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _count(self, counter: str, negative: bool = False):
+        with self._lock:
+            self._stats[counter] += 1
+            if negative:
+                self._stats['negative_hits'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'negative_hits': 0}
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from back.models import geohash
+
+
+class RepairGeocodingQueue:
+    """
+    Очередь геокодирования заявок вне запроса пользователя.
+    Задания группируются по адресу: одинаковые адреса геокодируются один раз
+    (пакетно через BatchGeocoder), координаты записываются всем заявкам с этим адресом.
+
+    mode='background' - задания выполняет фоновый поток процесса;
+    mode='manual' - только явный вызов process_pending() (тесты, скрипты).
+    Очередь в памяти: задания, потерянные при рестарте, подбирает команда geocode_repairs,
+    а новые заявки перед рассылкой дополняет воркер outbox (geocode_now).
+    """
+
+    def __init__(self, mode: str = 'background', batch_delay: float = 0.5):
+        self.mode = mode
+        self.batch_delay = batch_delay
+        self.processed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def enqueue(self, repair_request):
+        """Поставить заявку в очередь (вызывать после коммита)"""
+        address = repair_request.address or ''
+        # Без ключа 2GIS геокодировать нечем - заявку подберет backfill
+        if not address.strip() or not os.getenv('DGIS_API_KEY'):
+            return
+
+        with self._lock:
+            self._pending.setdefault(address, set()).add(repair_request.id)
+
+        if self.mode == 'background':
+            self._ensure_worker()
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(ids) for ids in self._pending.values())
+
+    def process_pending(self, geocoder=None) -> int:
+        """Выполнить накопленные задания; возвращает число обновленных заявок"""
+        with self._lock:
+            jobs, self._pending = self._pending, {}
+        if not jobs:
+            return 0
+
+        if geocoder is None:
+            from back.services.batch_geocoder_service import BatchGeocoder
+            geocoder = BatchGeocoder()
+
+        updated = self.apply(jobs, geocoder.geocode_many(list(jobs)))
+        self.processed += updated
+        return updated
+
+    @staticmethod
+    def geocode_now(repair_request, geocoder=None) -> bool:
+        """
+        Геокодировать одну заявку сразу, если координат еще нет (воркер outbox перед рассылкой).
+        Координаты записываются в базу и в сам объект
+        """
+        address = repair_request.address or ''
+        if repair_request.latitude is not None or not address.strip() or not os.getenv('DGIS_API_KEY'):
+            return False
+
+        if geocoder is None:
+            from back.services.batch_geocoder_service import BatchGeocoder
+            geocoder = BatchGeocoder()
+        result = geocoder.geocode_many([address])[0]
+        if not result or not RepairGeocodingQueue.apply({address: [repair_request.id]}, [result]):
+            return False
+        repair_request.latitude, repair_request.longitude = result['latitude'], result['longitude']
+        return True
+
+    @staticmethod
+    def apply(jobs: Dict[str, Iterable[int]], results) -> int:
+        """
+        Записать координаты. Условие по адресу защищает от гонки:
+        если адрес успели изменить, результат для старого адреса не запишется
+        """
+        from back.models import RepairRequest
+        from back.services.repair_request_service import RepairRequestService
+
+        updated = 0
+        for (address, ids), result in zip(jobs.items(), results):
+            if not result:
+                continue
+            updated += RepairRequest.objects.filter(id__in=list(ids), address=address).update(
+                latitude=result['latitude'],
+                longitude=result['longitude'],
+                geohash=geohash.encode(result['latitude'], result['longitude']),
+                # update() не трогает auto_now, а по updated_at лента подхватывает изменения
+                updated_at=timezone.now(),
+            )
+        if updated:
+            RepairRequestService.invalidate_cache()
+        return updated
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='repair-geocoding', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Небольшая пауза, чтобы собрать пачку заданий
+            time.sleep(self.batch_delay)
+            try:
+                self.process_pending()
+            except Exception as e:
+                print(f"Repair geocoding error: {e}")
+            finally:
+                close_old_connections()
+
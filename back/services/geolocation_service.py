@@ -1,9 +1,20 @@
 import os
 from typing import Optional, Dict, List
 
+import numpy as np
 import requests
+from django.conf import settings
+from django.db import transaction
 from ninja.errors import HttpError
 
+from back.models import geohash
+from back.services.cache_service import VersionedCache
+from back.services.distance_service import DistanceService
+from back.services.geocode_cache_service import GeocodeCache
+from back.services.http_client_service import HttpClient, CircuitBreaker
+from back.services.repair_feed_service import RepairFeedService
+from back.services.worker_index_service import WorkerLocationIndex
+
 
 class DGisService:
     """Сервис для работы с 2GIS API"""
@@ -11,6 +22,20 @@ class DGisService:
     BASE_URL = "https://catalog.api.2gis.com/3.0"
     GEOCODE_URL = "https://geo.api.2gis.com/3.0"
 
+    # Общие для процесса пул соединений и circuit breaker
+    http = HttpClient(
+        timeout=settings.DGIS_HTTP_TIMEOUT,
+        retries=settings.DGIS_HTTP_RETRIES,
+        deadline=settings.DGIS_HTTP_DEADLINE,
+        pool_size=max(10, settings.DGIS_GEOCODE_CONCURRENCY),
+        breaker=CircuitBreaker(settings.DGIS_BREAKER_THRESHOLD, settings.DGIS_BREAKER_RESET_TIMEOUT)
+    )
+    geocode_cache = GeocodeCache(
+        ttl=settings.GEOCODE_CACHE_TTL,
+        negative_ttl=settings.GEOCODE_NEGATIVE_TTL,
+        max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES
+    )
+
     def __init__(self):
         self.api_key = os.getenv('DGIS_API_KEY')
         if not self.api_key:
@@ -20,6 +45,14 @@ class DGisService:
         """
         Геокодирование адреса - преобразование текста в координаты
         """
+        query = self.geocode_cache.normalize_address(address, city)
+        try:
+            return self.geocode_cache.get_or_fetch('geocode', query, lambda: self._fetch_geocode(address, city))
+        except requests.exceptions.RequestException as e:
+            print(f"2GIS Geocoding error: {e}")
+            return None
+
+    def _fetch_geocode(self, address: str, city: str = None) -> Optional[Dict]:
         url = f"{self.GEOCODE_URL}/geocode"
         params = {
             'q': address,
@@ -30,30 +63,33 @@ class DGisService:
         if city:
             params['region'] = city
 
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get('result') and data['result'].get('items'):
-                first_result = data['result']['items'][0]
-                return {
-                    'latitude': first_result['point']['lat'],
-                    'longitude': first_result['point']['lon'],
-                    'full_address': first_result['full_name'],
-                    'confidence': 'high'
-                }
+        response = self.http.get('geocode', url, params=params)
+        response.raise_for_status()
+        data = response.json()
 
-            return None
+        if data.get('result') and data['result'].get('items'):
+            first_result = data['result']['items'][0]
+            return {
+                'latitude': first_result['point']['lat'],
+                'longitude': first_result['point']['lon'],
+                'full_address': first_result['full_name'],
+                'confidence': 'high'
+            }
 
-        except requests.exceptions.RequestException as e:
-            print(f"2GIS Geocoding error: {e}")
-            return None
+        return None
 
     def reverse_geocode(self, lat: float, lon: float) -> Optional[str]:
         """
         Обратное геокодирование - координаты в адрес
         """
+        query = self.geocode_cache.coordinates_query(lat, lon)
+        try:
+            return self.geocode_cache.get_or_fetch('reverse', query, lambda: self._fetch_reverse(lat, lon))
+        except requests.exceptions.RequestException as e:
+            print(f"2GIS Reverse Geocoding error: {e}")
+            return None
+
+    def _fetch_reverse(self, lat: float, lon: float) -> Optional[str]:
         url = f"{self.GEOCODE_URL}/reverse"
         params = {
             'lat': lat,
@@ -62,24 +98,26 @@ class DGisService:
             'fields': 'items.full_name'
         }
 
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get('result') and data['result'].get('items'):
-                return data['result']['items'][0]['full_name']
+        response = self.http.get('reverse_geocode', url, params=params)
+        response.raise_for_status()
+        data = response.json()
 
-            return None
+        if data.get('result') and data['result'].get('items'):
+            return data['result']['items'][0]['full_name']
 
-        except requests.exceptions.RequestException as e:
-            print(f"2GIS Reverse Geocoding error: {e}")
-            return None
+        return None
 
     def search_businesses(self, query: str, lat: float, lon: float, radius: int = 1000) -> List[Dict]:
         """
         Поиск бизнесов/организаций поблизости
         """
+        try:
+            return self._fetch_businesses(query, lat, lon, radius)
+        except requests.exceptions.RequestException as e:
+            print(f"2GIS Business search error: {e}")
+            return []
+
+    def _fetch_businesses(self, query: str, lat: float, lon: float, radius: int = 1000) -> List[Dict]:
         url = f"{self.BASE_URL}/items"
         params = {
             'q': query,
@@ -91,28 +129,23 @@ class DGisService:
             'limit': 20
         }
 
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            results = []
-            if data.get('result') and data['result'].get('items'):
-                for item in data['result']['items']:
-                    results.append({
-                        'name': item.get('name', ''),
-                        'address': item.get('address_name', ''),
-                        'latitude': item['point']['lat'],
-                        'longitude': item['point']['lon'],
-                        'contacts': item.get('contacts', []),
-                        'distance': None
-                    })
-
-            return results
+        response = self.http.get('search_businesses', url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        results = []
+        if data.get('result') and data['result'].get('items'):
+            for item in data['result']['items']:
+                results.append({
+                    'name': item.get('name', ''),
+                    'address': item.get('address_name', ''),
+                    'latitude': item['point']['lat'],
+                    'longitude': item['point']['lon'],
+                    'contacts': item.get('contacts', []),
+                    'distance': None
+                })
 
-        except requests.exceptions.RequestException as e:
-            print(f"2GIS Business search error: {e}")
-            return []
+        return results
 
     def calculate_distance_matrix(self, origins: List[tuple], destinations: List[tuple]) -> Optional[Dict]:
         """
@@ -125,30 +158,19 @@ class DGisService:
 
     def _calculate_straight_distance_matrix(self, origins: List[tuple], destinations: List[tuple]) -> Dict:
         """Расчет расстояний по прямой (в км)"""
-        from math import radians, sin, cos, sqrt, atan2
-
-        def haversine(lat1, lon1, lat2, lon2):
-            R = 6371  # Земной радиус в км
-            lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-            c = 2 * atan2(sqrt(a), sqrt(1 - a))
-            return R * c
-
-        matrix = {}
-        for i, origin in enumerate(origins):
-            matrix[i] = {}
-            for j, destination in enumerate(destinations):
-                distance = haversine(origin[0], origin[1], destination[0], destination[1])
-                matrix[i][j] = round(distance, 2)
-
-        return matrix
+        rows = np.round(DistanceService.distance_matrix(origins, destinations), 2).tolist()
+        return {i: dict(enumerate(row)) for i, row in enumerate(rows)}
 
 
 class LocationService:
     """Высокоуровневый сервис для работы с локациями"""
 
+    worker_index = WorkerLocationIndex(max_age=settings.WORKER_INDEX_MAX_AGE)
+    # Ответы 2GIS по магазинам запчастей на тайл geohash (~1.2 x 0.6 км)
+    parts_cache = VersionedCache('parts-shops', timeout=settings.PARTS_SHOPS_CACHE_TIMEOUT)
+    PARTS_TILE_PRECISION = 6
+    PARTS_MAX_RADIUS = 40000
+
     @staticmethod
     def update_user_location(user, address: str) -> Dict:
         """
@@ -172,6 +194,8 @@ class LocationService:
         user_location.city = address_parts[0].strip() if len(address_parts) > 0 else ""
 
         user_location.save()
+        transaction.on_commit(lambda: LocationService.worker_index.upsert(user_location))
+        RepairFeedService.forget_on_commit(user.id)
 
         return {
             'success': True,
@@ -207,53 +231,107 @@ class LocationService:
             }
 
     @staticmethod
-    def find_nearby_workers(customer_lat: float, customer_lon: float, max_distance_km: int = 10) -> List[Dict]:
+    def delete_user_location(user) -> bool:
+        """
+        Удалить местоположение пользователя
+        """
+        from back.models.geolocation_models import UserLocation
+
+        deleted, _ = UserLocation.objects.filter(user=user).delete()
+        if deleted:
+            transaction.on_commit(lambda: LocationService.worker_index.discard(user.id))
+        return bool(deleted)
+
+    @staticmethod
+    def find_nearby_workers(customer_lat: float, customer_lon: float, max_distance_km: int = 10,
+                            limit: Optional[int] = None) -> List[Dict]:
         """
         Найти работников поблизости от клиента
         """
+        if LocationService.worker_index.enabled:
+            return LocationService.worker_index.find_nearby(customer_lat, customer_lon, max_distance_km, limit)
+        return LocationService.find_nearby_workers_db(customer_lat, customer_lon, max_distance_km, limit)
+
+    @staticmethod
+    def find_nearby_workers_db(customer_lat: float, customer_lon: float, max_distance_km: int = 10,
+                               limit: Optional[int] = None) -> List[Dict]:
+        """
+        Поиск работников поблизости запросами к БД (без индекса в памяти)
+        """
         from back.models.geolocation_models import UserLocation
 
-        # Получаем всех работников с указанными локациями
-        workers_with_locations = UserLocation.objects.filter(
+        # Из БД берем только координаты из ячеек geohash вокруг клиента,
+        # подробности - лишь для попавших в радиус
+        coordinates = np.array(UserLocation.objects.near(
+            customer_lat, customer_lon, max_distance_km
+        ).filter(
             user__worker_profile__isnull=False,
             latitude__isnull=False,
             longitude__isnull=False
-        ).select_related('user', 'user__worker_profile')
-
-        dgis = DGisService()
-        origins = [(customer_lat, customer_lon)]
-        destinations = [(loc.latitude, loc.longitude) for loc in workers_with_locations]
+        ).values_list('id', 'latitude', 'longitude'), dtype=np.float64).reshape(-1, 3)
 
-        if not destinations:
+        if not len(coordinates):
             return []
 
-        # Рассчитываем расстояния
-        distance_matrix = dgis.calculate_distance_matrix(origins, destinations)
+        distances = np.round(DistanceService.haversine_km(
+            customer_lat, customer_lon, coordinates[:, 1], coordinates[:, 2]
+        ), 2)
+        nearest = DistanceService.nearest(distances, k=limit, max_distance=max_distance_km)
+
+        location_ids = coordinates[nearest, 0].astype(np.int64).tolist()
+        locations = UserLocation.objects.select_related('user', 'user__worker_profile').in_bulk(location_ids)
 
         nearby_workers = []
-        for i, worker_location in enumerate(workers_with_locations):
-            distance = distance_matrix[0][i] if distance_matrix and i in distance_matrix.get(0, {}) else None
-
-            if distance and distance <= max_distance_km:
-                worker = worker_location.user
-                nearby_workers.append({
-                    'worker_id': worker.id,
-                    'username': worker.username,
-                    'specialization': worker.worker_profile.specialization,
-                    'rating': worker.worker_profile.rating,
-                    'distance_km': distance,
-                    'address': worker_location.address
-                })
+        for location_id, distance in zip(location_ids, distances[nearest].tolist()):
+            worker_location = locations.get(location_id)
+            if worker_location is None:  # удалена между двумя запросами
+                continue
+            worker = worker_location.user
+            nearby_workers.append({
+                'worker_id': worker.id,
+                'username': worker.username,
+                'specialization': worker.worker_profile.specialization,
+                'rating': worker.worker_profile.rating,
+                'distance_km': distance,
+                'address': worker_location.address
+            })
 
-        # Сортируем по расстоянию
-        nearby_workers.sort(key=lambda x: x['distance_km'])
         return nearby_workers
 
     @staticmethod
-    def search_nearby_parts_shops(lat: float, lon: float, part_name: str = "запчасти") -> List[Dict]:
+    def search_nearby_parts_shops(lat: float, lon: float, part_name: str = None, radius: int = 5000) -> List[Dict]:
         """
-        Найти магазины запчастей поблизости
+        Найти магазины запчастей поблизости (radius в метрах, distance в ответе - в км).
+        Запрос к 2GIS делается от центра тайла geohash, поэтому соседние пользователи
+        получают один закэшированный ответ; порядок и отбор по радиусу - локально от точки пользователя
         """
-        dgis = DGisService()
-        query = f"{part_name} бытовая техника"
-        return dgis.search_businesses(query, lat, lon, radius=5000)
\ No newline at end of file
+        if not 0 < radius <= LocationService.PARTS_MAX_RADIUS:
+            raise HttpError(400, f"radius must be between 1 and {LocationService.PARTS_MAX_RADIUS} m")
+
+        part_name = " ".join((part_name or "запчасти").lower().split())
+        tile = geohash.encode(lat, lon, LocationService.PARTS_TILE_PRECISION)
+        lat_min, lat_max, lon_min, lon_max = geohash.decode_bounds(tile)
+        # Запас на половину диагонали тайла: круг вокруг любой точки тайла внутри круга поиска
+        half_diagonal_m = float(DistanceService.haversine_km(lat_min, lon_min, lat_max, lon_max)) * 500
+        search_radius = min(LocationService.PARTS_MAX_RADIUS, int(radius + half_diagonal_m) + 1)
+
+        def fetch():
+            dgis = DGisService()
+            return dgis._fetch_businesses(
+                f"{part_name} бытовая техника", (lat_min + lat_max) / 2, (lon_min + lon_max) / 2, search_radius
+            )
+
+        try:
+            shops = LocationService.parts_cache.get_or_set('tile', [tile, part_name, radius], fetch)
+        except requests.exceptions.RequestException as e:
+            # Ошибка не кэшируется
+            print(f"2GIS Business search error: {e}")
+            return []
+
+        if not shops:
+            return []
+
+        coordinates = np.array([[shop['latitude'], shop['longitude']] for shop in shops], dtype=np.float64)
+        distances = np.round(DistanceService.haversine_km(lat, lon, coordinates[:, 0], coordinates[:, 1]), 2)
+        nearest = DistanceService.nearest(distances, max_distance=radius / 1000)
+        return [{**shops[i], 'distance': distance} for i, distance in zip(nearest.tolist(), distances[nearest].tolist())]
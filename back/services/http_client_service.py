@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Внешний сервис признан недоступным - запрос не отправлялся"""
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold ошибок подряд) -> open -> (reset_timeout) -> half_open.
+    В half_open пропускается один пробный запрос: успех закрывает цепь, ошибка снова открывает
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    Общая для процесса requests.Session с пулом keep-alive соединений,
+    ограниченными повторами с экспоненциальной задержкой (full jitter),
+    общим дедлайном на вызов, circuit breaker и метриками задержек по именам вызовов
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, timeout: float = 5.0, connect_timeout: float = 3.05, retries: int = 2,
+                 backoff: float = 0.2, deadline: float = 8.0, pool_size: int = 10,
+                 breaker: CircuitBreaker = None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, url: str, **kwargs) -> requests.Response:
+        return self.request(name, 'GET', url, **kwargs)
+
+    def request(self, name: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Ответ с кодом 2xx-4xx (кроме 429) либо исключение requests.
+        name - имя вызова для метрик (например, 'geocode')
+        """
+        if not self.breaker.allow():
+            self._record(name, None, ok=False, rejected=True)
+            raise CircuitOpenError(f"{name}: circuit open")
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.perf_counter()
+            error = None
+            try:
+                remaining = self.deadline - (time.monotonic() - started)
+                response = self.session.request(
+                    method, url, timeout=(self.connect_timeout, max(0.1, min(self.timeout, remaining))), **kwargs
+                )
+                if response.status_code not in self.RETRY_STATUSES:
+                    self._record(name, time.perf_counter() - attempt_started, ok=True)
+                    # 4xx - ошибка запроса, а не признак недоступности сервиса
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {name}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except requests.exceptions.RequestException:
+                # Повтор не поможет (неверный URL и т.п.), но пробный запрос half_open нужно завершить
+                self._record(name, time.perf_counter() - attempt_started, ok=False)
+                self.breaker.record_failure()
+                raise
+            self._record(name, time.perf_counter() - attempt_started, ok=False)
+
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            attempt += 1
+            if attempt > self.retries or time.monotonic() - started + delay >= self.deadline:
+                self.breaker.record_failure()
+                raise error
+            self._count_retry(name)
+            time.sleep(delay)
+
+    def _metric(self, name: str) -> dict:
+        if name not in self._metrics:
+            self._metrics[name] = {
+                'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0,
+                'latencies': deque(maxlen=self.LATENCY_WINDOW),
+            }
+        return self._metrics[name]
+
+    def _record(self, name: str, latency, ok: bool, rejected: bool = False):
+        with self._lock:
+            metric = self._metric(name)
+            metric['calls'] += 1
+            if not ok:
+                metric['errors'] += 1
+            if rejected:
+                metric['rejected'] += 1
+            if latency is not None:
+                metric['latencies'].append(latency)
+
+    def _count_retry(self, name: str):
+        with self._lock:
+            self._metric(name)['retries'] += 1
+
+    def stats(self) -> dict:
+        """Метрики по именам вызовов (задержки - по последним LATENCY_WINDOW попыткам) и состояние breaker"""
+        with self._lock:
+            result = {}
+            for name, metric in self._metrics.items():
+                latencies = sorted(metric['latencies'])
+                result[name] = {key: metric[key] for key in ('calls', 'errors', 'retries', 'rejected')}
+                if latencies:
+                    result[name].update({
+                        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+                        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+                        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+                    })
+            result['breaker'] = self.breaker.state
+            return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._metrics = {}
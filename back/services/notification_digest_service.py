@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List
+
+from django.utils import timezone
+
+
+class NotificationDigest:
+    """
+    Режим дайджеста: уведомления с target не пишутся сразу. Каждое событие сохраняется
+    событием outbox 'notification_digest' в той же транзакции, что и вызвавшая его запись
+    (или событие outbox, в обработчике которого создается уведомление), со сроком на
+    границе ближайшего интервала. Все события интервала становятся доступны одновременно,
+    воркер outbox берет их одной пачкой, склеивает по (user, type, target) и пишет через
+    NotificationService.coalesce. Пользователь получает одно уведомление "N новых сообщений",
+    база - одну запись на пачку, а рестарт процесса до записи ничего не теряет.
+
+    interval=0 - дайджест выключен.
+    """
+
+    EVENT_TYPE = 'notification_digest'
+
+    def __init__(self, interval: int = 0):
+        self.interval = interval
+        self._stats = {'added': 0, 'flushes': 0, 'written': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def due_at(self, now: datetime = None) -> datetime:
+        """Ближайшая граница интервала (от начала эпохи) - общая для всех событий интервала"""
+        now = now or timezone.now()
+        seconds = int(now.timestamp()) // self.interval * self.interval + self.interval
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+    def add(self, user_id: int, notification_type: str, target: str, message: str):
+        """Отложить уведомление; вызывать в транзакции записи, которая его вызвала"""
+        from back.services.outbox_service import OutboxService
+
+        OutboxService.enqueue(
+            self.EVENT_TYPE, available_at=self.due_at(),
+            user_id=user_id, notification_type=notification_type, target=target, message=message,
+        )
+        self._stats['added'] += 1
+
+    def write(self, payloads: List[Dict]) -> int:
+        """Записать отложенные уведомления (payload событий outbox) одной пачкой; более позднее заменяет текст"""
+        from back.services.notification_service import NotificationService
+
+        rows = NotificationService.coalesce([
+            (payload['user_id'], payload['notification_type'], payload['target'], payload['message'], 1)
+            for payload in payloads
+        ])
+        self._stats['flushes'] += 1
+        self._stats['written'] += len(rows)
+        return len(rows)
+
+    def stats(self) -> Dict:
+        return dict(self._stats)
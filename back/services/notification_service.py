@@ -1,15 +1,94 @@
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from ninja.errors import HttpError
 from back.models import Notification
+from back.services.event_bus_service import EventService
+from back.services.notification_digest_service import NotificationDigest
+from back.services.pagination_service import CursorPaginationService
+from back.services.unread_service import UnreadService
 
 
 class NotificationService:
+    MAX_MARK_IDS = 500
+
+    digest = NotificationDigest(interval=settings.NOTIFICATIONS_DIGEST_INTERVAL)
+
     @staticmethod
-    def create_notification(user, message, notification_type):
-        return Notification.objects.create(
-            user=user,
-            message=message,
-            notification_type=notification_type
-        )
+    def create_notification(user, message, notification_type, target: str = ''):
+        """
+        target ('chat:12', 'request:12') включает склейку: непрочитанное уведомление того же
+        типа с тем же target, обновленное за последние NOTIFICATIONS_COALESCE_WINDOW секунд,
+        не дублируется - у него растет count, обновляется текст и created_at (снова первое в списке).
+        В режиме дайджеста такие уведомления пишутся позже пачкой (событием outbox в текущей
+        транзакции), тогда возвращается None
+        """
+        if target and NotificationService.digest.enabled:
+            NotificationService.digest.add(user.id, notification_type, target, message)
+            return None
+        return NotificationService.coalesce([(user.id, notification_type, target, message, 1)])[0]
+
+    @staticmethod
+    def coalesce(items: List[tuple]) -> List[Notification]:
+        """
+        items - [(user_id, notification_type, target, message, count)].
+        Открытые строки (user, type, target) ищутся одним запросом и увеличиваются
+        условным UPDATE (если строку успели прочитать - создается новая), остальное - одним bulk_create.
+        UPDATE сдвигает created_at: страницы идут по курсору (created_at, id), и обновленное
+        уведомление поднимается наверх, а окно склейки отсчитывается от последнего события
+        """
+        merged = {}
+        for user_id, notification_type, target, message, count in items:
+            # Без target не склеиваются, ключ уникален
+            key = (user_id, notification_type, target) if target else (user_id, notification_type, len(merged))
+            previous = merged.get(key)
+            merged[key] = (user_id, notification_type, target, message, count + (previous[4] if previous else 0))
+
+        now = timezone.now()
+        open_rows = {}
+        targeted = [item for item in merged.values() if item[2]]
+        if targeted and settings.NOTIFICATIONS_COALESCE_WINDOW:
+            rows = Notification.objects.filter(
+                user_id__in={item[0] for item in targeted},
+                notification_type__in={item[1] for item in targeted},
+                target__in={item[2] for item in targeted},
+                is_read=False,
+                created_at__gte=now - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW),
+            ).order_by('id')
+            open_rows = {(row.user_id, row.notification_type, row.target): row for row in rows}
+
+        created, updated, result = [], [], []
+        with transaction.atomic():
+            for user_id, notification_type, target, message, count in merged.values():
+                row = open_rows.get((user_id, notification_type, target))
+                if row is not None and Notification.objects.filter(id=row.id, is_read=False).update(
+                        count=F('count') + count, message=message, created_at=now):
+                    row.count += count
+                    row.message = message
+                    row.created_at = now
+                    updated.append(row)
+                else:
+                    row = Notification(
+                        user_id=user_id, message=message, notification_type=notification_type,
+                        target=target, count=count,
+                    )
+                    created.append(row)
+                result.append(row)
+            Notification.objects.bulk_create(created, batch_size=1000)
+            NotificationService.notifications_created(created)
+            # Обновленные уже учтены в счетчиках непрочитанного, клиентам - новый count
+            EventService.notifications_created(updated)
+        return result
+
+    @staticmethod
+    def notifications_created(notifications):
+        """Счетчики непрочитанного и события; вызывать в транзакции, где уведомления созданы"""
+        UnreadService.notifications_created(notifications)
+        EventService.notifications_created(notifications)
 
     @staticmethod
     def notify_new_response(repair_request, response):
@@ -17,7 +96,8 @@ class NotificationService:
         NotificationService.create_notification(
             repair_request.created_by,
             message,
-            'new_response'
+            'new_response',
+            target=f'request:{repair_request.id}'
         )
 
     @staticmethod
@@ -33,12 +113,54 @@ class NotificationService:
     def get_user_notifications(user):
         return Notification.objects.filter(user=user).order_by('-created_at')
 
+    @staticmethod
+    def get_notifications_page(user, cursor: str = None, limit: int = 20, unread_only: bool = False):
+        """Страница по курсору (created_at, id); индексы (user, created_at) и частичный по непрочитанным"""
+        queryset = Notification.objects.filter(user=user)
+        if unread_only:
+            queryset = queryset.filter(is_read=False)
+        return CursorPaginationService.paginate(queryset, cursor, limit)
+
     @staticmethod
     def mark_as_read(notification_id, user):
         try:
             notification = Notification.objects.get(id=notification_id, user=user)
-            notification.is_read = True
-            notification.save()
-            return notification
         except Notification.DoesNotExist:
             raise HttpError(404, "Notification not found")
+
+        with transaction.atomic():
+            # Условный UPDATE: при двух одновременных запросах счетчик уменьшится один раз
+            if Notification.objects.filter(id=notification.id, is_read=False).update(is_read=True):
+                UnreadService.notifications_read(user, [notification.notification_type])
+        notification.is_read = True
+        return notification
+
+    @staticmethod
+    def mark_many_as_read(user, ids: List[int] = None) -> int:
+        """
+        Отметить прочитанными одним UPDATE: перечисленные ids (чужие и несуществующие
+        пропускаются) или все уведомления пользователя. Возвращает число отмеченных
+        """
+        if ids is not None and len(ids) > NotificationService.MAX_MARK_IDS:
+            raise HttpError(400, f"At most {NotificationService.MAX_MARK_IDS} ids per call")
+
+        unread = Notification.objects.filter(user=user, is_read=False)
+        with transaction.atomic():
+            if ids is None:
+                updated = unread.update(is_read=True)
+                # Непрочитанных почти не осталось - пересчет по индексу дешевле учета по типам
+                UnreadService.recount_notifications(user)
+                return updated
+
+            # Строки блокируются до UPDATE: параллельная отметка тех же ids ждет и уже не видит их
+            # непрочитанными, поэтому счетчики не уменьшаются дважды
+            rows = list(unread.filter(id__in=ids).select_for_update().order_by('id').values_list(
+                'id', 'notification_type'
+            ))
+            updated = unread.filter(id__in=[row[0] for row in rows]).update(is_read=True)
+            if updated == len(rows):
+                UnreadService.notifications_read(user, [row[1] for row in rows])
+            else:
+                # Часть строк между чтением и UPDATE отметил другой запрос (на SQLite нет блокировки строк)
+                UnreadService.recount_notifications(user)
+        return updated
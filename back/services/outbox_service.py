@@ -0,0 +1,232 @@
+import traceback
+from datetime import timedelta
+from typing import Callable, Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from back.models import OutboxEvent
+
+
+class OutboxService:
+    """
+    Transactional outbox: побочные эффекты записей (уведомления, автоматические списки,
+    история действий) сохраняются событием в той же транзакции, что и запись, а выполняются
+    отдельным процессом (manage.py run_outbox_worker). Запрос пользователя ждет только
+    основную запись; если обработчик упал, событие повторяется с нарастающей паузой,
+    а не теряется.
+
+    Пачка берется короткой транзакцией: события получают аренду (available_at сдвигается
+    на OUTBOX_LEASE секунд), и другие воркеры их не видят; если воркер упал, события
+    снова станут доступны по окончании аренды. Затем каждое событие выполняется в своей
+    транзакции вместе с отметкой о выполнении, так что блокировка записи (на SQLite -
+    единственная на всю базу) держится одно событие, а не всю пачку. Выборка идет через
+    SELECT ... FOR UPDATE SKIP LOCKED, поэтому на PostgreSQL можно запускать несколько воркеров.
+    """
+
+    @staticmethod
+    def enqueue(event_type: str, available_at=None, **payload) -> OutboxEvent:
+        """Записать событие (не раньше available_at); вызывать внутри транзакции основной записи"""
+        if event_type not in OutboxService.handlers():
+            raise ValueError(f"Unknown outbox event type: {event_type}")
+        return OutboxEvent.objects.create(
+            event_type=event_type, payload=payload, available_at=available_at or timezone.now()
+        )
+
+    @staticmethod
+    def handlers() -> Dict[str, Callable]:
+        return {
+            'response_created': OutboxService.handle_response_created,
+            'response_accepted': OutboxService.handle_response_accepted,
+            'chat_message_sent': OutboxService.handle_chat_message_sent,
+            'request_completed': OutboxService.handle_request_completed,
+            'request_created': OutboxService.handle_request_created,
+            'notification_digest': OutboxService.handle_notification_digest,
+        }
+
+    # Обработка
+
+    @staticmethod
+    def claim(batch_size: int = None) -> List[OutboxEvent]:
+        """Взять в аренду пачку готовых событий (отдельная короткая транзакция)"""
+        batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                status='pending', available_at__lte=now
+            ).order_by('id')[:batch_size])
+            if events:
+                OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+                    available_at=now + timedelta(seconds=settings.OUTBOX_LEASE)
+                )
+        return events
+
+    @staticmethod
+    def process_batch(batch_size: int = None) -> int:
+        """Выполнить одну пачку готовых событий; возвращает, сколько событий взято"""
+        handlers = OutboxService.handlers()
+        events = OutboxService.claim(batch_size)
+        for event in OutboxService._process_digest(events):
+            try:
+                # Эффекты события и отметка о выполнении - одна транзакция
+                with transaction.atomic():
+                    handlers[event.event_type](event.payload)
+                    OutboxEvent.objects.filter(id=event.id).update(
+                        status='done', attempts=F('attempts') + 1, last_error='', processed_at=timezone.now()
+                    )
+            except Exception as e:
+                event.attempts += 1
+                OutboxService._schedule_retry(event, e)
+                event.save(update_fields=['status', 'attempts', 'available_at', 'last_error'])
+        return len(events)
+
+    @staticmethod
+    def _process_digest(events: List[OutboxEvent]) -> List[OutboxEvent]:
+        """
+        Отложенные уведомления дайджеста из пачки - одной транзакцией (склейка и один INSERT).
+        Возвращает события, которые осталось выполнить по одному (при ошибке - и дайджест, с повторами)
+        """
+        from back.services.notification_service import NotificationService
+
+        digest = [event for event in events if event.event_type == 'notification_digest']
+        if len(digest) < 2:
+            return events
+        try:
+            with transaction.atomic():
+                NotificationService.digest.write([event.payload for event in digest])
+                OutboxEvent.objects.filter(id__in=[event.id for event in digest]).update(
+                    status='done', attempts=F('attempts') + 1, last_error='', processed_at=timezone.now()
+                )
+        except Exception:
+            return events
+        return [event for event in events if event.event_type != 'notification_digest']
+
+    @staticmethod
+    def process_pending(batch_size: int = None) -> int:
+        """Выполнить все готовые события (отложенные повторы остаются ждать своего времени)"""
+        processed = 0
+        while True:
+            taken = OutboxService.process_batch(batch_size)
+            if not taken:
+                return processed
+            processed += taken
+
+    @staticmethod
+    def _schedule_retry(event: OutboxEvent, error: Exception):
+        event.last_error = ''.join(traceback.format_exception_only(type(error), error)).strip()[:2000]
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            event.status = 'failed'
+            return
+        delay = min(settings.OUTBOX_RETRY_DELAY * 2 ** (event.attempts - 1), settings.OUTBOX_MAX_RETRY_DELAY)
+        event.available_at = timezone.now() + timedelta(seconds=delay)
+
+    @staticmethod
+    def purge(older_than: int = None) -> int:
+        """Удалить выполненные события старше older_than секунд"""
+        older_than = settings.OUTBOX_RETENTION if older_than is None else older_than
+        deleted, _ = OutboxEvent.objects.filter(
+            status='done', processed_at__lt=timezone.now() - timedelta(seconds=older_than)
+        ).delete()
+        return deleted
+
+    @staticmethod
+    def stats() -> Dict:
+        counts = dict(OutboxEvent.objects.values('status').annotate(n=Count('id')).values_list('status', 'n'))
+        oldest = OutboxEvent.objects.filter(status='pending').order_by('id').values_list('created_at', flat=True).first()
+        return {
+            'pending': counts.get('pending', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_seconds': round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0.0,
+        }
+
+    @staticmethod
+    def is_lagging(stats: Dict = None) -> bool:
+        """Самое старое ожидающее событие старше OUTBOX_ALERT_AGE: воркер не запущен или не успевает"""
+        stats = stats or OutboxService.stats()
+        return bool(settings.OUTBOX_ALERT_AGE) and stats['oldest_pending_seconds'] > settings.OUTBOX_ALERT_AGE
+
+    # Обработчики: получают payload события, объекты загружают заново
+
+    @staticmethod
+    def handle_response_created(payload: Dict):
+        from back.models import Response
+        from back.services.notification_service import NotificationService
+        from back.services.user_service import ActivityService
+        from back.services.userlist_service import AutoListService
+
+        response = Response.objects.select_related('repair_request', 'repair_request__created_by', 'worker').filter(
+            id=payload['response_id']
+        ).first()
+        if response is None:
+            return  # отклик уже удален
+        NotificationService.notify_new_response(response.repair_request, response)
+        AutoListService.handle_response_created(response)
+        ActivityService.record_activity(
+            response.worker, 'response_create', f"Отклик на заявку '{response.repair_request.title}'",
+            target_object=response,
+        )
+
+    @staticmethod
+    def handle_response_accepted(payload: Dict):
+        from back.models import Response
+        from back.services.notification_service import NotificationService
+        from back.services.user_service import ActivityService
+        from back.services.userlist_service import AutoListService
+
+        response = Response.objects.select_related('repair_request', 'repair_request__created_by', 'worker').filter(
+            id=payload['response_id']
+        ).first()
+        if response is None:
+            return
+        NotificationService.notify_response_accepted(response)
+        AutoListService.handle_response_accepted(response)
+        ActivityService.record_activity(
+            response.repair_request.created_by, 'response_accept',
+            f"Принят отклик на заявку '{response.repair_request.title}'", target_object=response,
+        )
+
+    @staticmethod
+    def handle_chat_message_sent(payload: Dict):
+        from back.models import ChatMessage
+        from back.services.chat_service import ChatService
+
+        message = ChatMessage.objects.select_related('repair_request', 'sender').filter(
+            id=payload['message_id']
+        ).first()
+        if message is None:
+            return
+        ChatService._notify_new_message(message.repair_request, message, message.sender)
+
+    @staticmethod
+    def handle_request_completed(payload: Dict):
+        from back.models import RepairRequest
+        from back.services.userlist_service import AutoListService
+
+        repair_request = RepairRequest.objects.filter(id=payload['repair_request_id']).first()
+        if repair_request is None:
+            return
+        AutoListService.handle_request_completed(repair_request)
+
+    @staticmethod
+    def handle_request_created(payload: Dict):
+        from back.models import RepairRequest
+        from back.services.geocoding_queue_service import RepairGeocodingQueue
+        from back.services.repair_request_service import RepairRequestService
+
+        repair_request = RepairRequest.objects.filter(id=payload['repair_request_id'], status='new').only(
+            'id', 'title', 'device_type', 'address', 'latitude', 'longitude', 'created_by_id', 'created_at'
+        ).first()
+        if repair_request is None:
+            return  # заявку удалили или уже закрыли
+        # Рассылка по радиусу нужна координатам: если фоновое геокодирование не успело - сейчас
+        RepairGeocodingQueue.geocode_now(repair_request)
+        RepairRequestService.dispatcher.dispatch([repair_request])
+
+    @staticmethod
+    def handle_notification_digest(payload: Dict):
+        from back.services.notification_service import NotificationService
+
+        NotificationService.digest.write([payload])
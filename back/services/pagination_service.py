@@ -1,4 +1,9 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.paginator import Paginator, EmptyPage
+from django.db.models import Q
 from ninja.errors import HttpError
 
 
@@ -19,4 +24,89 @@ class PaginationService:
                 'has_prev': page_obj.has_previous(),
             }
         except EmptyPage:
-            raise HttpError(404, "Page not found")
\ No newline at end of file
+            raise HttpError(404, "Page not found")
+
+class CursorPaginationService:
+    """
+    Keyset-пагинация по непрозрачному курсору.
+    В отличие от PaginationService не делает COUNT и OFFSET,
+    поэтому страница N стоит столько же, сколько первая.
+    """
+    DEFAULT_ORDERING = ('-created_at', '-id')
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    def encode_cursor(values) -> str:
+        payload = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str, model, ordering) -> list:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError(cursor)
+            return [
+                CursorPaginationService._to_python(model, field.lstrip('-'), value)
+                for field, value in zip(ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise HttpError(400, "Invalid cursor")
+
+    @staticmethod
+    def _to_python(model, name: str, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Числовая аннотация (например, search_rank)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(value)
+            return value
+
+    @staticmethod
+    def _after(ordering, values) -> Q:
+        """Условие 'строго после курсора' для лексикографического порядка"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        # Нестрогая граница по первому полю отдельно от OR, чтобы по ней работал range-поиск по индексу
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+    @staticmethod
+    def page_queryset(queryset, cursor: str = None, limit: int = 20, ordering=DEFAULT_ORDERING):
+        """Запрос за одной страницей (limit + 1 строка, чтобы узнать, есть ли следующая)"""
+        limit = max(1, min(limit, CursorPaginationService.MAX_PAGE_SIZE))
+        queryset = queryset.order_by(*ordering)
+
+        if cursor:
+            values = CursorPaginationService.decode_cursor(cursor, queryset.model, ordering)
+            queryset = queryset.filter(CursorPaginationService._after(ordering, values))
+
+        return queryset[:limit + 1]
+
+    @staticmethod
+    def paginate(queryset, cursor: str = None, limit: int = 20, ordering=DEFAULT_ORDERING):
+        limit = max(1, min(limit, CursorPaginationService.MAX_PAGE_SIZE))
+        items = list(CursorPaginationService.page_queryset(queryset, cursor, limit, ordering))
+        has_next = len(items) > limit
+        items = items[:limit]
+
+        next_cursor = None
+        if has_next:
+            next_cursor = CursorPaginationService.encode_cursor(
+                [getattr(items[-1], field.lstrip('-')) for field in ordering]
+            )
+
+        return {
+            'items': items,
+            'next_cursor': next_cursor,
+            'has_next': has_next,
+        }
@@ -0,0 +1,311 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from back.services.distance_service import DistanceService
+from back.services.pagination_service import CursorPaginationService
+
+# Точка отсчета для слагаемого "свежесть" (см. RepairFeedService.score_rows)
+AGE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+
+
+class RepairFeedIndex:
+    """
+    Открытые заявки в колонках numpy для ранжирования ленты работника.
+
+    Строки только дописываются: новая или изменившаяся заявка получает новую строку,
+    прежняя помечается удаленной. Поэтому кэш оценок работника можно дополнять
+    хвостом (строки после уже оцененных), не пересчитывая всё.
+    Изменения из БД подтягиваются по updated_at (с перекрытием на долгие транзакции)
+    не чаще refresh_interval; полная перестройка - раз в max_age или когда много удаленных строк.
+    """
+
+    REFRESH_OVERLAP = timedelta(seconds=5)
+    MAX_DEAD_RATIO = 0.5
+    COLUMNS = ('id', 'latitude', 'longitude', 'device_type', 'created_at', 'created_by_id', 'status', 'updated_at')
+
+    def __init__(self, max_age: int = 300, refresh_interval: float = 1.0):
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.devices = {}
+        self._state = None
+        self._stale = True
+
+    def invalidate(self):
+        self._stale = True
+
+    def device_code(self, device_type: str) -> int:
+        return self.devices.setdefault(device_type, len(self.devices))
+
+    def ensure_fresh(self) -> SimpleNamespace:
+        with self._lock:
+            state = self._state
+            now = time.monotonic()
+            if self._stale or state is None or (self.max_age is not None and now - state.built_at > self.max_age) \
+                    or len(state.ids) - state.alive.sum() > self.MAX_DEAD_RATIO * max(len(state.ids), 1000):
+                self.rebuild()
+            elif now - state.refreshed_at >= self.refresh_interval:
+                self.refresh()
+            return self._state
+
+    def rebuild(self):
+        from back.models import RepairRequest
+
+        self._stale = False
+        synced_at = timezone.now()
+        rows = list(RepairRequest.objects.filter(status='new').values_list(*self.COLUMNS))
+        state = self._empty_state(synced_at)
+        self._state = self._append(state, rows)
+        self.generation += 1
+        self._state.generation = self.generation
+
+    def refresh(self):
+        """Дописать заявки, созданные или измененные после прошлой синхронизации"""
+        from back.models import RepairRequest
+
+        state = self._state
+        synced_at = timezone.now()
+        rows = list(RepairRequest.objects.filter(
+            updated_at__gte=state.synced_at - self.REFRESH_OVERLAP
+        ).values_list(*self.COLUMNS))
+
+        changed = []
+        for row in rows:
+            known = state.rows.get(row[0])
+            if known is not None and known[1] == row[7]:
+                continue  # уже в индексе (попала в окно перекрытия повторно)
+            if known is not None:
+                state.alive[known[0]] = False
+                del state.rows[row[0]]
+            if row[6] == 'new':
+                changed.append(row)
+
+        state = self._append(state, changed) if changed else state
+        state.synced_at = synced_at
+        state.refreshed_at = time.monotonic()
+        self._state = state
+
+    def _empty_state(self, synced_at) -> SimpleNamespace:
+        return SimpleNamespace(
+            ids=np.empty(0, dtype=np.int64),
+            latitude=np.empty(0, dtype=np.float64),
+            longitude=np.empty(0, dtype=np.float64),
+            devices=np.empty(0, dtype=np.int32),
+            created=np.empty(0, dtype=np.float64),
+            authors=np.empty(0, dtype=np.int64),
+            alive=np.empty(0, dtype=bool),
+            rows={},
+            synced_at=synced_at,
+            built_at=time.monotonic(),
+            refreshed_at=time.monotonic(),
+            generation=self.generation,
+        )
+
+    def _append(self, state, rows: list) -> SimpleNamespace:
+        """Новое состояние с дописанными строками; прежнее не меняется (кроме alive)"""
+        start = len(state.ids)
+        coordinates = np.array(
+            [(row[1], row[2]) if row[1] is not None and row[2] is not None else (np.nan, np.nan) for row in rows],
+            dtype=np.float64
+        ).reshape(-1, 2)
+        new_rows = dict(state.rows)
+        new_rows.update({row[0]: (start + i, row[7]) for i, row in enumerate(rows)})
+        return SimpleNamespace(
+            ids=np.concatenate([state.ids, np.array([row[0] for row in rows], dtype=np.int64)]),
+            latitude=np.concatenate([state.latitude, coordinates[:, 0]]),
+            longitude=np.concatenate([state.longitude, coordinates[:, 1]]),
+            devices=np.concatenate([state.devices, np.array([self.device_code(row[3]) for row in rows], dtype=np.int32)]),
+            created=np.concatenate([state.created, np.array([row[4].timestamp() for row in rows], dtype=np.float64)]),
+            authors=np.concatenate([state.authors, np.array([row[5] for row in rows], dtype=np.int64)]),
+            alive=np.concatenate([state.alive, np.ones(len(rows), dtype=bool)]),
+            rows=new_rows,
+            synced_at=state.synced_at,
+            built_at=state.built_at,
+            refreshed_at=state.refreshed_at,
+            generation=state.generation,
+        )
+
+    def discard(self, request_id: int):
+        """Убрать заявку сразу (удалена или закрыта в этом процессе)"""
+        with self._lock:
+            state = self._state
+            if state is None:
+                return
+            known = state.rows.pop(request_id, None)
+            if known is not None:
+                state.alive[known[0]] = False
+
+    def stats(self) -> Dict:
+        state = self._state
+        if state is None:
+            return {'rows': 0, 'alive': 0, 'generation': self.generation}
+        return {'rows': len(state.ids), 'alive': int(state.alive.sum()), 'generation': self.generation}
+
+
+class RepairFeedService:
+    """
+    Персональная лента открытых заявок для работника.
+    Оценка = близость к UserLocation + совпадение специализации + категории прежних
+    откликов (как favorite_categories в get_user_stats) + свежесть заявки.
+    Оценки считаются векторно по всем открытым заявкам и кэшируются по работнику;
+    при появлении новых заявок досчитывается только хвост индекса.
+    """
+
+    DISTANCE_WEIGHT = 3.0
+    DISTANCE_SCALE_KM = 5.0
+    SPECIALIZATION_WEIGHT = 2.0
+    HISTORY_WEIGHT = 1.0
+    # Заявка на AGE_SCALE_HOURS старше теряет 1 балл. Слагаемое линейно по created_at,
+    # поэтому порядок заявок со временем не меняется и кэш оценок не устаревает
+    AGE_SCALE_HOURS = 48.0
+
+    index = RepairFeedIndex(max_age=settings.REPAIR_FEED_INDEX_MAX_AGE,
+                            refresh_interval=settings.REPAIR_FEED_REFRESH_INTERVAL)
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def worker_profile(user) -> SimpleNamespace:
+        from back.models.geolocation_models import UserLocation
+        from back.services.user_service import UserProfileService
+
+        location = UserLocation.objects.filter(user=user).values_list('latitude', 'longitude').first()
+        latitude, longitude = location if location else (None, None)
+        profile = getattr(user, 'worker_profile', None)
+        return SimpleNamespace(
+            latitude=latitude,
+            longitude=longitude,
+            specialization=(profile.specialization if profile else '').lower(),
+            categories=UserProfileService.worker_favorite_categories(user),
+        )
+
+    @staticmethod
+    def score_rows(profile, state, start: int = 0) -> np.ndarray:
+        """Оценки строк индекса начиная со start одной векторной операцией"""
+        rows = slice(start, len(state.ids))
+        scores = (state.created[rows] - AGE_EPOCH) / (RepairFeedService.AGE_SCALE_HOURS * 3600)
+
+        if profile.latitude is not None and profile.longitude is not None:
+            distances = DistanceService.haversine_km(
+                profile.latitude, profile.longitude, state.latitude[rows], state.longitude[rows]
+            )
+            closeness = np.exp(-distances / RepairFeedService.DISTANCE_SCALE_KM)
+            scores += RepairFeedService.DISTANCE_WEIGHT * np.nan_to_num(closeness, nan=0.0)
+
+        # Таблицы по коду типа устройства: специализация и история откликов
+        index = RepairFeedService.index
+        specialization = np.zeros(len(index.devices) + 1)
+        history = np.zeros(len(index.devices) + 1)
+        for device_type, code in list(index.devices.items()):
+            if profile.specialization and device_type.lower() in profile.specialization:
+                specialization[code] = RepairFeedService.SPECIALIZATION_WEIGHT
+        for rank, device_type in enumerate(profile.categories):
+            code = index.devices.get(device_type)
+            if code is not None:
+                history[code] = RepairFeedService.HISTORY_WEIGHT * (1 - rank / len(profile.categories))
+        devices = state.devices[rows]
+        return scores + specialization[devices] + history[devices]
+
+    @staticmethod
+    def scores(user) -> tuple:
+        """(состояние индекса, оценки его строк) для работника - из кэша, дополненного хвостом"""
+        state = RepairFeedService.index.ensure_fresh()
+        now = time.monotonic()
+        with RepairFeedService._lock:
+            entry = RepairFeedService._entries.get(user.id)
+            if entry is not None:
+                RepairFeedService._entries.move_to_end(user.id)
+
+        if entry is None or entry.generation != state.generation or now - entry.created_at > settings.REPAIR_FEED_CACHE_TTL:
+            profile = RepairFeedService.worker_profile(user)
+            entry = SimpleNamespace(profile=profile, generation=state.generation, created_at=now,
+                                    scores=RepairFeedService.score_rows(profile, state))
+        elif len(entry.scores) < len(state.ids):
+            tail = RepairFeedService.score_rows(entry.profile, state, start=len(entry.scores))
+            entry = SimpleNamespace(**{**vars(entry), 'scores': np.concatenate([entry.scores, tail])})
+
+        with RepairFeedService._lock:
+            RepairFeedService._entries[user.id] = entry
+            while len(RepairFeedService._entries) > settings.REPAIR_FEED_CACHE_SIZE:
+                RepairFeedService._entries.popitem(last=False)
+        return state, entry.scores[:len(state.ids)]
+
+    @staticmethod
+    def forget(user_id: int):
+        """Профиль работника изменился - пересчитать его ленту при следующем запросе"""
+        with RepairFeedService._lock:
+            RepairFeedService._entries.pop(user_id, None)
+
+    @staticmethod
+    def forget_on_commit(user_id: int):
+        transaction.on_commit(lambda: RepairFeedService.forget(user_id))
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            score, request_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            return float(score), int(request_id)
+        except (ValueError, TypeError):
+            raise HttpError(400, "Invalid cursor")
+
+    @staticmethod
+    def get_feed(user, cursor: Optional[str] = None, limit: int = 20) -> Dict:
+        """Страница ленты по курсору (оценка, id) - новые заявки не сдвигают уже выданные страницы"""
+        from back.models import RepairRequest, Response
+        from back.services.repair_request_service import RepairRequestService
+
+        limit = max(1, min(limit, CursorPaginationService.MAX_PAGE_SIZE))
+        state, scores = RepairFeedService.scores(user)
+
+        candidates = state.alive[:len(scores)] & (state.authors[:len(scores)] != user.id)
+        # Без JOIN с заявками: закрытые и так не в индексе
+        responded = list(Response.objects.filter(worker=user).values_list('repair_request_id', flat=True))
+        if responded:
+            candidates &= ~np.isin(state.ids[:len(scores)], responded)
+        if cursor:
+            score, request_id = RepairFeedService.decode_cursor(cursor)
+            ids = state.ids[:len(scores)]
+            candidates &= (scores < score) | ((scores == score) & (ids < request_id))
+
+        positions = np.flatnonzero(candidates)
+        if len(positions) > limit + 1:
+            positions = positions[np.argpartition(-scores[positions], limit)[:limit + 1]]
+        # По убыванию оценки, при равенстве - более новые выше
+        positions = positions[np.lexsort((-state.ids[positions], -scores[positions]))]
+
+        has_next = len(positions) > limit
+        positions = positions[:limit]
+        # Статус проверяется в Python: с условием status='new' SQLite выбирает индекс по статусу
+        # и перебирает все открытые заявки вместо поиска по первичному ключу
+        items = {
+            request_id: item for request_id, item in RepairRequestService.with_schema_relations(
+                RepairRequest.objects.all()
+            ).in_bulk(state.ids[positions].tolist()).items() if item.status == 'new'
+        }
+        # Заявку успели закрыть или удалить - пропускаем ее и убираем из индекса
+        for request_id in set(state.ids[positions].tolist()) - set(items):
+            RepairFeedService.index.discard(request_id)
+
+        next_cursor = None
+        if has_next:
+            last = positions[-1]
+            next_cursor = CursorPaginationService.encode_cursor([float(scores[last]), int(state.ids[last])])
+        return {
+            'items': [items[request_id] for request_id in state.ids[positions].tolist() if request_id in items],
+            'next_cursor': next_cursor,
+            'has_next': has_next,
+        }
@@ -0,0 +1,104 @@
+from math import floor
+from typing import Dict, List
+
+from django.db.models import Avg, Count, F, FloatField, Min, ExpressionWrapper
+from django.db.models.functions import Floor
+from ninja.errors import HttpError
+
+from back.models import RepairRequest
+from back.services.repair_request_service import RepairRequestService
+
+
+class RepairMapService:
+    """
+    Кластеры открытых заявок для карты.
+    Мир делится на квадратные (в градусах) тайлы 360 / 2^zoom, тайл - на
+    CELLS_PER_TILE x CELLS_PER_TILE ячеек сетки; заявки одной ячейки - один кластер.
+    Агрегаты считаются по тайлу GROUP BY в БД и кэшируются по (zoom, тайл),
+    поэтому при сдвиге карты пересчитываются только новые тайлы.
+    Кэш общий с публичными эндпоинтами заявок и сбрасывается при любом их изменении.
+    """
+
+    OPEN_STATUSES = ('new',)
+    CELLS_PER_TILE = 8
+    MAX_ZOOM = 20
+    MAX_TILES = 64
+
+    @staticmethod
+    def tile_size(zoom: int) -> float:
+        return 360.0 / 2 ** zoom
+
+    @staticmethod
+    def tiles_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int) -> List[tuple]:
+        size = RepairMapService.tile_size(zoom)
+        xs = range(floor((min_lon + 180) / size), floor((max_lon + 180) / size) + 1)
+        ys = range(floor((min_lat + 90) / size), floor((max_lat + 90) / size) + 1)
+        return [(x, y) for x in xs for y in ys]
+
+    @staticmethod
+    def tile_clusters(zoom: int, x: int, y: int) -> List[Dict]:
+        """Кластеры одного тайла одним GROUP BY (ячейка, тип устройства)"""
+        size = RepairMapService.tile_size(zoom)
+        cell = size / RepairMapService.CELLS_PER_TILE
+        west, south = x * size - 180, y * size - 90
+
+        rows = RepairRequest.objects.filter(
+            status__in=RepairMapService.OPEN_STATUSES,
+            latitude__gte=south, latitude__lt=south + size,
+            longitude__gte=west, longitude__lt=west + size,
+        ).annotate(
+            cell_x=Floor(ExpressionWrapper((F('longitude') - west) / cell, output_field=FloatField())),
+            cell_y=Floor(ExpressionWrapper((F('latitude') - south) / cell, output_field=FloatField())),
+        ).values('cell_x', 'cell_y', 'device_type').annotate(
+            count=Count('id'), lat=Avg('latitude'), lon=Avg('longitude'), first_id=Min('id')
+        ).order_by()
+
+        clusters = {}
+        for row in rows:
+            cluster = clusters.setdefault((row['cell_x'], row['cell_y']), {
+                'lat_sum': 0.0, 'lon_sum': 0.0, 'count': 0, 'device_types': {}, 'request_id': row['first_id'],
+            })
+            cluster['lat_sum'] += row['lat'] * row['count']
+            cluster['lon_sum'] += row['lon'] * row['count']
+            cluster['count'] += row['count']
+            cluster['device_types'][row['device_type']] = row['count']
+
+        return [
+            {
+                'latitude': round(cluster['lat_sum'] / cluster['count'], 6),
+                'longitude': round(cluster['lon_sum'] / cluster['count'], 6),
+                'count': cluster['count'],
+                'device_types': cluster['device_types'],
+                # Одиночную заявку клиент показывает маркером и может открыть
+                'request_id': cluster['request_id'] if cluster['count'] == 1 else None,
+            }
+            for cluster in clusters.values()
+        ]
+
+    @staticmethod
+    def get_clusters(min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int) -> Dict:
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise HttpError(400, "Invalid bbox")
+        if not 0 <= zoom <= RepairMapService.MAX_ZOOM:
+            raise HttpError(400, f"zoom must be between 0 and {RepairMapService.MAX_ZOOM}")
+
+        tiles = RepairMapService.tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, zoom)
+        if len(tiles) > RepairMapService.MAX_TILES:
+            raise HttpError(400, "Bbox is too large for this zoom level")
+
+        clusters = []
+        for x, y in tiles:
+            clusters.extend(RepairRequestService.cache.get_or_set(
+                'map-tile', [zoom, x, y], lambda: RepairMapService.tile_clusters(zoom, x, y)
+            ))
+
+        # Тайлы шире bbox - оставляем кластеры внутри видимой области
+        clusters = [
+            cluster for cluster in clusters
+            if min_lat <= cluster['latitude'] <= max_lat and min_lon <= cluster['longitude'] <= max_lon
+        ]
+        return {
+            'zoom': zoom,
+            'total': sum(cluster['count'] for cluster in clusters),
+            'clusters': clusters,
+        }
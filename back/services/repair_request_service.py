@@ -1,57 +1,126 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
 from ninja.errors import HttpError
 from back.models import RepairRequest
-from django.db import models
 
 from back.models.repair_requests_models import RepairRequestFile
 
 from back.models import Response
-from back.services.userlist_service import AutoListService
+from back.schemas import RepairRequestSchemaOut, RepairRequestPageSchema
+from back.services.cache_service import VersionedCache
+from back.services.chat_service import ChatService
+from back.services.dispatch_service import RequestDispatcher
+from back.services.geocoding_queue_service import RepairGeocodingQueue
+from back.services.outbox_service import OutboxService
+from back.services.pagination_service import CursorPaginationService
+from back.services.repair_feed_service import RepairFeedService
+from back.services.search_service import SearchIndexService
+from back.services.user_service import UserService
 
 
 class RepairRequestService:
+    # Кэш публичных эндпоинтов; версия поднимается при любом изменении заявок
+    cache = VersionedCache('repairs', timeout=settings.REPAIRS_CACHE_TIMEOUT)
+    # Координаты по адресу заполняются в фоне, создание заявки не ждет 2GIS
+    geocoding_queue = RepairGeocodingQueue(mode=settings.REPAIR_GEOCODING_MODE)
+    # Уведомления подходящим работникам о новой заявке - в воркере outbox (событие request_created)
+    dispatcher = RequestDispatcher(
+        radius_km=settings.REPAIR_DISPATCH_RADIUS_KM,
+        max_workers=settings.REPAIR_DISPATCH_MAX_WORKERS,
+    )
+    SEARCH_ORDERS = ('relevance', 'newest')
+
+    @staticmethod
+    def invalidate_cache():
+        # После коммита, иначе параллельный запрос может закэшировать старые данные под новой версией
+        transaction.on_commit(RepairRequestService.cache.bump)
+
+    @staticmethod
+    def with_schema_relations(queryset, prefix: str = ''):
+        """
+        Подгрузить всё, что нужно RepairRequestSchemaOut, фиксированным числом запросов:
+        автор с профилями - JOIN'ом, файлы с загрузившими их пользователями - одним prefetch
+        """
+        path = f'{prefix}__' if prefix else ''
+        return queryset.select_related(
+            *UserService.user_type_relations(f'{path}created_by')
+        ).prefetch_related(
+            Prefetch(f'{path}files', queryset=RepairRequestFile.objects.select_related(
+                *UserService.user_type_relations('uploaded_by')
+            ))
+        )
+
     @staticmethod
     def get_all_requests():
-        return RepairRequest.objects.select_related('created_by').prefetch_related('files').all()
+        return RepairRequestService.with_schema_relations(RepairRequest.objects.all())
 
     @staticmethod
     def get_request_by_id(request_id: int):
         try:
-            return RepairRequest.objects.select_related('created_by').prefetch_related('files').get(id=request_id)
+            return RepairRequestService.with_schema_relations(RepairRequest.objects.all()).get(id=request_id)
         except RepairRequest.DoesNotExist:
             raise HttpError(404, "Repair request not found")
 
     @staticmethod
     def get_user_requests(user):
-        return RepairRequest.objects.filter(created_by=user).select_related('created_by').prefetch_related('files')
+        return RepairRequestService.with_schema_relations(RepairRequest.objects.filter(created_by=user))
+
+    @staticmethod
+    def get_requests_page(cursor: str = None, limit: int = 20):
+        return CursorPaginationService.paginate(RepairRequestService.get_all_requests(), cursor, limit)
+
+    @staticmethod
+    def get_user_requests_page(user, cursor: str = None, limit: int = 20):
+        return CursorPaginationService.paginate(RepairRequestService.get_user_requests(user), cursor, limit)
+
+    @staticmethod
+    def get_feed_page(user, cursor: str = None, limit: int = 20):
+        """Открытые заявки, ранжированные под работника"""
+        return RepairFeedService.get_feed(user, cursor, limit)
 
 
     @staticmethod
     def create_request(data, user, files: list = None, file_descriptions: list = None, is_public: bool = True):
-        # Создаем саму заявку
-        repair_request = RepairRequest.objects.create(
-            **data.dict(),
-            created_by=user,
-            status='new'
-        )
+        with transaction.atomic():
+            # Создаем саму заявку
+            repair_request = RepairRequest.objects.create(
+                **data.dict(),
+                created_by=user,
+                status='new'
+            )
 
-        if files:
-            for i, file in enumerate(files):
-                RepairRequestFile.objects.create(
-                    repair_request=repair_request,
-                    file=file,
-                    uploaded_by=user,
-                    description=(file_descriptions[i] if file_descriptions and i < len(file_descriptions) else ''),
-                    is_public=is_public
-                )
+            if files:
+                for i, file in enumerate(files):
+                    RepairRequestFile.objects.create(
+                        repair_request=repair_request,
+                        file=file,
+                        uploaded_by=user,
+                        description=(file_descriptions[i] if file_descriptions and i < len(file_descriptions) else ''),
+                        is_public=is_public
+                    )
+
+            # Рассылка работникам - в воркере outbox, событие переживает рестарт процесса
+            OutboxService.enqueue('request_created', repair_request_id=repair_request.id)
 
+        RepairRequestService.invalidate_cache()
+        transaction.on_commit(lambda: RepairRequestService.geocoding_queue.enqueue(repair_request))
         return repair_request
     @staticmethod
     def update_request(request_id: int, data, user):
         try:
             repair_request = RepairRequest.objects.get(id=request_id, created_by=user)
+            old_address = repair_request.address
             for attr, value in data.dict().items():
                 setattr(repair_request, attr, value)
+            address_changed = repair_request.address != old_address
+            if address_changed:
+                # Старые координаты больше не соответствуют адресу
+                repair_request.latitude = repair_request.longitude = None
             repair_request.save()
+            RepairRequestService.invalidate_cache()
+            if address_changed:
+                transaction.on_commit(lambda: RepairRequestService.geocoding_queue.enqueue(repair_request))
             return repair_request
         except RepairRequest.DoesNotExist:
             raise HttpError(404, "Repair request not found or you don't have permission")
@@ -75,11 +144,12 @@ class RepairRequestService:
             if not can_complete:
                 raise HttpError(403, "No permission to complete this request")
 
-            repair_request.status = 'completed'
-            repair_request.save()
-
-            # Автоматически управляем списками
-            AutoListService.handle_request_completed(repair_request)
+            with transaction.atomic():
+                repair_request.status = 'completed'
+                repair_request.save()
+                # Перенос в список 'Выполнено' - в воркере outbox
+                OutboxService.enqueue('request_completed', repair_request_id=repair_request.id)
+            RepairRequestService.invalidate_cache()
 
             return repair_request
         except RepairRequest.DoesNotExist:
@@ -89,20 +159,22 @@ class RepairRequestService:
     def delete_request(request_id: int, user):
         try:
             repair_request = RepairRequest.objects.get(id=request_id, created_by=user)
+            participants = ChatService._participant_ids(repair_request)
             repair_request.delete()
+            ChatService.forget_access(request_id, participants)
+            RepairRequestService.invalidate_cache()
+            transaction.on_commit(lambda: RepairFeedService.index.discard(request_id))
             return {"message": "Repair request deleted successfully"}
         except RepairRequest.DoesNotExist:
             raise HttpError(404, "Repair request not found or you don't have permission")
 
     @staticmethod
-    def search_requests(search_term: str = None, device_type: str = None, status: str = None):
+    def search_requests(search_term: str = None, device_type: str = None, status: str = None,
+                        ranked: bool = True):
         queryset = RepairRequest.objects.select_related('created_by')
 
         if search_term:
-            queryset = queryset.filter(
-                models.Q(title__icontains=search_term) |
-                models.Q(description__icontains=search_term)
-            )
+            queryset = SearchIndexService.filter(queryset, search_term, ranked=ranked)
         if device_type:
             queryset = queryset.filter(device_type=device_type)
         if status:
@@ -110,9 +182,58 @@ class RepairRequestService:
 
         return queryset
 
+    @staticmethod
+    def search_requests_page(search_term: str = None, device_type: str = None, status: str = None,
+                             cursor: str = None, limit: int = 20, order: str = None):
+        """
+        order='relevance' (по умолчанию, если есть поисковая строка) - по релевантности,
+        курсор по (search_rank, id); order='newest' - новые первыми, курсор по (created_at, id).
+        Без полнотекстового индекса (или без слов в строке) - всегда новые первыми
+        """
+        order = order or ('relevance' if search_term else 'newest')
+        if order not in RepairRequestService.SEARCH_ORDERS:
+            raise HttpError(400, f"order must be one of: {', '.join(RepairRequestService.SEARCH_ORDERS)}")
+
+        queryset = RepairRequestService.with_schema_relations(
+            RepairRequestService.search_requests(search_term, device_type, status, ranked=order == 'relevance')
+        )
+        if 'search_rank' in queryset.query.annotations:
+            return CursorPaginationService.paginate(queryset, cursor, limit, ordering=('search_rank', '-id'))
+        return CursorPaginationService.paginate(queryset, cursor, limit)
+
     @staticmethod
     def get_available_filters():
         return {
             'device_types': [choice[0] for choice in RepairRequest.DEVICE_TYPES],
             'statuses': [choice[0] for choice in RepairRequest.STATUS_CHOICES]
         }
+
+    # Закэшированные ответы публичных эндпоинтов (готовый JSON)
+
+    @staticmethod
+    def cached_requests_page(cursor: str = None, limit: int = 20):
+        return RepairRequestService.cache.json_response(
+            'list', [cursor, limit], RepairRequestPageSchema,
+            lambda: RepairRequestService.get_requests_page(cursor, limit)
+        )
+
+    @staticmethod
+    def cached_search_page(search_term: str = None, device_type: str = None, status: str = None,
+                           cursor: str = None, limit: int = 20, order: str = None):
+        return RepairRequestService.cache.json_response(
+            'search', [search_term, device_type, status, cursor, limit, order], RepairRequestPageSchema,
+            lambda: RepairRequestService.search_requests_page(search_term, device_type, status, cursor, limit, order)
+        )
+
+    @staticmethod
+    def cached_request_by_id(request_id: int):
+        return RepairRequestService.cache.json_response(
+            'detail', [request_id], RepairRequestSchemaOut,
+            lambda: RepairRequestService.get_request_by_id(request_id)
+        )
+
+    @staticmethod
+    def cached_available_filters():
+        return RepairRequestService.cache.json_response(
+            'filters', [], None, RepairRequestService.get_available_filters
+        )
@@ -1,9 +1,12 @@
+from django.db import transaction
 from ninja.errors import HttpError
 from back.models import RepairRequest
-from .notification_service import NotificationService
 from back import models
 
-from .userlist_service import AutoListService
+from .repair_request_service import RepairRequestService
+from .chat_service import ChatService
+from .outbox_service import OutboxService
+from .user_service import UserService
 
 
 class ResponseService:
@@ -14,16 +17,19 @@ class ResponseService:
             if models.Response.objects.filter(repair_request=repair_request, worker=worker).exists():
                 raise HttpError(400, "You have already responded to this request")
 
-            response = models.Response.objects.create(
-                repair_request=repair_request,
-                worker=worker,
-                message=data.message,
-                proposed_price=data.proposed_price,
-                status='sent'
-            )
+            with transaction.atomic():
+                response = models.Response.objects.create(
+                    repair_request=repair_request,
+                    worker=worker,
+                    message=data.message,
+                    proposed_price=data.proposed_price,
+                    status='sent'
+                )
+                # Уведомление автору, список 'Смотрю', история действий - в воркере outbox
+                OutboxService.enqueue('response_created', response_id=response.id)
 
-            NotificationService.notify_new_response(repair_request, response)
-            AutoListService.handle_response_created(response)
+            # Отклик открывает работнику чат - закэшированный отказ больше не верен
+            ChatService.forget_access(repair_request.id, [worker.id])
             return response
 
         except RepairRequest.DoesNotExist:
@@ -38,13 +44,17 @@ class ResponseService:
             ).exists():
                 raise HttpError(403, "Access denied")
 
-            return models.Response.objects.filter(repair_request=repair_request).select_related('worker')
+            return models.Response.objects.filter(repair_request=repair_request).select_related(
+                *UserService.user_type_relations('worker')
+            )
         except RepairRequest.DoesNotExist:
             raise HttpError(404, "Repair request not found")
 
     @staticmethod
     def get_worker_responses(worker):
-        return models.Response.objects.filter(worker=worker).select_related('repair_request')
+        return models.Response.objects.filter(worker=worker).select_related(
+            'repair_request', *UserService.user_type_relations('worker')
+        )
 
     @staticmethod
     def accept_response(response_id: int, customer):
@@ -53,17 +63,19 @@ class ResponseService:
             if response.repair_request.created_by != customer:
                 raise HttpError(403, "Only the request owner can accept responses")
 
-            response.status = 'accepted'
-            response.save()
-            response.repair_request.status = 'active'
-            response.repair_request.save()
+            with transaction.atomic():
+                response.status = 'accepted'
+                response.save()
+                response.repair_request.status = 'active'
+                response.repair_request.save()
 
-            models.Response.objects.filter(
-                repair_request=response.repair_request
-            ).exclude(id=response_id).update(status='rejected')
+                models.Response.objects.filter(
+                    repair_request=response.repair_request
+                ).exclude(id=response_id).update(status='rejected')
+                OutboxService.enqueue('response_accepted', response_id=response.id)
 
-            NotificationService.notify_response_accepted(response)
-            AutoListService.handle_response_accepted(response)
+            RepairRequestService.invalidate_cache()
+            ChatService.forget_access(response.repair_request_id, ChatService._participant_ids(response.repair_request))
             return response
 
         except models.Response.DoesNotExist:
@@ -3,6 +3,7 @@ from ninja.errors import HttpError
 from django.db import models
 from back.models import RepairRequest, Review
 from back import models as api_models
+from back.services.user_service import UserService
 
 
 class ReviewService:
@@ -52,7 +53,10 @@ class ReviewService:
     def get_worker_reviews(worker_id: int):
         try:
             worker = User.objects.get(id=worker_id)
-            return Review.objects.filter(worker=worker).select_related('customer')
+            return Review.objects.filter(worker=worker).select_related(
+                *UserService.user_type_relations('customer'),
+                *UserService.user_type_relations('worker')
+            )
         except User.DoesNotExist:
             raise HttpError(404, "Worker not found")
 
@@ -93,4 +97,8 @@ class ReviewService:
     @staticmethod
     def get_my_reviews(customer):
         """Получить отзывы, оставленные текущим пользователем"""
-        return Review.objects.filter(customer=customer).select_related('worker', 'repair_request')
\ No newline at end of file
+        return Review.objects.filter(customer=customer).select_related(
+            'repair_request',
+            *UserService.user_type_relations('customer'),
+            *UserService.user_type_relations('worker')
+        )
\ No newline at end of file
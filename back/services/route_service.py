@@ -0,0 +1,154 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from ninja.errors import HttpError
+
+from back.services.distance_service import DistanceService
+
+
+class RoutePlanner:
+    """
+    Порядок объезда точек: ближайший сосед + 2-opt в пределах бюджета времени.
+
+    Маршрут открытый: начинается в стартовой точке (если она известна) и
+    заканчивается на последней заявке, возвращаться не нужно. Для этого в матрицу
+    добавляется фиктивный конечный узел с нулевыми расстояниями; без старта -
+    такой же фиктивный начальный узел. Тогда 2-opt работает как для замкнутого пути
+    с закрепленными концами.
+    """
+
+    @staticmethod
+    def nearest_neighbour(matrix: np.ndarray, nodes: int, start: int = 0) -> np.ndarray:
+        """Жадный путь по первым nodes узлам матрицы, от start"""
+        visited = np.zeros(nodes, dtype=bool)
+        path = np.empty(nodes, dtype=np.int64)
+        path[0] = start
+        visited[start] = True
+        for k in range(1, nodes):
+            row = np.where(visited, np.inf, matrix[path[k - 1], :nodes])
+            path[k] = np.argmin(row)
+            visited[path[k]] = True
+        return path
+
+    @staticmethod
+    def two_opt(matrix: np.ndarray, path: np.ndarray, deadline: float) -> tuple:
+        """
+        Улучшать путь разворотом отрезков path[i..j], пока есть выигрыш и не вышло время.
+        Для каждого i выигрыш всех j считается одной векторной операцией.
+        Первый и последний узлы не двигаются. Возвращает (путь, число проходов, уложились ли во время)
+        """
+        path = path.copy()
+        last = len(path) - 1
+        passes = 0
+        improved = True
+        while improved:
+            improved = False
+            passes += 1
+            for i in range(1, last - 1):
+                if time.perf_counter() > deadline:
+                    return path, passes, False
+                a, b = path[i - 1], path[i]
+                ends, following = path[i + 1:last], path[i + 2:last + 1]
+                delta = matrix[a, ends] + matrix[b, following] - matrix[a, b] - matrix[ends, following]
+                j = int(np.argmin(delta))
+                if delta[j] < -1e-9:
+                    path[i:i + j + 2] = path[i:i + j + 2][::-1].copy()
+                    improved = True
+        return path, passes, True
+
+    @staticmethod
+    def path_length(matrix: np.ndarray, path: np.ndarray) -> float:
+        return float(matrix[path[:-1], path[1:]].sum())
+
+    @staticmethod
+    def plan(points: List[tuple], start: Optional[tuple] = None, time_budget_ms: Optional[int] = None) -> Dict:
+        """
+        points - [(lat, lon), ...]. Возвращает порядок (индексы points), длину маршрута,
+        длину жадного маршрута до 2-opt и сколько времени заняло
+        """
+        started = time.perf_counter()
+        if time_budget_ms is None:
+            time_budget_ms = settings.ROUTE_TIME_BUDGET_MS
+        deadline = started + time_budget_ms / 1000
+
+        if not points:
+            return {'order': [], 'distance_km': 0.0, 'initial_distance_km': 0.0, 'passes': 0,
+                    'completed': True, 'elapsed_ms': 0.0}
+
+        # Узлы: 0 - старт (или фиктивный), 1..n - точки, n + 1 - фиктивный конец
+        n = len(points)
+        matrix = np.zeros((n + 2, n + 2), dtype=np.float64)
+        matrix[1:n + 1, 1:n + 1] = DistanceService.distance_matrix(points, points)
+        if start is not None:
+            matrix[0, 1:n + 1] = matrix[1:n + 1, 0] = DistanceService.distance_matrix([start], points)[0]
+
+        initial = np.append(RoutePlanner.nearest_neighbour(matrix, n + 1), n + 1)
+        path, passes, completed = RoutePlanner.two_opt(matrix, initial, deadline)
+        return {
+            'order': (path[1:-1] - 1).tolist(),
+            'distance_km': round(RoutePlanner.path_length(matrix, path), 2),
+            'initial_distance_km': round(RoutePlanner.path_length(matrix, initial), 2),
+            'passes': passes,
+            'completed': completed,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+class RouteService:
+    """Маршрут работника по заявкам, где его отклик принят"""
+
+    @staticmethod
+    def plan_worker_route(worker, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                          time_budget_ms: Optional[int] = None) -> Dict:
+        from back.models import Response
+        from back.models.geolocation_models import UserLocation
+
+        if (latitude is None) != (longitude is None):
+            raise HttpError(400, "Both lat and lon are required")
+        if time_budget_ms is not None and not 0 < time_budget_ms <= settings.ROUTE_TIME_BUDGET_MS:
+            raise HttpError(400, f"time_budget_ms must be between 1 and {settings.ROUTE_TIME_BUDGET_MS}")
+
+        jobs = list(Response.objects.filter(
+            worker=worker, status='accepted', repair_request__status='active'
+        ).order_by('repair_request_id').values_list(
+            'repair_request_id', 'repair_request__title', 'repair_request__address',
+            'repair_request__latitude', 'repair_request__longitude'
+        )[:settings.ROUTE_MAX_STOPS + 1])
+        if len(jobs) > settings.ROUTE_MAX_STOPS:
+            raise HttpError(400, f"Too many stops, at most {settings.ROUTE_MAX_STOPS}")
+
+        located = [job for job in jobs if job[3] is not None and job[4] is not None]
+        start = (latitude, longitude) if latitude is not None else None
+        if start is None:
+            start = UserLocation.objects.filter(
+                user=worker, latitude__isnull=False, longitude__isnull=False
+            ).values_list('latitude', 'longitude').first()
+
+        plan = RoutePlanner.plan([job[3:5] for job in located], start, time_budget_ms)
+
+        stops = []
+        previous = start
+        for position in plan['order']:
+            request_id, title, address, stop_latitude, stop_longitude = located[position]
+            step = 0.0 if previous is None else float(
+                DistanceService.haversine_km(previous[0], previous[1], stop_latitude, stop_longitude)
+            )
+            stops.append({
+                'request_id': request_id,
+                'title': title,
+                'address': address,
+                'latitude': stop_latitude,
+                'longitude': stop_longitude,
+                'distance_from_previous_km': round(step, 2),
+            })
+            previous = (stop_latitude, stop_longitude)
+
+        return {
+            'start': {'latitude': start[0], 'longitude': start[1]} if start else None,
+            'stops': stops,
+            'total_distance_km': plan['distance_km'],
+            'unlocated_request_ids': [job[0] for job in jobs if job[3] is None or job[4] is None],
+            'optimized': plan['completed'],
+        }
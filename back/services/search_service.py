@@ -0,0 +1,96 @@
+import re
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+
+class SearchIndexService:
+    """Полнотекстовый поиск по заявкам (SQLite FTS5 / PostgreSQL tsvector)"""
+
+    FTS_TABLE = 'back_repairrequest_fts'
+    PG_DOCUMENT = (
+        "setweight(to_tsvector('simple', coalesce(back_repairrequest.title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(back_repairrequest.description, '')), 'B')"
+    )
+    TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+    # Кэш проверки наличия FTS-таблицы: {имя БД: bool}
+    _sqlite_ready = {}
+
+    @staticmethod
+    def tokenize(search_term: str) -> list:
+        """Разбить строку поиска на слова (все спецсимволы отбрасываются)"""
+        return SearchIndexService.TOKEN_RE.findall(search_term or '')
+
+    @staticmethod
+    def backend() -> str:
+        """Какой индекс доступен в текущей БД: 'fts5', 'tsvector' или 'icontains'"""
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        if connection.vendor == 'sqlite' and SearchIndexService._has_fts_table():
+            return 'fts5'
+        return 'icontains'
+
+    @staticmethod
+    def _has_fts_table() -> bool:
+        db_name = str(connection.settings_dict['NAME'])
+        if db_name not in SearchIndexService._sqlite_ready:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [SearchIndexService.FTS_TABLE]
+                )
+                SearchIndexService._sqlite_ready[db_name] = cursor.fetchone() is not None
+        return SearchIndexService._sqlite_ready[db_name]
+
+    @staticmethod
+    def filter(queryset, search_term: str, ranked: bool = True):
+        """
+        Отфильтровать заявки по поисковой строке.
+        Каждое слово ищется по префиксу, все слова должны встретиться.
+        При ranked=True добавляется аннотация search_rank (меньше - релевантнее)
+        и сортировка по ней.
+        """
+        terms = SearchIndexService.tokenize(search_term)
+        backend = SearchIndexService.backend()
+
+        if not terms or backend == 'icontains':
+            return SearchIndexService.filter_icontains(queryset, search_term)
+
+        if backend == 'fts5':
+            table = SearchIndexService.FTS_TABLE
+            match = ' '.join('"%s"*' % term for term in terms)
+            where = [f'{table}.rowid = back_repairrequest.id', f'{table} MATCH %s']
+            rank = f'bm25({table}, 10.0, 1.0)'
+            extra_tables = [table]
+        else:
+            match = ' & '.join('%s:*' % term for term in terms)
+            where = [f"({SearchIndexService.PG_DOCUMENT}) @@ to_tsquery('simple', %s)"]
+            rank = f"-ts_rank({SearchIndexService.PG_DOCUMENT}, to_tsquery('simple', %s))"
+            extra_tables = []
+
+        queryset = queryset.extra(tables=extra_tables, where=where, params=[match])
+        if not ranked:
+            return queryset
+
+        # Аннотация, а не extra(select=...): по ней можно фильтровать (курсор по релевантности)
+        return queryset.annotate(
+            search_rank=RawSQL(rank, [] if backend == 'fts5' else [match], output_field=models.FloatField())
+        ).order_by('search_rank', '-id')
+
+    @staticmethod
+    def filter_icontains(queryset, search_term: str):
+        """Старый путь без индекса - полный просмотр таблицы"""
+        return queryset.filter(
+            models.Q(title__icontains=search_term) |
+            models.Q(description__icontains=search_term)
+        )
+
+    @staticmethod
+    def rebuild():
+        """Перестроить FTS-индекс целиком (например, после ручной заливки данных)"""
+        if SearchIndexService.backend() != 'fts5':
+            return
+        table = SearchIndexService.FTS_TABLE
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
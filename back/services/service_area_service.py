@@ -0,0 +1,249 @@
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from back.models import geohash
+from back.services.distance_service import DistanceService
+
+
+def normalize_place(text: str) -> str:
+    """'г. Алматы ' -> 'алматы'"""
+    text = re.sub(r'\s+', ' ', (text or '').lower().replace('ё', 'е')).strip()
+    return re.sub(r'^(г\.|город)\s*', '', text)
+
+
+class ServiceAreaIndex:
+    """
+    Индекс зон обслуживания для подбора работников под заявку.
+
+    Зона работника с известными координатами (UserLocation) - круг radius_km вокруг
+    него; она записывается во все ячейки сетки geohash (CELL_PRECISION), которые пересекает bbox круга.
+    Зона без координат покрывает весь город (и район, если задан) - она в индексе по городу.
+    Поиск: списки из ячейки точки заявки и из городов в ее адресе, затем точная
+    проверка расстояния и специализации векторно по кандидатам.
+
+    invalidate() сбрасывает индекс только в своем процессе, а подбор работников для рассылки
+    идет в воркере outbox. Поэтому не чаще раза в check_interval секунд индекс сверяет
+    с БД версию зон (наибольший id и число строк). Новая или удаленная зона в любом процессе
+    перестраивает его.
+    """
+
+    CELL_PRECISION = 5  # ~4.9 x 4.9 км
+
+    def __init__(self, max_age: int = 300, check_interval: float = 5, max_radius_km: float = 100):
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.max_radius_km = max_radius_km
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+        self._state = None
+        self._stale = True
+
+    def invalidate(self):
+        """Перестроить индекс при следующем поиске"""
+        self._stale = True
+
+    @staticmethod
+    def version() -> tuple:
+        """Версия зон в БД: (наибольший id, число строк) - один запрос по первичному ключу"""
+        from back.models.geolocation_models import ServiceArea
+
+        version = ServiceArea.objects.aggregate(last=Max('id'), total=Count('id'))
+        return version['last'], version['total']
+
+    def _needs_rebuild(self) -> bool:
+        if self._stale or self._state is None:
+            return True
+        now = time.monotonic()
+        if self.max_age is not None and now - self._state.built_at > self.max_age:
+            return True
+        if self.check_interval is not None and now - self._state.checked_at >= self.check_interval:
+            self._state.checked_at = now
+            return self.version() != self._state.version
+        return False
+
+    def ensure_fresh(self):
+        with self._lock:
+            if self._needs_rebuild():
+                self.rebuild()
+        return self._state
+
+    def rebuild(self):
+        from back.models.geolocation_models import ServiceArea
+
+        self._stale = False
+        # Версия читается до строк: зона, добавленная между запросами, вызовет еще одну перестройку
+        version = self.version()
+        rows = list(ServiceArea.objects.filter(worker__worker_profile__isnull=False).values_list(
+            'worker_id', 'city', 'district', 'radius_km',
+            'worker__location__latitude', 'worker__location__longitude',
+            'worker__worker_profile__specialization'
+        ))
+        # Новое состояние подменяется целиком - параллельные поиски видят либо старое, либо новое
+        state = self._build(rows)
+        state.version = version
+        self._state = state
+        self.rebuilds += 1
+
+    def _build(self, rows: list) -> SimpleNamespace:
+        coordinates = np.array(
+            [(row[4], row[5]) if row[4] is not None and row[5] is not None else (np.nan, np.nan) for row in rows],
+            dtype=np.float64
+        ).reshape(-1, 2)
+        # Радиус ограничен и здесь (строки могли попасть в БД в обход API): число ячеек зоны растет
+        # квадратично от радиуса, и одна огромная зона раздула бы память при перестройке
+        radius = np.clip(np.array([row[3] for row in rows], dtype=np.float64), 0, self.max_radius_km)
+
+        cities = {}
+        located = ~np.isnan(coordinates[:, 0])
+        for i in np.flatnonzero(~located).tolist():
+            cities.setdefault(normalize_place(rows[i][1]), []).append(i)
+
+        return SimpleNamespace(
+            size=len(rows),
+            worker_ids=np.array([row[0] for row in rows], dtype=np.int64),
+            radius=radius,
+            coordinates=coordinates,
+            specializations=[(row[6] or '').lower() for row in rows],
+            districts=[normalize_place(row[2]) for row in rows],
+            cells=self._cell_lists(np.flatnonzero(located), coordinates, radius),
+            cities={city: np.array(ids, dtype=np.int32) for city, ids in cities.items()},
+            device_masks={},
+            built_at=time.monotonic(),
+            checked_at=time.monotonic(),
+        )
+
+    @classmethod
+    def cell_key(cls, latitude, longitude):
+        """Номер ячейки сетки (та же сетка, что у geohash длины CELL_PRECISION)"""
+        height, width = geohash.cell_size_deg(cls.CELL_PRECISION)
+        columns = int(round(360.0 / width))
+        row = np.floor((np.asarray(latitude) + 90.0) / height).astype(np.int64)
+        column = np.floor((np.asarray(longitude) + 180.0) / width).astype(np.int64) % columns
+        return row * columns + column
+
+    @classmethod
+    def _cell_lists(cls, areas: np.ndarray, coordinates: np.ndarray, radius: np.ndarray) -> Dict[int, np.ndarray]:
+        """
+        Для каждой ячейки - зоны, чей bbox круга ее пересекает.
+        Без циклов по зонам: диапазоны ячеек разворачиваются через np.repeat
+        """
+        if not len(areas):
+            return {}
+        height, width = geohash.cell_size_deg(cls.CELL_PRECISION)
+        columns = int(round(360.0 / width))
+        latitude, longitude, radius = coordinates[areas, 0], coordinates[areas, 1], radius[areas]
+
+        d_lat = radius / geohash.KM_PER_DEGREE
+        worst_latitude = np.minimum(89.0, np.abs(latitude) + d_lat)
+        d_lon = radius / (geohash.KM_PER_DEGREE * np.maximum(0.01, np.cos(np.radians(worst_latitude))))
+
+        row_start = np.floor((np.maximum(-90.0, latitude - d_lat) + 90.0) / height).astype(np.int64)
+        row_end = np.floor((np.minimum(89.999999, latitude + d_lat) + 90.0) / height).astype(np.int64)
+        col_start = np.floor((longitude - d_lon + 180.0) / width).astype(np.int64)
+        col_end = np.floor((longitude + d_lon + 180.0) / width).astype(np.int64)
+        col_end = np.minimum(col_end, col_start + columns - 1)
+
+        n_cols = col_end - col_start + 1
+        counts = (row_end - row_start + 1) * n_cols
+        owner = np.repeat(np.arange(len(areas)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = row_start[owner] + offset // n_cols[owner]
+        cols = (col_start[owner] + offset % n_cols[owner]) % columns
+        keys = rows * columns + cols
+
+        order = np.argsort(keys, kind='stable')
+        keys, members = keys[order], areas[owner[order]].astype(np.int32)
+        unique, starts = np.unique(keys, return_index=True)
+        return dict(zip(unique.tolist(), np.split(members, starts[1:])))
+
+    @staticmethod
+    def _device_mask(state, device_type: Optional[str]) -> np.ndarray:
+        """Специализация пустая (берет всё) или содержит тип устройства"""
+        device_type = (device_type or '').lower()
+        mask = state.device_masks.get(device_type)
+        if mask is None:
+            mask = np.array([not spec or device_type in spec for spec in state.specializations], dtype=bool)
+            state.device_masks[device_type] = mask
+        return mask
+
+    def match(self, latitude: Optional[float], longitude: Optional[float], device_type: str = None,
+              address: str = '') -> List[int]:
+        """
+        id работников, чья зона покрывает точку/адрес заявки и специализация подходит под device_type.
+        Сначала попавшие по расстоянию (ближние раньше), затем зоны "весь город"
+        """
+        state = self.ensure_fresh()
+        mask = self._device_mask(state, device_type)
+        matched = []
+
+        if latitude is not None and longitude is not None:
+            candidates = state.cells.get(int(self.cell_key(latitude, longitude)))
+            if candidates is not None:
+                candidates = candidates[mask[candidates]]
+                distances = DistanceService.haversine_km(
+                    latitude, longitude, state.coordinates[candidates, 0], state.coordinates[candidates, 1]
+                )
+                inside = distances <= state.radius[candidates]
+                candidates, distances = candidates[inside], distances[inside]
+                matched.extend(candidates[np.argsort(distances, kind='stable')].tolist())
+
+        normalized_address = normalize_place(address)
+        for part in {normalize_place(part) for part in (address or '').split(',')}:
+            candidates = state.cities.get(part)
+            if candidates is None:
+                continue
+            for i in candidates[mask[candidates]].tolist():
+                if not state.districts[i] or state.districts[i] in normalized_address:
+                    matched.append(i)
+
+        # У работника может быть несколько зон
+        return list(dict.fromkeys(state.worker_ids[matched].tolist()))
+
+    def match_request(self, repair_request) -> List[int]:
+        return self.match(repair_request.latitude, repair_request.longitude,
+                          repair_request.device_type, repair_request.address)
+
+    def stats(self) -> Dict:
+        state = self._state
+        if state is None:
+            return {'areas': 0, 'cells': 0, 'cities': 0, 'rebuilds': self.rebuilds, 'memory_bytes': 0}
+        memory = sum(array.nbytes for array in state.cells.values())
+        memory += sum(array.nbytes for array in state.cities.values())
+        memory += state.worker_ids.nbytes + state.radius.nbytes + state.coordinates.nbytes
+        return {
+            'areas': state.size,
+            'cells': len(state.cells),
+            'cities': len(state.cities),
+            'rebuilds': self.rebuilds,
+            'memory_bytes': memory,
+        }
+
+
+class ServiceAreaService:
+    """Зоны обслуживания работников и подбор работников под заявку"""
+
+    index = ServiceAreaIndex(
+        max_age=settings.SERVICE_AREA_INDEX_MAX_AGE,
+        check_interval=settings.SERVICE_AREA_INDEX_CHECK_INTERVAL,
+        max_radius_km=settings.SERVICE_AREA_MAX_RADIUS_KM,
+    )
+
+    @staticmethod
+    def add_service_area(worker, city: str, radius_km: int = 10, district: str = ''):
+        from back.models.geolocation_models import ServiceArea
+
+        area = ServiceArea.objects.create(worker=worker, city=city, district=district, radius_km=radius_km)
+        transaction.on_commit(ServiceAreaService.index.invalidate)
+        return area
+
+    @staticmethod
+    def find_matching_workers(repair_request) -> List[int]:
+        return ServiceAreaService.index.match_request(repair_request)
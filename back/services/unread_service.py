@@ -0,0 +1,93 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from back.models import Notification, UnreadChatCounter, UnreadNotificationCounter
+
+
+class UnreadService:
+    """
+    Счетчики непрочитанного: по чатам и по типам уведомлений.
+
+    Меняются в той же транзакции, что и сообщения/уведомления, поэтому /users/me/unread
+    читает несколько строк пользователя, а не всю историю. Увеличение - вставка
+    недостающих строк с count=0 (ignore_conflicts) и UPDATE count = count + n:
+    параллельные запросы не теряют приращения
+    """
+
+    CHUNK_SIZE = 500
+
+    @staticmethod
+    def _increment(model, key_field: str, amounts: Dict[tuple, int]):
+        """amounts: {(user_id, ключ): n}"""
+        if not amounts:
+            return
+        model.objects.bulk_create([
+            model(user_id=user_id, **{key_field: key}) for user_id, key in amounts
+        ], ignore_conflicts=True, batch_size=UnreadService.CHUNK_SIZE)
+
+        # Один UPDATE на (ключ, n): при рассылке у всех получателей одинаковое приращение
+        groups = defaultdict(list)
+        for (user_id, key), amount in amounts.items():
+            groups[key, amount].append(user_id)
+        for (key, amount), user_ids in groups.items():
+            for start in range(0, len(user_ids), UnreadService.CHUNK_SIZE):
+                model.objects.filter(
+                    user_id__in=user_ids[start:start + UnreadService.CHUNK_SIZE], **{key_field: key}
+                ).update(count=F('count') + amount)
+
+    @staticmethod
+    def chat_message_sent(repair_request_id: int, recipient_ids: Iterable[int]):
+        UnreadService._increment(UnreadChatCounter, 'repair_request_id', {
+            (user_id, repair_request_id): 1 for user_id in recipient_ids
+        })
+
+    @staticmethod
+    def chat_read(repair_request_id: int, user):
+        UnreadChatCounter.objects.filter(
+            user=user, repair_request_id=repair_request_id, count__gt=0
+        ).update(count=0)
+
+    @staticmethod
+    def notifications_created(notifications: Iterable):
+        UnreadService._increment(UnreadNotificationCounter, 'notification_type', Counter(
+            (notification.user_id, notification.notification_type)
+            for notification in notifications if not notification.is_read
+        ))
+
+    @staticmethod
+    def notifications_read(user, types: Iterable[str]):
+        """types - типы только что прочитанных уведомлений, по одному на уведомление"""
+        for notification_type, amount in Counter(types).items():
+            UnreadNotificationCounter.objects.filter(
+                user=user, notification_type=notification_type
+            ).update(count=Greatest(F('count') - amount, 0))
+
+    @staticmethod
+    def recount_notifications(user):
+        """Пересчитать счетчики уведомлений по непрочитанным строкам (после массовой отметки)"""
+        counts = dict(Notification.objects.filter(user=user, is_read=False).values(
+            'notification_type'
+        ).annotate(n=Count('id')).values_list('notification_type', 'n'))
+        UnreadNotificationCounter.objects.filter(user=user).exclude(notification_type__in=counts).update(count=0)
+        for notification_type, count in counts.items():
+            UnreadNotificationCounter.objects.update_or_create(
+                user=user, notification_type=notification_type, defaults={'count': count}
+            )
+
+    @staticmethod
+    def get_unread(user) -> Dict:
+        chats = list(UnreadChatCounter.objects.filter(user=user, count__gt=0).order_by(
+            'repair_request_id'
+        ).values('repair_request_id', 'count'))
+        notifications = dict(UnreadNotificationCounter.objects.filter(user=user, count__gt=0).order_by(
+            'notification_type'
+        ).values_list('notification_type', 'count'))
+        return {
+            'chats': chats,
+            'notifications': notifications,
+            'total_chat_messages': sum(chat['count'] for chat in chats),
+            'total_notifications': sum(notifications.values()),
+        }
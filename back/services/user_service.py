@@ -4,6 +4,7 @@ from ninja.errors import HttpError
 
 from back.models import RepairRequest, Response, Review
 from back.models.users_models import CustomerProfile, WorkerProfile, UserActivity
+from back.services.repair_feed_service import RepairFeedService
 
 
 class UserService:
@@ -41,6 +42,15 @@ class UserService:
         except User.DoesNotExist:
             raise HttpError(404, "User not found")
 
+    @staticmethod
+    def user_type_relations(prefix: str = '') -> list:
+        """
+        Пути для select_related, по которым UserSchema определяет тип пользователя
+        без отдельного запроса на каждый профиль
+        """
+        path = f'{prefix}__' if prefix else ''
+        return [f'{path}customer_profile', f'{path}worker_profile']
+
     @staticmethod
     def get_user_type(user):
         if hasattr(user, 'customer_profile'):
@@ -82,6 +92,7 @@ class UserProfileService:
 
         if update_fields:
             profile.save(update_fields=update_fields)
+            RepairFeedService.forget_on_commit(user.id)
 
         return profile
 
@@ -131,6 +142,16 @@ class UserProfileService:
             "avatar_url": profile.avatar.url if profile.avatar else None
         }
 
+    @staticmethod
+    def worker_favorite_categories(user, limit: int = 3) -> list:
+        """Типы устройств, на заявки с которыми работник откликался чаще всего"""
+        favorite_categories = Response.objects.filter(
+            worker=user
+        ).values('repair_request__device_type').annotate(
+            count=models.Count('id')
+        ).order_by('-count')[:limit]
+        return [cat['repair_request__device_type'] for cat in favorite_categories]
+
     @staticmethod
     def get_user_stats(user):
 
@@ -169,12 +190,7 @@ class UserProfileService:
                     avg_rating=models.Avg('rating')
                 )['avg_rating'], 1)
 
-            favorite_categories = Response.objects.filter(
-                worker=user
-            ).values('repair_request__device_type').annotate(
-                count=models.Count('id')
-            ).order_by('-count')[:3]
-            stats['favorite_categories'] = [cat['repair_request__device_type'] for cat in favorite_categories]
+            stats['favorite_categories'] = UserProfileService.worker_favorite_categories(user)
 
         return stats
 
@@ -70,12 +70,15 @@ class UserListService:
 
     @staticmethod
     def get_list_items(user, list_name: str):
+        from back.services.repair_request_service import RepairRequestService
+
         UserListService.get_or_create_user_lists(user)
         """Получить элементы списка с пагинацией"""
         user_list = UserListService.get_list_by_name(user, list_name)
-        queryset = ListItem.objects.filter(
-            user_list=user_list
-        ).select_related('repair_request', 'repair_request__created_by')
+        queryset = RepairRequestService.with_schema_relations(
+            ListItem.objects.filter(user_list=user_list),
+            prefix='repair_request'
+        )
 
         return queryset
 
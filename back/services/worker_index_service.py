@@ -0,0 +1,444 @@
+import heapq
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from back.services.distance_service import DistanceService
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """
+    Координаты на единичной сфере (x, y, z).
+    Хорда между точками монотонна по расстоянию по дуге, поэтому дерево
+    строится в 3D без проблем с линией перемены дат и сужением долгот к полюсам
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_length(distance_km: float) -> float:
+    """Длина хорды на единичной сфере для расстояния по дуге"""
+    angle = min(np.pi, distance_km / DistanceService.EARTH_RADIUS_KM)
+    return 2 * np.sin(angle / 2)
+
+
+class KDTree:
+    """
+    Статическое k-d дерево над точками (n, 3).
+    Точки переупорядочены так, что каждый лист - непрерывный срез,
+    расстояния внутри листа считаются векторно
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 32):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(points))
+
+        starts, ends, lefts, rights, mins, maxs = [], [], [], [], [], []
+
+        def add_node(start, end):
+            chunk = points[self.order[start:end]]
+            starts.append(start)
+            ends.append(end)
+            lefts.append(-1)
+            rights.append(-1)
+            mins.append(chunk.min(axis=0) if end > start else np.full(3, np.inf))
+            maxs.append(chunk.max(axis=0) if end > start else np.full(3, -np.inf))
+            return len(starts) - 1
+
+        stack = [add_node(0, len(points))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= leaf_size:
+                continue
+            # Делим по самой длинной стороне bounding box по медиане
+            axis = int(np.argmax(maxs[node] - mins[node]))
+            middle = (start + end) // 2
+            segment = self.order[start:end]
+            split = np.argpartition(points[segment, axis], middle - start)
+            self.order[start:end] = segment[split]
+
+            lefts[node] = add_node(start, middle)
+            rights[node] = add_node(middle, end)
+            stack.extend((lefts[node], rights[node]))
+
+        self.points = points[self.order]
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.lefts = np.array(lefts, dtype=np.int64)
+        self.rights = np.array(rights, dtype=np.int64)
+        self.mins = np.array(mins, dtype=np.float64).reshape(-1, 3)
+        self.maxs = np.array(maxs, dtype=np.float64).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.order, self.points, self.starts, self.ends,
+                                      self.lefts, self.rights, self.mins, self.maxs))
+
+    def _box_distance(self, node: int, point: np.ndarray) -> float:
+        delta = np.maximum(0.0, np.maximum(self.mins[node] - point, point - self.maxs[node]))
+        return float(np.sqrt(delta @ delta))
+
+    def query_radius(self, point, radius: float) -> np.ndarray:
+        """Исходные индексы точек на расстоянии (по хорде) не больше radius"""
+        point = np.asarray(point, dtype=np.float64)
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+
+        slices = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, point) > radius:
+                continue
+            if self.lefts[node] < 0:
+                slices.append(np.arange(self.starts[node], self.ends[node]))
+            else:
+                stack.extend((self.lefts[node], self.rights[node]))
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate(slices)
+        delta = self.points[positions] - point
+        positions = positions[np.einsum('ij,ij->i', delta, delta) <= radius * radius]
+        return self.order[positions]
+
+    def query_knn(self, point, k: int) -> np.ndarray:
+        """Исходные индексы k ближайших точек (best-first обход по расстоянию до узлов)"""
+        point = np.asarray(point, dtype=np.float64)
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        best_positions = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float64)
+        heap = [(0.0, 0)]
+        while heap:
+            box_distance, node = heapq.heappop(heap)
+            if len(best_distances) == k and box_distance > best_distances[-1]:
+                break
+            if self.lefts[node] >= 0:
+                for child in (self.lefts[node], self.rights[node]):
+                    heapq.heappush(heap, (self._box_distance(child, point), int(child)))
+                continue
+
+            positions = np.arange(self.starts[node], self.ends[node])
+            delta = self.points[positions] - point
+            distances = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+            best_positions = np.concatenate([best_positions, positions])
+            best_distances = np.concatenate([best_distances, distances])
+            keep = np.argsort(best_distances, kind='stable')[:k]
+            best_positions, best_distances = best_positions[keep], best_distances[keep]
+
+        return self.order[best_positions]
+
+
+class WorkerLocationIndex:
+    """
+    Индекс координат работников в памяти процесса (k-d дерево) вместе с
+    рейтингом, специализацией и адресом - поиск поблизости не ходит в БД.
+
+    Изменения из этого процесса (upsert/discard) видны сразу: старая строка
+    дерева помечается удалённой, новая попадает в небольшой буфер, который
+    просматривается перебором. Дерево перестраивается лениво, когда буфер
+    разрастается или индекс старше max_age - это и есть граница устаревания
+    для изменений из других процессов (отзывы, профиль, прямые записи в БД).
+
+    Перестройка (запрос по всей таблице и построение дерева) идет вне self._lock и
+    только в одном потоке: остальные запросы в это время читают старое дерево, а пока
+    дерева еще нет - ищут в БД. Изменения, пришедшие во время перестройки, записываются
+    в журнал и применяются к новому дереву при подмене.
+    """
+
+    MIN_REBUILD_PENDING = 256
+    REBUILD_PENDING_RATIO = 0.1
+
+    def __init__(self, max_age: int = 60, leaf_size: int = 32):
+        self.max_age = max_age
+        self.leaf_size = leaf_size
+        self.enabled = max_age != 0
+        self.rebuilds = 0
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._generation = 0
+        self._journal = None
+        self._reset()
+
+    def _reset(self):
+        self._tree = None
+        self._built_at = None
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._coordinates = np.empty((0, 2), dtype=np.float64)
+        self._alive = np.empty(0, dtype=bool)
+        self._details = []
+        self._rows = {}
+        self._pending = {}
+        self._device_masks = {}
+
+    def invalidate(self):
+        """Сбросить индекс - следующий запрос перестроит его из БД"""
+        with self._lock:
+            # Идущая перестройка могла прочитать БД до изменений - ее результат не подставляем
+            self._generation += 1
+            self._reset()
+
+    def staleness(self) -> Optional[float]:
+        """Возраст дерева в секундах (None - ещё не построено)"""
+        if self._built_at is None:
+            return None
+        return time.monotonic() - self._built_at
+
+    def _needs_rebuild(self) -> bool:
+        if self._tree is None:
+            return True
+        if self.max_age is not None and self.staleness() > self.max_age:
+            return True
+        limit = max(self.MIN_REBUILD_PENDING, int(len(self._user_ids) * self.REBUILD_PENDING_RATIO))
+        return len(self._pending) > limit
+
+    def ensure_fresh(self, wait: bool = False) -> bool:
+        """
+        Перестроить устаревший индекс. Если перестройку уже ведет другой поток, не ждет ее
+        (wait=True - ждет, пока дерева нет вовсе). Возвращает, есть ли дерево для поиска
+        """
+        with self._lock:
+            if not self._needs_rebuild():
+                return True
+            blocking = wait and self._tree is None
+        if self._rebuild_lock.acquire(blocking=blocking):
+            try:
+                with self._lock:  # пока ждали блокировку, дерево мог построить другой поток
+                    stale = self._needs_rebuild()
+                if stale:
+                    self.rebuild()
+            finally:
+                self._rebuild_lock.release()
+        with self._lock:
+            return self._tree is not None
+
+    def rebuild(self):
+        """Загрузить всех работников с координатами одним запросом и построить дерево"""
+        from back.models.geolocation_models import UserLocation
+
+        with self._lock:
+            generation = self._generation
+            self._journal = {}
+        try:
+            rows = list(UserLocation.objects.filter(
+                user__worker_profile__isnull=False,
+                latitude__isnull=False,
+                longitude__isnull=False
+            ).values_list(
+                'user_id', 'latitude', 'longitude', 'user__username',
+                'user__worker_profile__specialization', 'user__worker_profile__rating', 'address'
+            ))
+            self._load(rows, generation)
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def _load(self, rows: list, generation: int):
+        """Построить дерево вне блокировки и подменить им текущее"""
+        user_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coordinates = np.array([row[1:3] for row in rows], dtype=np.float64).reshape(-1, 2)
+        tree = KDTree(to_unit_vectors(coordinates[:, 0], coordinates[:, 1]), self.leaf_size)
+
+        with self._lock:
+            if generation != self._generation:
+                return  # индекс сбросили во время перестройки
+            self._reset()
+            self._user_ids = user_ids
+            self._coordinates = coordinates
+            self._alive = np.ones(len(rows), dtype=bool)
+            self._details = [row[3:] for row in rows]
+            self._rows = {row[0]: i for i, row in enumerate(rows)}
+            self._tree = tree
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+            # Изменения после начала перестройки запрос мог не увидеть
+            for user_id, pending in self._journal.items():
+                self._kill_row(user_id)
+                if pending is not None:
+                    self._pending[user_id] = pending
+
+    def upsert(self, location):
+        """Учесть новые координаты пользователя (не работник или без координат - убрать из индекса)"""
+        from back.models.users_models import WorkerProfile
+
+        try:
+            profile = location.user.worker_profile
+        except WorkerProfile.DoesNotExist:
+            profile = None
+
+        if profile is None or location.latitude is None or location.longitude is None:
+            self.discard(location.user_id)
+            return
+
+        pending = (
+            location.latitude, location.longitude,
+            (location.user.username, profile.specialization, profile.rating, location.address)
+        )
+        with self._lock:
+            if self._journal is not None:
+                self._journal[location.user_id] = pending
+            if self._tree is None:  # индекс ещё не строился - возьмёт всё из БД
+                return
+            self._kill_row(location.user_id)
+            self._pending[location.user_id] = pending
+
+    def discard(self, user_id: int):
+        with self._lock:
+            if self._journal is not None:
+                self._journal[user_id] = None
+            self._kill_row(user_id)
+            self._pending.pop(user_id, None)
+
+    def _kill_row(self, user_id: int):
+        row = self._rows.pop(user_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    def _candidates(self, latitude: float, longitude: float, max_distance_km: float):
+        """(user_ids, расстояния, детали) всех живых точек в радиусе - из дерева и буфера"""
+        # Запас в 10 м: расстояния округляются до 0.01 км, как и раньше
+        rows = self._tree.query_radius(to_unit_vectors(latitude, longitude), chord_length(max_distance_km + 0.01))
+        rows = rows[self._alive[rows]]
+
+        user_ids = self._user_ids[rows].tolist()
+        coordinates = self._coordinates[rows]
+        details = [self._details[row] for row in rows.tolist()]
+
+        if self._pending:
+            user_ids += list(self._pending)
+            coordinates = np.vstack([coordinates, [p[:2] for p in self._pending.values()]])
+            details += [p[2] for p in self._pending.values()]
+
+        distances = np.round(DistanceService.haversine_km(
+            latitude, longitude, coordinates[:, 0], coordinates[:, 1]
+        ), 2)
+        return user_ids, distances, details
+
+    def find_nearby(self, latitude: float, longitude: float, max_distance_km: float = 10,
+                    limit: Optional[int] = None) -> List[Dict]:
+        """Работники в радиусе по возрастанию расстояния (формат LocationService.find_nearby_workers)"""
+        from back.services.geolocation_service import LocationService
+
+        self.ensure_fresh()
+        with self._lock:
+            if self._tree is None:  # первое построение еще идет в другом потоке
+                return LocationService.find_nearby_workers_db(latitude, longitude, max_distance_km, limit)
+            user_ids, distances, details = self._candidates(latitude, longitude, max_distance_km)
+
+        nearest = DistanceService.nearest(distances, k=limit, max_distance=max_distance_km)
+        return [self._as_dict(user_ids[i], distances[i], details[i]) for i in nearest.tolist()]
+
+    def _device_mask(self, device_type: str) -> np.ndarray:
+        """Специализация пустая (берет всё) или содержит тип устройства - по строкам дерева"""
+        mask = self._device_masks.get(device_type)
+        if mask is None:
+            mask = np.array([not details[1] or device_type in details[1].lower() for details in self._details],
+                            dtype=bool)
+            self._device_masks[device_type] = mask
+        return mask
+
+    def nearby_ids(self, latitude: float, longitude: float, max_distance_km: float = 10,
+                   device_type: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+        """
+        Только id работников в радиусе (ближние раньше), с фильтром по специализации.
+        Без построения словарей - для массового подбора, например рассылки заявок
+        """
+        from back.services.geolocation_service import LocationService
+
+        device_type = (device_type or '').lower()
+        self.ensure_fresh()
+        with self._lock:
+            if self._tree is None:  # первое построение еще идет в другом потоке
+                return [
+                    worker['worker_id']
+                    for worker in LocationService.find_nearby_workers_db(latitude, longitude, max_distance_km)
+                    if not worker['specialization'] or device_type in worker['specialization'].lower()
+                ][:limit]
+            rows = self._tree.query_radius(to_unit_vectors(latitude, longitude), chord_length(max_distance_km))
+            rows = rows[self._alive[rows] & self._device_mask(device_type)[rows]]
+            user_ids = self._user_ids[rows]
+            coordinates = self._coordinates[rows]
+
+            pending = [
+                (user_id, p[:2]) for user_id, p in self._pending.items()
+                if not p[2][1] or device_type in p[2][1].lower()
+            ]
+            if pending:
+                user_ids = np.concatenate([user_ids, [user_id for user_id, _ in pending]])
+                coordinates = np.vstack([coordinates, [point for _, point in pending]])
+
+        distances = DistanceService.haversine_km(latitude, longitude, coordinates[:, 0], coordinates[:, 1])
+        nearest = DistanceService.nearest(distances, k=limit, max_distance=max_distance_km)
+        return user_ids[nearest].tolist()
+
+    def k_nearest(self, latitude: float, longitude: float, k: int) -> List[Dict]:
+        """k ближайших работников без ограничения по радиусу"""
+        # Поиска k ближайших в БД нет - первое построение дожидаемся
+        self.ensure_fresh(wait=True)
+        with self._lock:
+            if self._tree is None:  # сброшен сразу после построения
+                return []
+            # Удалённые строки могут оказаться среди ближайших - берем с запасом
+            dead = int(len(self._alive) - self._alive.sum())
+            rows = self._tree.query_knn(to_unit_vectors(latitude, longitude), k + dead)
+            rows = rows[self._alive[rows]]
+
+            user_ids = self._user_ids[rows].tolist() + list(self._pending)
+            coordinates = np.vstack([self._coordinates[rows], [p[:2] for p in self._pending.values()]]) \
+                if self._pending else self._coordinates[rows]
+            details = [self._details[row] for row in rows.tolist()] + [p[2] for p in self._pending.values()]
+
+        distances = np.round(DistanceService.haversine_km(
+            latitude, longitude, coordinates[:, 0], coordinates[:, 1]
+        ), 2)
+        nearest = DistanceService.nearest(distances, k=k)
+        return [self._as_dict(user_ids[i], distances[i], details[i]) for i in nearest.tolist()]
+
+    @staticmethod
+    def _as_dict(user_id, distance, details) -> Dict:
+        username, specialization, rating, address = details
+        return {
+            'worker_id': user_id,
+            'username': username,
+            'specialization': specialization,
+            'rating': rating,
+            'distance_km': float(distance),
+            'address': address
+        }
+
+    def memory_bytes(self) -> int:
+        """Оценка занимаемой памяти: массивы numpy + строки деталей + словари"""
+        with self._lock:
+            total = self._user_ids.nbytes + self._coordinates.nbytes + self._alive.nbytes
+            if self._tree is not None:
+                total += self._tree.nbytes
+            total += sys.getsizeof(self._details) + sys.getsizeof(self._rows) + sys.getsizeof(self._pending)
+            for details in list(self._details) + [p[2] for p in self._pending.values()]:
+                total += sys.getsizeof(details) + sum(sys.getsizeof(value) for value in details)
+            return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            staleness = self.staleness()
+            return {
+                'size': int(self._alive.sum()) + len(self._pending),
+                'pending': len(self._pending),
+                'dead': int(len(self._alive) - self._alive.sum()),
+                'rebuilds': self.rebuilds,
+                'staleness_seconds': round(staleness, 3) if staleness is not None else None,
+                'max_age_seconds': self.max_age,
+                'memory_bytes': self.memory_bytes(),
+            }
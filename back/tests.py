@@ -1,10 +1,69 @@
 from django.test import TestCase
 
 # Create your tests here.
-from django.test import TestCase
+from django.test import TestCase, override_settings
+import asyncio
+import io
+import json
+import os
+import itertools
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import cos, radians, sin
+from unittest import mock
+
+import numpy as np
+import requests
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import CustomerProfile, RepairRequest
-from .services import AuthService, RepairRequestService
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ninja_jwt.tokens import AccessToken
+from .models import CustomerProfile, WorkerProfile, RepairRequest, RepairRequestFile, Response
+from .models.chat_model import ChatMessage
+from .models.notifications_models import Notification
+from .models.geolocation_models import UserLocation, ServiceArea, GeocodeCacheEntry
+from .models import OutboxEvent, UserActivity, ListItem
+from .models import geohash
+from .services import (
+    AuthService, RepairRequestService, SearchIndexService, CursorPaginationService, ChatService, ResponseService
+)
+from .services.user_service import UserProfileService
+from .services.geolocation_service import DGisService, LocationService
+from .services.distance_service import DistanceService
+from .services import worker_index_service
+from .services.http_client_service import HttpClient, CircuitBreaker, CircuitOpenError
+from .services.batch_geocoder_service import BatchGeocoder
+from .management.fake_dgis import FakeDGisServer
+from .schemas import RepairRequestSchemaIn, ResponseSchemaIn
+from .services.geocoding_queue_service import RepairGeocodingQueue
+from .services.repair_map_service import RepairMapService
+from .services.service_area_service import ServiceAreaIndex, ServiceAreaService
+from .services.dispatch_service import RequestDispatcher
+from .services.repair_feed_service import RepairFeedService
+from .services.route_service import RoutePlanner
+from .services.unread_service import UnreadService
+from .services.outbox_service import OutboxService
+from .services.userlist_service import UserListService
+from .services.event_bus_service import EventBus, EventBroker, EventService
+from .services.notification_service import NotificationService
+from .services.notification_digest_service import NotificationDigest
+
+
+def auth_headers(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
 
 
 class AuthTests(TestCase):
@@ -36,4 +95,1834 @@ class RepairRequestTests(TestCase):
 
         request = RepairRequestService.create_request(data, self.user)
         self.assertEqual(request.title, 'Test Request')
-        self.assertEqual(request.created_by, self.user)
\ No newline at end of file
+        self.assertEqual(request.created_by, self.user)
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('searchcustomer', 'search@test.com', 'testpass')
+        CustomerProfile.objects.create(user=self.user)
+
+    def _create(self, title, description):
+        return RepairRequest.objects.create(
+            title=title, description=description, device_type='fridge',
+            address='Test address', created_by=self.user
+        )
+
+    def _search_ids(self, term):
+        return [r.id for r in RepairRequestService.search_requests(term)]
+
+    def test_prefix_match_and_sync_on_update_delete(self):
+        repair = self._create('Холодильник не морозит', 'Сломался компрессор')
+
+        self.assertEqual(self._search_ids('холод'), [repair.id])
+        self.assertEqual(self._search_ids('компрес холод'), [repair.id])
+
+        repair.title = 'Стиральная машина'
+        repair.save()
+        self.assertEqual(self._search_ids('холод'), [])
+        self.assertEqual(self._search_ids('стирал'), [repair.id])
+
+        repair.delete()
+        self.assertEqual(self._search_ids('стирал'), [])
+
+    def test_title_match_ranks_first(self):
+        in_description = self._create('Не работает', 'Кажется, сломался термостат')
+        in_title = self._create('Термостат духовки', 'Не греет')
+
+        self.assertEqual(self._search_ids('термостат'), [in_title.id, in_description.id])
+
+    def test_search_endpoint_pages_by_relevance(self):
+        cache.clear()
+        for i in range(12):
+            self._create('Термостат ' * (i % 3 + 1), 'Не греет')
+            self._create('Духовка', 'Кажется, сломался термостат')
+        ranked = self._search_ids('термостат')
+
+        def pages(**params):
+            ids, cursor = [], None
+            while True:
+                query = {'search': 'термостат', 'limit': 5, **params, **({'cursor': cursor} if cursor else {})}
+                data = self.client.get('/api/repairs/search', query, secure=True).json()
+                ids += [item['id'] for item in data['items']]
+                if not data['has_next']:
+                    return ids
+                cursor = data['next_cursor']
+
+        self.assertEqual(pages(), ranked)
+        self.assertEqual(pages(order='newest'), sorted(ranked, reverse=True))
+        response = self.client.get('/api/repairs/search', {'search': 'термостат', 'order': 'random'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pagecustomer', 'page@test.com', 'testpass')
+        CustomerProfile.objects.create(user=self.user)
+        self.requests = [
+            RepairRequest.objects.create(
+                title=f'Request {i}', description='Test description', device_type='oven',
+                address='Test address', created_by=self.user
+            )
+            for i in range(5)
+        ]
+
+    def test_walks_all_pages_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get('/api/repairs/', params, secure=True).json()
+            seen.extend(item['id'] for item in page['items'])
+            if not page['has_next']:
+                break
+            cursor = page['next_cursor']
+
+        self.assertEqual(seen, [r.id for r in reversed(self.requests)])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/repairs/', {'cursor': 'not-a-cursor'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+
+class SerializationQueryCountTests(TestCase):
+    """Число запросов у списковых эндпоинтов не зависит от числа строк"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('qccustomer', 'qc@test.com', 'testpass')
+        CustomerProfile.objects.create(user=self.customer)
+        self.worker = User.objects.create_user('qcworker', 'qcw@test.com', 'testpass')
+        WorkerProfile.objects.create(user=self.worker, is_verified=True)
+
+        for i in range(5):
+            repair = RepairRequest.objects.create(
+                title=f'Request {i}', description='Test description', device_type='washer',
+                address='Test address', created_by=self.customer
+            )
+            for uploader in (self.customer, self.worker):
+                RepairRequestFile.objects.create(
+                    repair_request=repair, file=f'repair_requests/{i}.jpg', uploaded_by=uploader
+                )
+        self.repair = repair
+        Response.objects.create(repair_request=repair, worker=self.worker, message='Берусь')
+        for i in range(5):
+            ChatMessage.objects.create(
+                repair_request=repair, sender=self.worker if i % 2 else self.customer, message=f'msg {i}'
+            )
+        SearchIndexService.backend()
+
+    def _get(self, url, queries, user=None, **params):
+        headers = auth_headers(user) if user else {}
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params, secure=True, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repair_list_endpoints(self):
+        page = self._get('/api/repairs/', 2)
+        self.assertEqual(len(page['items']), 5)
+        self.assertEqual(page['items'][0]['files'][1]['uploaded_by']['user_type'], 'worker')
+        self._get('/api/repairs/search', 2, search='request')
+        self._get(f'/api/repairs/{self.repair.id}', 2)
+        self._get('/api/repairs/my/requests', 3, user=self.customer)
+
+    def test_related_list_endpoints(self):
+        messages = self._get(f'/api/chat/request/{self.repair.id}', 3, user=self.customer)
+        self.assertEqual([m['sender']['user_type'] for m in messages][:2], ['customer', 'worker'])
+        self._get(f'/api/responses/request/{self.repair.id}', 4, user=self.customer)
+        self._get('/api/responses/my', 3, user=self.worker)
+        self._get('/api/workers/top', 1)
+
+
+class ChatSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Решения о доступе кэшируются только в общем для процессов backend 'shared' (Redis) - здесь файловом
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        self.enterContext(override_settings(CACHES={**settings.CACHES, 'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}))
+        self.customer = User.objects.create(username='chat_customer')
+        CustomerProfile.objects.create(user=self.customer)
+        self.worker = User.objects.create(username='chat_worker')
+        WorkerProfile.objects.create(user=self.worker)
+        self.repair = RepairRequest.objects.create(
+            title='Chat', description='-', device_type='oven', address='-', created_by=self.customer
+        )
+        Response.objects.create(repair_request=self.repair, worker=self.worker, message='-', status='accepted')
+        self.url = f'/api/chat/request/{self.repair.id}'
+        self.messages = ChatMessage.objects.bulk_create([
+            ChatMessage(repair_request=self.repair, sender=self.customer, message=f'msg {i}') for i in range(300)
+        ])
+        ChatService.check_chat_access(self.repair.id, self.worker)
+
+    def ids(self, queries=2, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.url, params, secure=True, **auth_headers(self.worker))
+        self.assertEqual(response.status_code, 200)
+        return [m['id'] for m in response.json()]
+
+    def test_latest_page_and_history(self):
+        ids = [m.id for m in self.messages]
+        self.assertEqual(self.ids(), ids[-50:])
+        self.assertEqual(self.ids(before_id=ids[-50], limit=20), ids[-70:-50])
+        self.assertEqual(self.ids(limit=10_000), ids[-ChatService.MAX_PAGE_SIZE:])
+
+    def test_poll_returns_only_new_messages(self):
+        last = self.ids()[-1]
+        self.assertEqual(self.ids(since_id=last), [])
+
+        new = [ChatService.send_message(self.repair.id, text, self.customer).id for text in ('a', 'b', 'c')]
+        self.assertEqual(self.ids(since_id=last), new)
+        self.assertEqual(self.ids(since_id=last, limit=2), new[:2])
+        self.assertEqual(self.ids(since_id=self.messages[0].id, before_id=self.messages[3].id),
+                         [self.messages[1].id, self.messages[2].id])
+
+    def test_access_check_is_one_cached_query(self):
+        ChatService._access_cache().clear()
+        # Пользователь, заявка с признаком отклика, сообщения
+        self.ids(queries=3)
+        # Дальше доступ из кэша
+        self.ids(queries=2)
+        with CaptureQueriesContext(connection) as queries:
+            ChatService.mark_messages_as_read(self.repair.id, self.worker)
+        self.assertFalse([q for q in queries if 'back_response' in q['sql'] or 'FROM "back_repairrequest"' in q['sql']])
+
+    def test_process_local_cache_is_not_used(self):
+        # Без REDIS_URL алиаса 'shared' нет - кэш выключен, а не падает
+        with override_settings(CACHES={'default': settings.CACHES['default']}):
+            self.assertEqual(settings.CHAT_ACCESS_CACHE, 'shared')
+            self.assertIsNone(ChatService._access_cache())
+        with override_settings(CHAT_ACCESS_CACHE='default'):
+            self.assertIsNone(ChatService._access_cache())
+            # Пользователь, заявка с признаком отклика, сообщения - при каждом опросе
+            self.ids(queries=3)
+            self.ids(queries=3)
+
+            newcomer = User.objects.create(username='chat_newcomer')
+            WorkerProfile.objects.create(user=newcomer)
+            headers = auth_headers(newcomer)
+            self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 403)
+            # Без выполнения on_commit (как в другом процессе) отказ не залипает
+            ResponseService.create_response(self.repair.id, ResponseSchemaIn(message='Могу', proposed_price=100), newcomer)
+            self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 200)
+
+    def test_access_cache_invalidated_by_responses(self):
+        newcomer = User.objects.create(username='chat_newcomer')
+        WorkerProfile.objects.create(user=newcomer)
+        headers = auth_headers(newcomer)
+        self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 403)
+        self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ResponseService.create_response(
+                self.repair.id, ResponseSchemaIn(message='Могу', proposed_price=100), newcomer
+            )
+        self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RepairRequestService.delete_request(self.repair.id, self.customer)
+        self.assertEqual(self.client.get(self.url, secure=True, **headers).status_code, 404)
+        self.assertEqual(self.client.get(self.url, secure=True, **auth_headers(self.worker)).status_code, 404)
+
+    def test_poll_uses_request_id_index(self):
+        sql = str(ChatMessage.objects.filter(repair_request=self.repair, id__gt=1).order_by('id')[:50].query)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('chat_request_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class RepairCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        RepairRequestService.cache.reset_stats()
+        self.user = User.objects.create_user('cachecustomer', 'cache@test.com', 'testpass')
+        CustomerProfile.objects.create(user=self.user)
+        self.repair = RepairRequest.objects.create(
+            title='Cached', description='Test description', device_type='fridge',
+            address='Test address', created_by=self.user
+        )
+
+    def test_hit_skips_database_and_write_invalidates(self):
+        url = f'/api/repairs/{self.repair.id}'
+        first = self.client.get(url, secure=True)
+        with self.assertNumQueries(0):
+            second = self.client.get(url, secure=True)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(RepairRequestService.cache.stats()['hits'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RepairRequestService.complete_request(self.repair.id, self.user)
+
+        self.assertEqual(self.client.get(url, secure=True).json()['status'], 'completed')
+        self.assertEqual(RepairRequestService.cache.stats()['misses'], 2)
+
+class RepairMapTests(TestCase):
+    URL = '/api/repairs/map'
+    BBOX = {'min_lat': 43.0, 'min_lon': 76.5, 'max_lat': 43.5, 'max_lon': 77.3}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('mapcustomer', 'map@test.com', 'testpass')
+        device_types = ['fridge', 'washer', 'oven']
+        RepairRequest.objects.bulk_create([
+            RepairRequest(
+                title=f'map {i}', description='-', device_type=device_types[i % 3], address='-',
+                latitude=43.1 + (i % 10) * 0.03, longitude=76.8 + (i // 10) * 0.03,
+                status='completed' if i % 7 == 0 else 'new', created_by=self.user,
+            )
+            for i in range(100)
+        ] + [RepairRequest(title='far', description='-', device_type='oven', address='-',
+                           latitude=51.1, longitude=71.4, created_by=self.user)])
+
+    def test_clusters_aggregate_open_requests(self):
+        body = self.client.get(self.URL, {**self.BBOX, 'zoom': 9}, secure=True).json()
+        open_requests = RepairRequest.objects.filter(status='new', latitude__lt=44)
+        self.assertEqual(body['total'], open_requests.count())
+        self.assertLess(len(body['clusters']), body['total'])
+        per_type = {}
+        for cluster in body['clusters']:
+            self.assertEqual(sum(cluster['device_types'].values()), cluster['count'])
+            for device_type, count in cluster['device_types'].items():
+                per_type[device_type] = per_type.get(device_type, 0) + count
+        self.assertEqual(per_type['fridge'], open_requests.filter(device_type='fridge').count())
+
+        # На крупном масштабе каждая заявка - отдельный маркер со ссылкой на нее
+        body = self.client.get(self.URL, {**self.BBOX, 'zoom': 16}, secure=True)
+        self.assertEqual(body.status_code, 400)  # слишком много тайлов
+        small = {'min_lat': 43.09, 'min_lon': 76.82, 'max_lat': 43.11, 'max_lon': 76.84}
+        clusters = self.client.get(self.URL, {**small, 'zoom': 16}, secure=True).json()['clusters']
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['request_id'], RepairRequest.objects.get(title='map 10').id)
+
+    def test_tiles_cached_and_invalidated(self):
+        params = {**self.BBOX, 'zoom': 9}
+        self.client.get(self.URL, params, secure=True)
+        with self.assertNumQueries(0):
+            self.client.get(self.URL, params, secure=True)
+
+        # Сдвиг карты: считаются только тайлы, которых еще не было
+        tiles = RepairMapService.tiles_for_bbox(*self.BBOX.values(), 9)
+        panned = {**params, 'min_lon': 77.0, 'max_lon': 77.8}
+        new_tiles = set(RepairMapService.tiles_for_bbox(43.0, 77.0, 43.5, 77.8, 9)) - set(tiles)
+        with self.assertNumQueries(len(new_tiles)):
+            self.client.get(self.URL, panned, secure=True)
+
+        data = RepairRequestSchemaIn(title='new', description='-', device_type='dishwasher', address='-')
+        with self.captureOnCommitCallbacks(execute=True):
+            repair = RepairRequestService.create_request(data, self.user)
+            RepairRequest.objects.filter(id=repair.id).update(latitude=43.2, longitude=76.9)
+        body = self.client.get(self.URL, params, secure=True).json()
+        self.assertEqual(sum(c['device_types'].get('dishwasher', 0) for c in body['clusters']), 1)
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN для горячих запросов на заполненной базе:
+    ни один из них не должен читать таблицы заявок и откликов целиком
+    """
+    WATCHED_TABLES = ('back_repairrequest', 'back_response')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('plancustomer', 'plan@test.com', 'testpass')
+        CustomerProfile.objects.create(user=cls.customer)
+        cls.worker = User.objects.create_user('planworker', 'planw@test.com', 'testpass')
+        WorkerProfile.objects.create(user=cls.worker)
+
+        device_types = [choice[0] for choice in RepairRequest.DEVICE_TYPES]
+        statuses = [choice[0] for choice in RepairRequest.STATUS_CHOICES]
+        RepairRequest.objects.bulk_create([
+            RepairRequest(
+                title=f'Request {i}', description='Test description', address='Test address',
+                device_type=device_types[i % len(device_types)], status=statuses[i % len(statuses)],
+                latitude=43.2 + i / 1000, longitude=76.9 + i / 1000, created_by=cls.customer
+            )
+            for i in range(300)
+        ])
+        Response.objects.bulk_create([
+            Response(repair_request=repair, worker=cls.worker, message='Берусь', status='accepted')
+            for repair in RepairRequest.objects.all()[:50]
+        ])
+
+    def _full_scans(self, sql, allow_index_scan):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            return [t for t in self.WATCHED_TABLES if re.search(rf'Seq Scan on {t}\b', plan)]
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        # SCAN без USING - чтение таблицы целиком, SCAN ... USING INDEX - обход всего индекса
+        # (допустим только для упорядоченной выборки первой страницы без фильтров)
+        return [
+            line for line in plan
+            if re.match(rf'SCAN ({"|".join(self.WATCHED_TABLES)})\b', line)
+            and not (allow_index_scan and ' USING ' in line)
+        ]
+
+    def assertNoFullScans(self, func, allow_index_scan=False):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertEqual(self._full_scans(sql, allow_index_scan), [], sql)
+
+    def test_listing_queries(self):
+        first_page = RepairRequestService.get_requests_page(limit=20)
+        self.assertNoFullScans(lambda: RepairRequestService.get_requests_page(limit=20), allow_index_scan=True)
+        self.assertNoFullScans(lambda: RepairRequestService.get_requests_page(first_page['next_cursor'], 20))
+        self.assertNoFullScans(lambda: RepairRequestService.get_user_requests_page(self.customer))
+
+    def test_search_queries(self):
+        self.assertNoFullScans(lambda: RepairRequestService.search_requests_page(device_type='oven'))
+        self.assertNoFullScans(lambda: RepairRequestService.search_requests_page(status='new'))
+        self.assertNoFullScans(lambda: RepairRequestService.search_requests_page(device_type='oven', status='new'))
+        self.assertNoFullScans(lambda: RepairRequestService.search_requests_page('request', status='new'))
+
+    def test_stats_queries(self):
+        self.assertNoFullScans(lambda: UserProfileService.get_user_stats(self.customer))
+        self.assertNoFullScans(lambda: UserProfileService.get_user_stats(self.worker))
+
+    def test_bounding_box_query(self):
+        self.assertNoFullScans(lambda: list(RepairRequest.objects.filter(
+            latitude__range=(43.2, 43.3), longitude__range=(76.9, 77.0)
+        )))
+
+
+
+class NearbyWorkersTests(TestCase):
+    def setUp(self):
+        LocationService.worker_index.invalidate()
+        # Точки на одном меридиане: 0.01 градуса широты ~ 1.11 км
+        for i, offset in enumerate([0.05, 0.0, 0.2, 0.01]):
+            worker = User.objects.create_user(f'geoworker{i}', f'geo{i}@test.com', 'testpass')
+            WorkerProfile.objects.create(user=worker, specialization='fridge')
+            UserLocation.objects.create(user=worker, latitude=43.25 + offset, longitude=76.95, address=f'addr {i}')
+        customer = User.objects.create_user('geocustomer', 'geoc@test.com', 'testpass')
+        UserLocation.objects.create(user=customer, latitude=43.25, longitude=76.95)
+
+    def test_sorted_within_radius_and_top_k(self):
+        nearby = LocationService.find_nearby_workers(43.25, 76.95, max_distance_km=10)
+        self.assertEqual([w['username'] for w in nearby], ['geoworker1', 'geoworker3', 'geoworker0'])
+        self.assertEqual([w['distance_km'] for w in nearby], [0.0, 1.11, 5.56])
+
+        top = LocationService.find_nearby_workers(43.25, 76.95, max_distance_km=10, limit=2)
+        self.assertEqual([w['username'] for w in top], ['geoworker1', 'geoworker3'])
+
+    def test_limit_must_be_positive(self):
+        customer = User.objects.get(username='geocustomer')
+        for limit in (0, -3):
+            response = self.client.get('/api/geo/workers/nearby', {'address': 'Алматы', 'limit': limit},
+                                       secure=True, **auth_headers(customer))
+            self.assertEqual(response.status_code, 400)
+            with self.assertRaises(ValueError):
+                DistanceService.nearest(np.array([1.0, 2.0]), k=limit)
+        self.assertEqual(DistanceService.nearest(np.array([3.0, 1.0, 2.0]), k=1).tolist(), [1])
+
+    def test_distance_matrix_keeps_dict_format(self):
+        with mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'}):
+            dgis = DGisService()
+        matrix = dgis.calculate_distance_matrix([(43.25, 76.95)], [(43.25, 76.95), (43.26, 76.95)])
+        self.assertEqual(matrix, {0: {0: 0.0, 1: 1.11}})
+
+
+class WorkerIndexTests(TestCase):
+    def setUp(self):
+        LocationService.worker_index.invalidate()
+        rnd = random.Random(7)
+        self.workers = User.objects.bulk_create([User(username=f'kdworker{i}') for i in range(300)])
+        WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=worker, specialization='washer', rating=i % 5)
+            for i, worker in enumerate(self.workers)
+        ])
+        locations = [
+            UserLocation(user=worker, latitude=43.25 + rnd.gauss(0, 0.1), longitude=76.95 + rnd.gauss(0, 0.1))
+            for worker in self.workers
+        ]
+        for location in locations:
+            location.refresh_geohash()
+        UserLocation.objects.bulk_create(locations)
+
+    def test_matches_database_search(self):
+        LocationService.worker_index.ensure_fresh()
+        for radius, limit in ((1, None), (5, None), (10, 20), (50, None)):
+            expected = LocationService.find_nearby_workers_db(43.25, 76.95, radius, limit)
+            with self.assertNumQueries(0):
+                actual = LocationService.worker_index.find_nearby(43.25, 76.95, radius, limit)
+            # Порядок среди равных расстояний не определен
+            self.assertEqual([w['distance_km'] for w in actual], [w['distance_km'] for w in expected])
+            if limit is None:
+                self.assertEqual({w['worker_id'] for w in actual}, {w['worker_id'] for w in expected})
+
+        everyone = LocationService.find_nearby_workers_db(43.25, 76.95, 1000)
+        nearest = LocationService.worker_index.k_nearest(43.25, 76.95, 7)
+        self.assertEqual([w['distance_km'] for w in nearest], [w['distance_km'] for w in everyone[:7]])
+
+    def test_incremental_updates(self):
+        index = LocationService.worker_index
+        index.ensure_fresh()
+        rebuilds = index.rebuilds
+        moved, removed = self.workers[0], self.workers[1]
+
+        location = moved.location
+        location.latitude, location.longitude = 10.0, 10.0
+        location.save()
+        index.upsert(location)
+        with self.captureOnCommitCallbacks(execute=True):
+            LocationService.delete_user_location(removed)
+
+        with self.assertNumQueries(0):
+            nearby = index.find_nearby(10.0, 10.0, 1)
+            everyone = index.find_nearby(43.25, 76.95, 1000)
+        self.assertEqual([w['worker_id'] for w in nearby], [moved.id])
+        self.assertNotIn(removed.id, [w['worker_id'] for w in everyone])
+        self.assertEqual(len(everyone), len(self.workers) - 2)
+
+        stats = index.stats()
+        self.assertEqual((stats['pending'], stats['dead'], stats['rebuilds']), (1, 2, rebuilds))
+        self.assertGreater(stats['memory_bytes'], 0)
+
+    def test_rebuilds_after_max_age(self):
+        index = LocationService.worker_index
+        index.ensure_fresh()
+        rebuilds = index.rebuilds
+        # Изменение в обход сервиса (как из другого процесса) видно после max_age
+        UserLocation.objects.filter(user=self.workers[0]).update(latitude=10.0, longitude=10.0)
+        self.assertEqual(index.find_nearby(10.0, 10.0, 1), [])
+
+        with mock.patch.object(index, 'max_age', 0.001):
+            time.sleep(0.01)
+            self.assertEqual([w['worker_id'] for w in index.find_nearby(10.0, 10.0, 1)], [self.workers[0].id])
+        self.assertEqual(index.rebuilds, rebuilds + 1)
+
+    def test_serves_old_tree_while_rebuilding(self):
+        index = LocationService.worker_index
+        index.ensure_fresh()
+        rebuilds = index.rebuilds
+        expected = index.find_nearby(43.25, 76.95, 5)
+
+        # Перестройку ведет другой поток: устаревшее дерево отдается без запросов и без ожидания
+        self.assertTrue(index._rebuild_lock.acquire(blocking=False))
+        try:
+            with mock.patch.object(index, 'max_age', 0.001):
+                time.sleep(0.01)
+                with self.assertNumQueries(0):
+                    self.assertEqual(index.find_nearby(43.25, 76.95, 5), expected)
+            # Дерева еще нет - поиск идет в БД (порядок среди равных расстояний не определен)
+            index.invalidate()
+            fallback = index.find_nearby(43.25, 76.95, 5)
+            self.assertEqual([w['distance_km'] for w in fallback], [w['distance_km'] for w in expected])
+            self.assertEqual({w['worker_id'] for w in fallback}, {w['worker_id'] for w in expected})
+            self.assertEqual(set(index.nearby_ids(43.25, 76.95, 5, device_type='washer')),
+                             {w['worker_id'] for w in expected})
+            self.assertEqual(index.nearby_ids(43.25, 76.95, 5, device_type='fridge'), [])
+        finally:
+            index._rebuild_lock.release()
+        self.assertEqual(index.rebuilds, rebuilds)
+
+    def test_changes_during_rebuild_survive_swap(self):
+        index = LocationService.worker_index
+        index.ensure_fresh()
+        moved, removed = self.workers[0], self.workers[1]
+        location = moved.location
+        location.latitude, location.longitude = 10.0, 10.0
+        build_tree = worker_index_service.KDTree
+
+        def build_with_concurrent_changes(*args, **kwargs):
+            # Пока строится дерево (вне блокировки), другие потоки меняют индекс
+            index.upsert(location)
+            index.discard(removed.id)
+            with self.assertNumQueries(0):
+                self.assertEqual(len(index.find_nearby(43.25, 76.95, 1000)), len(self.workers) - 2)
+            return build_tree(*args, **kwargs)
+
+        with mock.patch.object(worker_index_service, 'KDTree', side_effect=build_with_concurrent_changes):
+            with mock.patch.object(index, 'max_age', 0):
+                index.ensure_fresh()
+
+        # Запрос перестройки этих изменений не видел, но они применены к новому дереву
+        self.assertEqual([w['worker_id'] for w in index.find_nearby(10.0, 10.0, 1)], [moved.id])
+        self.assertNotIn(removed.id, [w['worker_id'] for w in index.find_nearby(43.25, 76.95, 1000)])
+
+
+def fake_2gis_response(items):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {'result': {'items': items}} if items else {'meta': {'code': 404}}
+    return response
+
+
+class GeocodeCacheTests(TestCase):
+    ITEM = {'point': {'lat': 43.25, 'lon': 76.95}, 'full_name': 'Алматы, Абая, 1'}
+
+    def setUp(self):
+        DGisService.geocode_cache.clear_memory()
+        DGisService.geocode_cache.reset_stats()
+        DGisService.http.breaker.record_success()
+        self.addCleanup(DGisService.http.breaker.record_success)
+        with mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'}):
+            self.dgis = DGisService()
+
+    @mock.patch.object(DGisService.http.session, 'request')
+    def test_two_tiers(self, get):
+        get.return_value = fake_2gis_response([self.ITEM])
+
+        first = self.dgis.geocode_address('Алматы,  Абая 1')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.dgis.geocode_address('алматы, абая, 1'), first)
+        self.assertEqual(get.call_count, 1)
+
+        # Другой процесс: памяти нет, но есть запись в БД
+        DGisService.geocode_cache.clear_memory()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.dgis.geocode_address('Алматы, Абая 1'), first)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+
+        stats = DGisService.geocode_cache.stats()
+        self.assertEqual((stats['memory_hits'], stats['db_hits'], stats['misses']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.6667)
+
+    @mock.patch.object(DGisService.http, 'backoff', 0.001)
+    @mock.patch.object(DGisService.http.session, 'request')
+    def test_negative_caching_and_errors(self, get):
+        get.return_value = fake_2gis_response([])
+        self.assertIsNone(self.dgis.geocode_address('нет такого адреса'))
+        self.assertIsNone(self.dgis.geocode_address('Нет такого адреса'))
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(DGisService.geocode_cache.stats()['negative_hits'], 1)
+
+        # Сбой API не кэшируется (и повторяется HttpClient: 1 + 2 попытки)
+        get.side_effect = requests.exceptions.ConnectionError('down')
+        self.assertIsNone(self.dgis.reverse_geocode(43.25, 76.95))
+        get.side_effect = None
+        get.return_value = fake_2gis_response([self.ITEM])
+        self.assertEqual(self.dgis.reverse_geocode(43.25001, 76.94999), 'Алматы, Абая, 1')
+        self.assertEqual(self.dgis.reverse_geocode(43.25, 76.95), 'Алматы, Абая, 1')
+        self.assertEqual(get.call_count, 5)
+
+    @mock.patch.object(DGisService.http.session, 'request')
+    def test_expired_entries_are_refetched(self, get):
+        get.return_value = fake_2gis_response([self.ITEM])
+        self.dgis.geocode_address('Абая 1')
+        DGisService.geocode_cache.clear_memory()
+        GeocodeCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.dgis.geocode_address('Абая 1')
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+        self.assertEqual(DGisService.geocode_cache.purge_expired(), 0)
+
+    def test_outbox_worker_purges_expired_entries(self):
+        GeocodeCacheEntry.objects.bulk_create([
+            GeocodeCacheEntry(kind='geocode', key=f'k{i}', query=f'q{i}', result=None,
+                              expires_at=timezone.now() + timedelta(seconds=-1 if i < 5 else 3600))
+            for i in range(8)
+        ])
+        self.assertEqual(DGisService.geocode_cache.purge_expired(chunk_size=2), 5)
+
+        GeocodeCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = io.StringIO()
+        call_command('run_outbox_worker', '--once', '--without-broker', stdout=out)
+        self.assertIn('3 expired geocode cache entries', out.getvalue())
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Отвечает кодами из server.script по очереди (пустой script - 200), запоминает порты клиентов"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.hits += 1
+        self.server.client_ports.add(self.client_address[1])
+        status = self.server.script.pop(0) if self.server.script else 200
+        body = json.dumps({'result': {'items': [
+            {'point': {'lat': 43.25, 'lon': 76.95}, 'full_name': 'Алматы, Абая, 1'}
+        ]}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.hits, self.server.client_ports, self.server.script = 0, set(), []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/3.0'
+        self.client = HttpClient(timeout=2, retries=2, backoff=0.001,
+                                 breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+
+    def test_keep_alive_and_retries(self):
+        self.server.script = [503, 502]
+        self.assertEqual(self.client.get('geocode', self.url).status_code, 200)
+        for _ in range(3):
+            self.client.get('geocode', self.url)
+
+        self.assertEqual(self.server.hits, 6)
+        self.assertEqual(len(self.server.client_ports), 1)  # одно соединение на все запросы
+        stats = self.client.stats()
+        self.assertEqual({k: stats['geocode'][k] for k in ('calls', 'errors', 'retries')},
+                         {'calls': 6, 'errors': 2, 'retries': 2})
+        self.assertIn('p95_ms', stats['geocode'])
+
+    def test_circuit_breaker(self):
+        self.server.script = [503] * 6
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.client.get('geocode', self.url)
+        self.assertEqual(self.server.hits, 6)
+
+        # Цепь разомкнута: запрос не уходит на сервер
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('geocode', self.url)
+        self.assertEqual(self.server.hits, 6)
+        self.assertEqual(self.client.stats()['breaker'], 'open')
+
+        time.sleep(0.06)
+        self.assertEqual(self.client.get('geocode', self.url).status_code, 200)
+        self.assertEqual(self.client.stats()['breaker'], 'closed')
+
+    def test_dgis_service_fails_fast_when_open(self):
+        with mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'}):
+            dgis = DGisService()
+        DGisService.geocode_cache.clear_memory()
+        with mock.patch.object(DGisService, 'http', self.client), \
+                mock.patch.object(DGisService, 'GEOCODE_URL', self.url):
+            self.assertEqual(dgis.geocode_address('Абая 1')['full_address'], 'Алматы, Абая, 1')
+
+            self.server.script = [500] * 6
+            self.assertIsNone(dgis.reverse_geocode(43.1, 76.1))
+            self.assertIsNone(dgis.reverse_geocode(43.2, 76.2))
+            started = time.perf_counter()
+            self.assertIsNone(dgis.reverse_geocode(43.3, 76.3))
+            self.assertLess(time.perf_counter() - started, 0.05)
+        self.assertEqual(self.server.hits, 7)
+
+
+class BatchGeocoderTests(TestCase):
+    def setUp(self):
+        DGisService.geocode_cache.clear_memory()
+        server = FakeDGisServer(latency=0.02)
+        self.server = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        with mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'}):
+            self.dgis = DGisService()
+        self.dgis.GEOCODE_URL = self.server.url
+
+    def test_concurrent_batch_with_cache(self):
+        addresses = [f'Абая {i}' for i in range(12)] + ['абая, 3', 'nowhere 1']
+        geocoder = BatchGeocoder(self.dgis, concurrency=4, rate=1000, burst=4)
+
+        results = geocoder.geocode_many(addresses)
+        self.assertEqual(results[3]['full_address'], 'Алматы, Абая 3')
+        self.assertEqual(results[12], results[3])
+        self.assertIsNone(results[13])
+        self.assertEqual(self.server.hits, 13)  # дубликат запрошен один раз
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+        self.assertEqual(geocoder.geocode_many(addresses), results)
+        self.assertEqual(self.server.hits, 13)
+        self.assertEqual((geocoder.last_run['cached'], geocoder.last_run['fetched']), (13, 0))
+
+    def test_rate_limit(self):
+        geocoder = BatchGeocoder(self.dgis, concurrency=8, rate=50, burst=1, use_cache=False)
+        geocoder.geocode_many([f'Сатпаева {i}' for i in range(6)])
+
+        times = self.server.request_times
+        # 6 запросов при 50/с и без всплеска - не быстрее чем за 5 интервалов по 20 мс
+        self.assertGreaterEqual(times[-1] - times[0], 0.09)
+
+    def test_rate_limit_is_shared_by_concurrent_geocoders(self):
+        # Очередь геокодирования и geocode_repairs создают свои геокодеры в разных потоках
+        geocoders = [BatchGeocoder(self.dgis, concurrency=8, rate=40, burst=1, use_cache=False) for _ in range(2)]
+        self.assertIs(geocoders[0].bucket, geocoders[1].bucket)
+        threads = [
+            threading.Thread(target=geocoder.geocode_many, args=([f'Жандосова {n}-{i}' for i in range(3)],))
+            for n, geocoder in enumerate(geocoders)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        times = self.server.request_times
+        self.assertEqual(len(times), 6)
+        # Одна квота на двоих: 6 запросов при 40/с - не быстрее чем за 5 интервалов по 25 мс
+        self.assertGreaterEqual(times[-1] - times[0], 0.11)
+
+
+@mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'})
+class RepairGeocodingTests(TestCase):
+    def setUp(self):
+        DGisService.geocode_cache.clear_memory()
+        server = FakeDGisServer(latency=0.0)
+        self.server = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        patcher = mock.patch.object(DGisService, 'GEOCODE_URL', self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.queue = RepairGeocodingQueue(mode='manual')
+        patcher = mock.patch.object(RepairRequestService, 'geocoding_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('geocustomer', 'gc@test.com', 'testpass')
+
+    def create(self, address):
+        data = RepairRequestSchemaIn(title='Не греет', description='...', device_type='oven', address=address)
+        with self.captureOnCommitCallbacks(execute=True):
+            return RepairRequestService.create_request(data, self.user)
+
+    def test_geocoded_in_background_with_dedup(self):
+        first, second = self.create('Абая 10'), self.create('Абая 10')
+        self.assertEqual(self.server.hits, 0)  # создание заявки не ходит в 2GIS
+        self.assertEqual(self.queue.pending(), 2)
+
+        self.assertEqual(self.queue.process_pending(), 2)
+        self.assertEqual(self.server.hits, 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNotNone(first.latitude)
+        self.assertEqual((first.latitude, first.longitude), (second.latitude, second.longitude))
+        self.assertEqual(first.geohash, geohash.encode(first.latitude, first.longitude))
+
+    def test_dispatch_geocodes_missing_coordinates(self):
+        repair = self.create('Абая 10')
+        # Фоновое геокодирование не успело (или процесс перезапустился) - координаты дополнит воркер outbox
+        self.assertEqual(OutboxService.process_pending(), 1)
+        self.assertEqual(self.server.hits, 1)
+        repair.refresh_from_db()
+        self.assertIsNotNone(repair.latitude)
+
+    def test_address_change_resets_coordinates(self):
+        repair = self.create('Абая 10')
+        self.queue.process_pending()
+
+        data = RepairRequestSchemaIn(title='Не греет', description='...', device_type='oven', address='Сатпаева 5')
+        with self.captureOnCommitCallbacks(execute=True):
+            repair = RepairRequestService.update_request(repair.id, data, self.user)
+        repair.refresh_from_db()
+        self.assertIsNone(repair.latitude)
+
+        # Результат для старого адреса не перезаписывает новый
+        RepairGeocodingQueue.apply({'Абая 10': [repair.id]}, [{'latitude': 1.0, 'longitude': 2.0}])
+        repair.refresh_from_db()
+        self.assertIsNone(repair.latitude)
+
+        self.queue.process_pending()
+        repair.refresh_from_db()
+        self.assertIsNotNone(repair.latitude)
+
+    def test_backfill_command_resumes(self):
+        RepairRequest.objects.bulk_create([
+            RepairRequest(title=f'r{i}', description='-', device_type='tv', address=f'Абая {i % 3}',
+                          created_by=self.user)
+            for i in range(5)
+        ] + [RepairRequest(title='nowhere', description='-', device_type='tv', address='nowhere', created_by=self.user)])
+        state_file = os.path.join(tempfile.mkdtemp(), 'progress.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(state_file))
+
+        call_command('geocode_repairs', state_file=state_file, chunk_size=2, limit=4, stdout=io.StringIO())
+        self.assertEqual(RepairRequest.objects.filter(latitude__isnull=False).count(), 4)
+
+        call_command('geocode_repairs', state_file=state_file, chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(RepairRequest.objects.filter(latitude__isnull=False).count(), 5)
+        with open(state_file) as f:
+            self.assertEqual(json.load(f)['last_id'], RepairRequest.objects.latest('id').id)
+        self.assertEqual(self.server.hits, 4)  # 3 разных адреса + "nowhere"
+
+    def test_backfill_fetches_next_chunk_while_writing(self):
+        RepairRequest.objects.bulk_create([
+            RepairRequest(title=f'r{i}', description='-', device_type='tv', address=f'Толе би {i}', created_by=self.user)
+            for i in range(5)
+        ])
+        state_file = os.path.join(tempfile.mkdtemp(), 'progress.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(state_file))
+
+        fetch, apply = BatchGeocoder.fetch, RepairGeocodingQueue.apply
+        fetched, overlapped = [], []
+        next_chunk_fetching = threading.Event()
+
+        def tracking_fetch(geocoder, batch):
+            fetched.append(sorted(batch.to_fetch.values()))
+            if len(fetched) == 2:
+                next_chunk_fetching.set()
+            return fetch(geocoder, batch)
+
+        def tracking_apply(jobs, results):
+            # Координаты первой пачки пишутся, когда запросы второй уже отправлены
+            if not overlapped:
+                overlapped.append(next_chunk_fetching.wait(2))
+            return apply(jobs, results)
+
+        with mock.patch.object(BatchGeocoder, 'fetch', tracking_fetch), \
+                mock.patch.object(RepairGeocodingQueue, 'apply', side_effect=tracking_apply):
+            call_command('geocode_repairs', state_file=state_file, chunk_size=2, stdout=io.StringIO())
+
+        self.assertEqual(overlapped, [True])
+        self.assertEqual(len(fetched), 3)
+        self.assertEqual(RepairRequest.objects.filter(latitude__isnull=False).count(), 5)
+        with open(state_file) as f:
+            self.assertEqual(json.load(f)['last_id'], RepairRequest.objects.latest('id').id)
+
+
+@mock.patch.dict(os.environ, {'DGIS_API_KEY': 'test-key'})
+class PartsShopsTests(TestCase):
+    SHOPS = [
+        {'name': 'Далеко', 'address_name': 'a', 'point': {'lat': 43.30, 'lon': 76.95}},
+        {'name': 'Рядом', 'address_name': 'b', 'point': {'lat': 43.241, 'lon': 76.951}},
+        {'name': 'Средне', 'address_name': 'c', 'point': {'lat': 43.25, 'lon': 76.96}},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        LocationService.parts_cache.reset_stats()
+        DGisService.http.breaker.record_success()
+        lat_min, lat_max, lon_min, lon_max = geohash.decode_bounds(geohash.encode(43.24, 76.95, 6))
+        # Две точки в одном тайле
+        self.points = [(lat_min + (lat_max - lat_min) * f, lon_min + (lon_max - lon_min) * f) for f in (0.2, 0.8)]
+
+    @mock.patch.object(DGisService.http.session, 'request')
+    def test_tile_cache_and_local_ranking(self, request):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'result': {'items': self.SHOPS}}
+        request.return_value = response
+
+        results = [LocationService.search_nearby_parts_shops(lat, lon, 'Компрессор', radius=5000)
+                   for lat, lon in self.points]
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(request.call_args.kwargs['params']['q'], 'компрессор бытовая техника')
+
+        for (lat, lon), shops in zip(self.points, results):
+            self.assertEqual([shop['name'] for shop in shops], ['Рядом', 'Средне'])  # "Далеко" вне 5 км
+            expected = DistanceService.haversine_km(lat, lon, 43.241, 76.951)
+            self.assertAlmostEqual(shops[0]['distance'], float(expected), places=2)
+        self.assertNotEqual(results[0][0]['distance'], results[1][0]['distance'])
+
+        self.assertEqual(LocationService.parts_cache.stats()['hit_rate'], 0.5)
+        LocationService.search_nearby_parts_shops(*self.points[0], 'компрессор', radius=1000)
+        self.assertEqual(request.call_count, 2)  # другой радиус - другой ключ
+
+    @mock.patch.object(DGisService.http, 'backoff', 0.001)
+    @mock.patch.object(DGisService.http.session, 'request')
+    def test_errors_are_not_cached(self, request):
+        request.side_effect = requests.exceptions.ConnectionError('down')
+        self.assertEqual(LocationService.search_nearby_parts_shops(*self.points[0]), [])
+
+        request.side_effect = None
+        request.return_value = mock.Mock(status_code=200, **{'json.return_value': {'result': {'items': self.SHOPS}}})
+        self.assertEqual(len(LocationService.search_nearby_parts_shops(*self.points[0])), 2)
+        DGisService.http.breaker.record_success()
+
+
+class ServiceAreaMatchingTests(TestCase):
+    CENTER = (43.2389, 76.8897)
+
+    def setUp(self):
+        ServiceAreaService.index.invalidate()
+
+    def make_worker(self, name, specialization='', location=None):
+        worker = User.objects.create(username=name)
+        WorkerProfile.objects.create(user=worker, specialization=specialization)
+        if location:
+            UserLocation.objects.create(user=worker, latitude=location[0], longitude=location[1])
+        return worker
+
+    def test_spatial_and_city_matching(self):
+        near = self.make_worker('near', 'fridge', self.CENTER)
+        far = self.make_worker('far', '', (self.CENTER[0] + 0.18, self.CENTER[1]))  # ~20 км
+        city_washer = self.make_worker('city_washer', 'washer, dishwasher')
+        other_city = self.make_worker('other_city')
+        district = self.make_worker('district')
+        for worker, city, radius, area_district in [
+            (near, 'Алматы', 5, ''), (far, 'Алматы', 25, ''), (city_washer, 'Алматы', 10, ''),
+            (other_city, 'Астана', 10, ''), (district, 'г. Алматы', 10, 'Бостандыкский р-н'),
+        ]:
+            ServiceAreaService.add_service_area(worker, city, radius, area_district)
+        # Зона, не покрывающая точку
+        ServiceAreaService.add_service_area(far, 'Алматы', 1)
+
+        index = ServiceAreaService.index
+        self.assertEqual(index.match(*self.CENTER, 'fridge', 'г. Алматы, Абая 10'), [near.id, far.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(index.match(*self.CENTER, 'washer', 'Алматы, Абая 10'), [far.id, city_washer.id])
+        self.assertEqual(
+            index.match(None, None, 'oven', 'Алматы, Бостандыкский р-н, Абая 10'), [district.id]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceAreaService.add_service_area(other_city, 'Алматы', 10)
+        self.assertIn(other_city.id, index.match(*self.CENTER, 'oven', 'Алматы'))
+        self.assertEqual(index.stats()['areas'], 7)
+
+    def test_radius_is_bounded(self):
+        worker = self.make_worker('huge', '', self.CENTER)
+        url = f'/api/geo/workers/{worker.id}/service-area'
+        for radius in (0, -5, settings.SERVICE_AREA_MAX_RADIUS_KM + 1, 10 ** 6):
+            response = self.client.post(f'{url}?city=Алматы&radius_km={radius}', secure=True, **auth_headers(worker))
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(ServiceArea.objects.exists())
+        response = self.client.post(f'{url}?city=Алматы&radius_km=10', secure=True, **auth_headers(worker))
+        self.assertEqual(response.status_code, 200)
+
+        # Строка в обход API: индекс ограничивает радиус тем же пределом
+        ServiceArea.objects.filter(worker=worker).update(radius_km=10 ** 6)
+        index = ServiceAreaIndex(max_age=None, max_radius_km=settings.SERVICE_AREA_MAX_RADIUS_KM)
+        self.assertEqual(index.match(self.CENTER[0] + 0.5, self.CENTER[1]), [worker.id])  # ~56 км
+        self.assertEqual(index.match(self.CENTER[0] + 2, self.CENTER[1]), [])  # ~220 км
+        self.assertLess(index.stats()['cells'], 5000)  # круг 100 км - порядка 2400 ячеек, а не миллиарды
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(3)
+        workers = User.objects.bulk_create([User(username=f'area{i}') for i in range(300)])
+        WorkerProfile.objects.bulk_create([WorkerProfile(user=worker) for worker in workers])
+        points = [(self.CENTER[0] + rnd.gauss(0, 0.2), self.CENTER[1] + rnd.gauss(0, 0.3)) for _ in workers]
+        UserLocation.objects.bulk_create([
+            UserLocation(user=worker, latitude=lat, longitude=lon) for worker, (lat, lon) in zip(workers, points)
+        ])
+        radii = [rnd.choice([2, 5, 10, 30]) for _ in workers]
+        ServiceArea.objects.bulk_create([
+            ServiceArea(worker=worker, city='Алматы', radius_km=radius) for worker, radius in zip(workers, radii)
+        ])
+
+        for _ in range(20):
+            lat, lon = self.CENTER[0] + rnd.gauss(0, 0.2), self.CENTER[1] + rnd.gauss(0, 0.3)
+            expected = {
+                worker.id for worker, point, radius in zip(workers, points, radii)
+                if DistanceService.haversine_km(lat, lon, *point) <= radius
+            }
+            self.assertEqual(set(ServiceAreaService.index.match(lat, lon, 'fridge')), expected)
+
+
+class RequestDispatchTests(TestCase):
+    CENTER = (43.2389, 76.8897)
+
+    def setUp(self):
+        self.dispatcher = RequestDispatcher(radius_km=10)
+        patcher = mock.patch.object(RepairRequestService, 'dispatcher', self.dispatcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        LocationService.worker_index.invalidate()
+        ServiceAreaService.index.invalidate()
+        self.customer = User.objects.create(username='dispatch_customer')
+
+    def make_worker(self, name, specialization='', location=None):
+        worker = User.objects.create(username=name)
+        WorkerProfile.objects.create(user=worker, specialization=specialization)
+        if location:
+            UserLocation.objects.create(user=worker, latitude=location[0], longitude=location[1])
+        return worker
+
+    def create(self, title='Не морозит', device_type='fridge', address='Алматы, Абая 10', location=CENTER):
+        data = RepairRequestSchemaIn(title=title, description='-', device_type=device_type, address=address)
+        with self.captureOnCommitCallbacks(execute=True):
+            repair = RepairRequestService.create_request(data, self.customer)
+        # Координаты обычно приходят из геокодирования
+        RepairRequest.objects.filter(id=repair.id).update(latitude=location[0], longitude=location[1])
+        return repair
+
+    def test_notifies_matching_workers_from_outbox(self):
+        near = self.make_worker('near', 'fridge, oven', (self.CENTER[0] + 0.01, self.CENTER[1]))
+        self.make_worker('near_washer', 'washer', self.CENTER)
+        self.make_worker('far', '', (self.CENTER[0] + 0.3, self.CENTER[1]))  # ~33 км
+        city = self.make_worker('city')
+        ServiceAreaService.add_service_area(city, 'Алматы', 10)
+        # Автор заявки сам может быть работником рядом
+        WorkerProfile.objects.create(user=self.customer)
+        UserLocation.objects.create(user=self.customer, latitude=self.CENTER[0], longitude=self.CENTER[1])
+
+        repair = self.create()
+        self.assertEqual(Notification.objects.count(), 0)  # рассылка не в запросе создания
+        # Рассылку ждет событие в базе, а не очередь в памяти процесса
+        self.assertEqual(OutboxEvent.objects.get().payload, {'repair_request_id': repair.id})
+
+        self.assertEqual(OutboxService.process_pending(), 1)
+        notifications = Notification.objects.filter(notification_type='new_request')
+        self.assertEqual(sorted(n.user_id for n in notifications), sorted([near.id, city.id]))
+        self.assertIn(repair.title, notifications[0].message)
+
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['requests'], stats['notifications']), (1, 2))
+        self.assertIn('latency_p95_ms', stats)
+
+    def test_area_added_in_web_process_reaches_worker_index(self):
+        late = self.make_worker('late_area', 'fridge')
+        repair = self.create()
+        # Индекс процесса воркера outbox построен до того, как работник добавил зону
+        worker_index = ServiceAreaIndex(max_age=300, check_interval=0)
+        worker_index.ensure_fresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceAreaService.add_service_area(late, 'Алматы', 10)  # invalidate() - только в этом процессе
+
+        with mock.patch.object(ServiceAreaService, 'index', worker_index):
+            OutboxService.process_pending()
+        self.assertTrue(Notification.objects.filter(user=late, notification_type='new_request').exists())
+        self.assertEqual(worker_index.rebuilds, 2)
+
+        # Версия не изменилась - индекс не перестраивается
+        worker_index.match_request(repair)
+        self.assertEqual(worker_index.rebuilds, 2)
+
+    def test_batches_share_one_insert(self):
+        workers = User.objects.bulk_create([User(username=f'dispatch{i}') for i in range(30)])
+        WorkerProfile.objects.bulk_create([WorkerProfile(user=worker) for worker in workers])
+        UserLocation.objects.bulk_create([
+            UserLocation(user=worker, latitude=self.CENTER[0] + i * 0.001, longitude=self.CENTER[1])
+            for i, worker in enumerate(workers)
+        ])
+        repairs = [self.create(title=f'r{i}') for i in range(5)]
+        RepairRequest.objects.filter(id=repairs[-1].id).update(status='completed')
+        LocationService.worker_index.ensure_fresh()
+        ServiceAreaService.index.ensure_fresh()
+
+        # Один INSERT уведомлений на вызов + счетчики непрочитанного
+        # (вставка недостающих и один UPDATE на одинаковое приращение) + SAVEPOINT/RELEASE
+        loaded = list(RepairRequest.objects.filter(id__in=[repairs[0].id, repairs[1].id]))
+        with self.assertNumQueries(5):
+            self.dispatcher.dispatch(loaded)
+        self.assertEqual(Notification.objects.count(), 2 * 30)
+
+        Notification.objects.all().delete()
+        self.assertEqual(OutboxService.process_pending(), 5)
+        self.assertEqual(Notification.objects.count(), 4 * 30)  # закрытая заявка не рассылается
+
+        self.dispatcher.max_workers = 5
+        repairs[0].refresh_from_db()
+        self.assertEqual(len(self.dispatcher.match_workers(repairs[0])), 5)
+
+
+class RepairFeedTests(TestCase):
+    CENTER = (43.2389, 76.8897)
+    URL = '/api/repairs/feed'
+
+    def setUp(self):
+        RepairFeedService.index.invalidate()
+        patcher = mock.patch.object(RepairFeedService.index, 'refresh_interval', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = User.objects.create(username='feed_customer')
+        CustomerProfile.objects.create(user=self.customer)
+        self.worker = User.objects.create(username='feed_worker')
+        WorkerProfile.objects.create(user=self.worker, specialization='Fridge')
+        UserLocation.objects.create(user=self.worker, latitude=self.CENTER[0], longitude=self.CENTER[1])
+        # В истории откликов - стиральные машины
+        washer = self.make('old washer', 'washer', 0.0, status='completed')
+        Response.objects.create(repair_request=washer, worker=self.worker, message='-', proposed_price=1)
+
+    def make(self, title, device_type, offset, status='new'):
+        return RepairRequest.objects.create(
+            title=title, description='-', device_type=device_type, address='-', status=status,
+            latitude=self.CENTER[0] + offset, longitude=self.CENTER[1], created_by=self.customer,
+        )
+
+    def feed(self, cursor=None, limit=2):
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        response = self.client.get(self.URL, params, secure=True, **auth_headers(self.worker))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranking_and_pagination(self):
+        near_fridge = self.make('near fridge', 'fridge', 0.01)
+        far_fridge = self.make('far fridge', 'fridge', 0.5)  # ~55 км
+        near_oven = self.make('near oven', 'oven', 0.01)
+        near_washer = self.make('near washer', 'washer', 0.01)
+        responded = self.make('responded', 'other', 0.0)
+        Response.objects.create(repair_request=responded, worker=self.worker, message='-', proposed_price=1)
+
+        first = self.feed()
+        self.assertEqual([item['id'] for item in first['items']], [near_fridge.id, near_washer.id])
+        self.assertTrue(first['has_next'])
+        second = self.feed(first['next_cursor'])
+        self.assertEqual([item['id'] for item in second['items']], [near_oven.id, far_fridge.id])
+        self.assertFalse(second['has_next'])
+
+        response = self.client.get(self.URL, secure=True, **auth_headers(self.customer))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(self.URL, {'cursor': 'bad'}, secure=True, **auth_headers(self.worker))
+        self.assertEqual(response.status_code, 400)
+
+    def test_incremental_refresh_scores_only_new_rows(self):
+        old = self.make('old fridge', 'fridge', 0.05)
+        self.feed()
+        scored = len(RepairFeedService.scores(self.worker)[1])
+        generation = RepairFeedService.index.generation
+
+        newer = self.make('new fridge', 'fridge', 0.0)
+        with mock.patch.object(RepairFeedService, 'score_rows', wraps=RepairFeedService.score_rows) as score_rows:
+            items = self.feed()['items']
+        self.assertEqual([item['id'] for item in items], [newer.id, old.id])
+        self.assertEqual(score_rows.call_args.kwargs['start'], scored)
+        self.assertEqual(RepairFeedService.index.generation, generation)
+
+        # Закрытая заявка уходит из ленты без полной перестройки
+        with self.captureOnCommitCallbacks(execute=True):
+            RepairRequestService.complete_request(newer.id, self.customer)
+        self.assertEqual([item['id'] for item in self.feed()['items']], [old.id])
+        self.assertEqual(RepairFeedService.index.generation, generation)
+
+
+class RouteTests(TestCase):
+    CENTER = (43.2389, 76.8897)
+
+    def test_matches_brute_force_on_small_sets(self):
+        rnd = random.Random(5)
+        for _ in range(5):
+            points = [(self.CENTER[0] + rnd.uniform(-0.1, 0.1), self.CENTER[1] + rnd.uniform(-0.1, 0.1))
+                      for _ in range(7)]
+            start = (self.CENTER[0] + rnd.uniform(-0.1, 0.1), self.CENTER[1] + rnd.uniform(-0.1, 0.1))
+            plan = RoutePlanner.plan(points, start, time_budget_ms=1000)
+
+            def length(order):
+                route = [start] + [points[i] for i in order]
+                return sum(DistanceService.haversine_km(*route[k], *route[k + 1]) for k in range(len(order)))
+
+            best = min(length(order) for order in itertools.permutations(range(len(points))))
+            self.assertTrue(plan['completed'])
+            self.assertEqual(sorted(plan['order']), list(range(len(points))))
+            self.assertAlmostEqual(plan['distance_km'], round(length(plan['order']), 2), places=2)
+            # 2-opt - эвристика, но на 7 точках почти всегда находит оптимум
+            self.assertLessEqual(plan['distance_km'], best * 1.05)
+            self.assertLessEqual(plan['distance_km'], plan['initial_distance_km'])
+
+    def test_time_budget_is_respected(self):
+        rnd = random.Random(1)
+        points = [(rnd.uniform(43.0, 43.5), rnd.uniform(76.6, 77.2)) for _ in range(1000)]
+        plan = RoutePlanner.plan(points, time_budget_ms=50)
+        self.assertFalse(plan['completed'])
+        self.assertLess(plan['elapsed_ms'], 1000)  # NN + матрица + не больше одного шага 2-opt сверх бюджета
+        self.assertEqual(len(set(plan['order'])), 1000)
+
+    def test_worker_route_endpoint(self):
+        worker = User.objects.create(username='route_worker')
+        WorkerProfile.objects.create(user=worker)
+        customer = User.objects.create(username='route_customer')
+        UserLocation.objects.create(user=worker, latitude=self.CENTER[0], longitude=self.CENTER[1])
+
+        def job(offset, status='active', response_status='accepted', located=True):
+            repair = RepairRequest.objects.create(
+                title=f'job {offset}', description='-', device_type='oven', address='-', status=status,
+                latitude=self.CENTER[0] + offset if located else None,
+                longitude=self.CENTER[1] if located else None, created_by=customer,
+            )
+            Response.objects.create(repair_request=repair, worker=worker, message='-', proposed_price=1,
+                                    status=response_status)
+            return repair
+
+        # На одном меридиане: оптимальный порядок - по удалению от старта
+        far, near, middle = job(0.03), job(0.01), job(0.02)
+        job(0.015, status='completed')
+        job(0.005, response_status='sent')
+        unlocated = job(0, located=False)
+
+        body = self.client.get('/api/geo/route/me', secure=True, **auth_headers(worker)).json()
+        self.assertEqual([stop['request_id'] for stop in body['stops']], [near.id, middle.id, far.id])
+        self.assertEqual([stop['distance_from_previous_km'] for stop in body['stops']], [1.11, 1.11, 1.11])
+        self.assertEqual(body['total_distance_km'], 3.34)
+        self.assertEqual(body['unlocated_request_ids'], [unlocated.id])
+
+        # Старт из запроса: от дальнего конца
+        params = {'lat': self.CENTER[0] + 0.04, 'lon': self.CENTER[1]}
+        body = self.client.get('/api/geo/route/me', params, secure=True, **auth_headers(worker)).json()
+        self.assertEqual([stop['request_id'] for stop in body['stops']], [far.id, middle.id, near.id])
+
+        response = self.client.get('/api/geo/route/me', {'lat': 1}, secure=True, **auth_headers(worker))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/geo/route/me', secure=True, **auth_headers(customer))
+        self.assertEqual(response.status_code, 403)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create(username='events_customer')
+        self.worker = User.objects.create(username='events_worker')
+        self.repair = RepairRequest.objects.create(
+            title='Чат', description='-', device_type='fridge', address='-', created_by=self.customer
+        )
+        Response.objects.create(
+            repair_request=self.repair, worker=self.worker, message='-', proposed_price=100, status='accepted'
+        )
+
+    async def open_stream(self, user):
+        # AsyncClient передает заголовки в ASGI scope как есть, HTTP_* не подходит
+        response = await self.async_client.get('/api/events/stream', secure=True, headers={
+            'Authorization': f'Bearer {AccessToken.for_user(user)}'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def next_event(self, stream):
+        chunk = (await asyncio.wait_for(anext(stream), 2)).decode()
+        lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return lines['event'], json.loads(lines['data'])
+
+    async def disconnect(self, stream):
+        # Как ASGI-обработчик при разрыве соединения: отмена ожидающего чтения
+        reading = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reading.cancel()
+        await asyncio.gather(reading, return_exceptions=True)
+
+    def on_commit(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args)
+
+    async def test_notification_and_chat_message_pushed(self):
+        customer_stream = await self.open_stream(self.customer)
+        worker_stream = await self.open_stream(self.worker)
+
+        await sync_to_async(self.on_commit)(
+            NotificationService.create_notification, self.customer, 'Привет', 'new_review'
+        )
+        event, data = await self.next_event(customer_stream)
+        self.assertEqual((event, data['message'], data['is_read']), ('notification', 'Привет', False))
+
+        message = await sync_to_async(self.on_commit)(ChatService.send_message, self.repair.id, 'Когда?', self.customer)
+        # Уведомление о сообщении создает воркер outbox
+        await sync_to_async(self.on_commit)(OutboxService.process_pending)
+        # Работнику - само сообщение и уведомление о нем
+        events = dict([await self.next_event(worker_stream), await self.next_event(worker_stream)])
+        self.assertEqual(events['chat_message']['id'], message.id)
+        self.assertEqual(events['chat_message']['message'], 'Когда?')
+        self.assertEqual(events['notification']['type'], 'new_message')
+        # Отправителю (другие вкладки) - только сообщение
+        event, data = await self.next_event(customer_stream)
+        self.assertEqual((event, data['id']), ('chat_message', message.id))
+
+        await self.disconnect(customer_stream)
+        await self.disconnect(worker_stream)
+        self.assertEqual(EventService.bus.connections(), 0)
+
+    async def test_stream_requires_token_or_ticket(self):
+        response = await self.async_client.get('/api/events/stream', secure=True)
+        self.assertEqual(response.status_code, 401)
+        # Долгоживущий JWT в query string не принимается
+        token = str(AccessToken.for_user(self.worker))
+        for params in ({'token': token}, {'ticket': token}, {'ticket': 'broken'}):
+            response = await self.async_client.get('/api/events/stream', params, secure=True)
+            self.assertEqual(response.status_code, 401)
+
+        # EventSource не умеет заголовки - короткоживущий билет в query string
+        response = await sync_to_async(self.client.post)('/api/events/ticket', secure=True, **auth_headers(self.worker))
+        ticket = response.json()['ticket']
+        self.assertEqual(response.json()['expires_in'], settings.EVENTS_TICKET_TTL)
+        response = await self.async_client.get('/api/events/stream', {'ticket': ticket}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        await self.disconnect(aiter(response.streaming_content))
+
+        # Билет годится только для потока и только пока не истек
+        response = await sync_to_async(self.client.get)('/api/notifications/', secure=True,
+                                                        HTTP_AUTHORIZATION=f'Bearer {ticket}')
+        self.assertEqual(response.status_code, 401)
+        with override_settings(EVENTS_TICKET_TTL=0):
+            await asyncio.sleep(0.01)
+            response = await self.async_client.get('/api/events/stream', {'ticket': ticket}, secure=True)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_slow_subscriber_keeps_latest_events(self):
+        bus = EventBus(queue_size=2)
+        subscription = bus.subscribe(1)
+        for number in range(3):
+            await sync_to_async(bus.publish, thread_sensitive=False)([1, 2], 'notification', {'number': number})
+        await asyncio.sleep(0)
+
+        self.assertEqual(subscription.dropped, 1)
+        events = [subscription.queue.get_nowait() for _ in range(2)]
+        self.assertEqual([event['data']['number'] for event in events], [1, 2])
+        self.assertEqual(bus.stats()['delivered'], 3)
+        bus.unsubscribe(subscription)
+        self.assertEqual(bus.connections(), 0)
+
+    async def test_broker_relays_between_processes(self):
+        broker = EventBroker('tcp://127.0.0.1:0')
+        server = await broker.start()
+        url = 'tcp://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        # Два "процесса": публикует один, соединение открыто в другом
+        publisher, receiver = EventBus(broker_url=url), EventBus(broker_url=url)
+        subscription = receiver.subscribe(7)
+        while not broker.clients:
+            await asyncio.sleep(0.01)
+
+        await sync_to_async(publisher.publish, thread_sensitive=False)([7], 'notification', {'message': 'hi'})
+        event = await asyncio.wait_for(subscription.queue.get(), 2)
+        self.assertEqual(event['data'], {'message': 'hi'})
+        self.assertEqual(broker.forwarded, 1)
+
+        publisher.close()
+        receiver.close()
+        while broker.clients:
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+
+    async def test_outbox_worker_pushes_through_broker(self):
+        # Воркер outbox - отдельный процесс без SSE-подписчиков: без брокера он отказывается стартовать
+        with self.assertRaises(CommandError):
+            await sync_to_async(call_command)('run_outbox_worker', '--once', stdout=io.StringIO())
+
+        broker = EventBroker('tcp://127.0.0.1:0')
+        server = await broker.start()
+        url = 'tcp://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        web_bus, worker_bus = EventBus(broker_url=url), EventBus(broker_url=url)
+        subscription = web_bus.subscribe(self.customer.id)
+        while not broker.clients:
+            await asyncio.sleep(0.01)
+
+        repair = await sync_to_async(RepairRequest.objects.create)(
+            title='Стиралка', description='-', device_type='washer', address='-', created_by=self.customer
+        )
+        await sync_to_async(ResponseService.create_response)(repair.id, ResponseSchemaIn(message='Могу'), self.worker)
+        with mock.patch.object(EventService, 'bus', worker_bus):
+            await sync_to_async(self.on_commit)(OutboxService.process_pending)
+
+        event = await asyncio.wait_for(subscription.queue.get(), 2)
+        self.assertEqual((event['type'], event['data']['type']), ('notification', 'new_response'))
+        self.assertEqual(worker_bus.stats()['delivered'], 0)
+
+        web_bus.close()
+        worker_bus.close()
+        web_bus.unsubscribe(subscription)
+        while broker.clients:
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+
+    async def test_broker_requires_secret_and_loopback(self):
+        with self.assertRaises(ValueError):
+            await EventBroker('tcp://0.0.0.0:0').start()
+
+        broker = EventBroker('tcp://127.0.0.1:0')
+        server = await broker.start()
+        port = server.sockets[0].getsockname()[1]
+        # Клиент без секрета не может ни публиковать, ни читать
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'guess\n{"users": [7], "event": {"type": "notification", "data": {}}}\n')
+        await writer.drain()
+        self.assertEqual(await asyncio.wait_for(reader.read(), 2), b'')
+        writer.close()
+        self.assertEqual((broker.rejected, broker.forwarded, broker.clients), (1, 0, set()))
+
+        # Шина с другим секретом - тоже
+        bus = EventBus(broker_url=f'tcp://127.0.0.1:{port}', broker_secret='other')
+        subscription = bus.subscribe(7)
+        await sync_to_async(bus.publish, thread_sensitive=False)([7], 'notification', {})
+        # Отклонены и подписка процесса, и публикация
+        for _ in range(200):
+            if broker.rejected >= 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertGreaterEqual(broker.rejected, 3)
+        self.assertEqual(broker.forwarded, 0)
+        bus.close()
+        bus.unsubscribe(subscription)
+        server.close()
+        await server.wait_closed()
+
+
+class UnreadCountersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create(username='unread_customer')
+        self.worker = User.objects.create(username='unread_worker')
+        self.other_worker = User.objects.create(username='unread_other')
+        self.repair = RepairRequest.objects.create(
+            title='Стиралка', description='-', device_type='washer', address='-', created_by=self.customer
+        )
+        Response.objects.create(repair_request=self.repair, worker=self.worker, message='-', status='accepted')
+        Response.objects.create(repair_request=self.repair, worker=self.other_worker, message='-')
+
+    def unread(self, user):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/me/unread', secure=True, **auth_headers(user))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_chat_counters_follow_messages_and_reads(self):
+        for text in ('a', 'b', 'c'):
+            ChatService.send_message(self.repair.id, text, self.customer)
+        ChatService.send_message(self.repair.id, 'd', self.worker)
+        OutboxService.process_pending()
+
+        self.assertEqual(self.unread(self.customer)['chats'], [{'repair_request_id': self.repair.id, 'count': 1}])
+        data = self.unread(self.other_worker)
+        self.assertEqual((data['chats'][0]['count'], data['total_chat_messages']), (4, 4))
+        # Уведомление о сообщениях получает принятый работник - одно на серию
+        self.assertEqual(self.unread(self.worker)['notifications'], {'new_message': 1})
+
+        ChatService.mark_messages_as_read(self.repair.id, self.other_worker)
+        self.assertEqual(self.unread(self.other_worker)['chats'], [])
+        self.assertEqual(self.unread(self.worker)['total_chat_messages'], 3)
+
+    def test_notification_counters_per_type(self):
+        first = NotificationService.create_notification(self.worker, 'Принят', 'response_accepted')
+        NotificationService.create_notification(self.worker, 'Отзыв', 'new_review')
+        notifications = Notification.objects.bulk_create([
+            Notification(user=self.worker, message='Рядом заявка', notification_type='new_request') for _ in range(5)
+        ])
+        NotificationService.notifications_created(notifications)
+
+        data = self.unread(self.worker)
+        self.assertEqual(data['notifications'], {'new_request': 5, 'new_review': 1, 'response_accepted': 1})
+        self.assertEqual(data['total_notifications'], 7)
+
+        # Повторное прочтение не уменьшает счетчик еще раз
+        for _ in range(2):
+            NotificationService.mark_as_read(first.id, self.worker)
+        self.assertEqual(self.unread(self.worker)['notifications'], {'new_request': 5, 'new_review': 1})
+        self.assertEqual(self.unread(self.customer)['total_notifications'], 0)
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create(username='burst_customer')
+        self.worker = User.objects.create(username='burst_worker')
+        self.repairs = [
+            RepairRequest.objects.create(
+                title=f'Заявка {i}', description='-', device_type='oven', address='-', created_by=self.customer
+            )
+            for i in range(2)
+        ]
+        for repair in self.repairs:
+            Response.objects.create(repair_request=repair, worker=self.worker, message='-', status='accepted')
+
+    def test_burst_of_messages_is_one_row(self):
+        for i in range(30):
+            ChatService.send_message(self.repairs[0].id, f'msg {i}', self.customer)
+        ChatService.send_message(self.repairs[1].id, 'other chat', self.customer)
+        OutboxService.process_pending()
+
+        rows = list(Notification.objects.filter(user=self.worker).order_by('id').values_list('target', 'count'))
+        self.assertEqual(rows, [(f'chat:{self.repairs[0].id}', 30), (f'chat:{self.repairs[1].id}', 1)])
+        self.assertEqual(UnreadService.get_unread(self.worker)['notifications'], {'new_message': 2})
+
+    def test_read_or_old_notification_starts_new_row(self):
+        first = NotificationService.create_notification(self.worker, 'a', 'new_message', target='chat:1')
+        self.assertEqual(NotificationService.create_notification(self.worker, 'b', 'new_message', target='chat:1').id,
+                         first.id)
+
+        NotificationService.mark_as_read(first.id, self.worker)
+        second = NotificationService.create_notification(self.worker, 'c', 'new_message', target='chat:1')
+        self.assertNotEqual(second.id, first.id)
+
+        Notification.objects.filter(id=second.id).update(
+            created_at=timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW + 1)
+        )
+        third = NotificationService.create_notification(self.worker, 'd', 'new_message', target='chat:1')
+        self.assertNotIn(third.id, (first.id, second.id))
+        # Без target уведомления не склеиваются
+        plain = [NotificationService.create_notification(self.worker, 'e', 'new_review') for _ in range(2)]
+        self.assertNotEqual(plain[0].id, plain[1].id)
+
+    def test_coalesced_notification_returns_to_top(self):
+        first = NotificationService.create_notification(self.worker, 'a', 'new_message', target='chat:1')
+        Notification.objects.filter(id=first.id).update(
+            created_at=timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW - 5)
+        )
+        other = NotificationService.create_notification(self.worker, 'отзыв', 'new_review')
+
+        def first_page():
+            return self.client.get('/api/notifications/', {'limit': 2}, secure=True,
+                                   **auth_headers(self.worker)).json()['items']
+
+        self.assertEqual([item['id'] for item in first_page()], [other.id, first.id])
+        # Новое событие в том же чате: строка та же, но снова первая на первой странице
+        self.assertEqual(NotificationService.create_notification(self.worker, 'b', 'new_message', target='chat:1').id,
+                         first.id)
+        self.assertEqual([(item['id'], item['count']) for item in first_page()], [(first.id, 2), (other.id, 1)])
+        # Окно склейки теперь отсчитывается от этого события, а не от первого
+        self.assertGreater(Notification.objects.get(id=first.id).created_at, other.created_at)
+
+    def test_digest_mode_writes_once_per_interval(self):
+        digest = NotificationDigest(interval=60)
+        with mock.patch.object(NotificationService, 'digest', digest):
+            for i in range(5):
+                ChatService.send_message(self.repairs[i % 2].id, f'msg {i}', self.customer)
+            self.assertEqual(OutboxService.process_pending(), 5)
+            self.assertFalse(Notification.objects.filter(user=self.worker).exists())
+            # Отложенные уведомления - события outbox в базе, рестарт воркера их не теряет
+            delayed = OutboxEvent.objects.filter(event_type='notification_digest', status='pending')
+            self.assertEqual(delayed.count(), 5)
+            self.assertTrue(all(event.available_at > timezone.now() for event in delayed))
+
+            # Граница интервала: аренда пачки, затем одна транзакция на весь дайджест - поиск открытых
+            # строк, один INSERT, счетчики непрочитанного, отметка о выполнении (+ SAVEPOINT/RELEASE)
+            OutboxEvent.objects.update(available_at=timezone.now())
+            with self.assertNumQueries(13):
+                self.assertEqual(OutboxService.process_batch(), 5)
+        counts = dict(Notification.objects.filter(user=self.worker).values_list('target', 'count'))
+        self.assertEqual(counts, {f'chat:{self.repairs[0].id}': 3, f'chat:{self.repairs[1].id}': 2})
+        self.assertEqual(digest.stats(), {'added': 5, 'flushes': 1, 'written': 2})
+        self.assertFalse(OutboxEvent.objects.filter(status='pending').exists())
+
+        # Все события одного интервала становятся доступны одновременно
+        started = datetime(2026, 1, 1, 12, 0, 5, tzinfo=dt_timezone.utc)
+        self.assertEqual(digest.due_at(started), datetime(2026, 1, 1, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(digest.due_at(started + timedelta(seconds=54)), digest.due_at(started))
+
+
+class NotificationPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='busy_user')
+        self.other = User.objects.create(username='quiet_user')
+        notifications = Notification.objects.bulk_create([
+            Notification(user=self.user, message=f'n{i}', notification_type=('new_request', 'new_review')[i % 2],
+                         is_read=i % 3 == 0)
+            for i in range(45)
+        ])
+        # Часть с одинаковым created_at - курсор различает их по id
+        Notification.objects.filter(id__in=[n.id for n in notifications[:10]]).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        NotificationService.notifications_created(notifications)
+        self.foreign = NotificationService.create_notification(self.other, 'чужое', 'new_review')
+
+    def pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = {**params, 'limit': 20, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(2):
+                data = self.client.get('/api/notifications/', query, secure=True, **auth_headers(self.user)).json()
+            ids += [item['id'] for item in data['items']]
+            if not data['has_next']:
+                return ids
+            cursor = data['next_cursor']
+
+    def expected(self, **filters):
+        return list(Notification.objects.filter(user=self.user, **filters).order_by(
+            '-created_at', '-id').values_list('id', flat=True))
+
+    def test_cursor_pages_and_unread_only(self):
+        self.assertEqual(self.pages(), self.expected())
+        self.assertEqual(self.pages(unread_only=True), self.expected(is_read=False))
+
+        item = self.client.get('/api/notifications/', {'limit': 1}, secure=True, **auth_headers(self.user)).json()
+        self.assertEqual(set(item['items'][0]), {'id', 'message', 'is_read', 'created_at', 'type', 'target', 'count'})
+
+    def test_page_queries_use_indexes(self):
+        for filters, index in (({'is_read': False}, 'notification_unread_idx'),
+                               ({}, 'notification_user_created_idx')):
+            sql = str(CursorPaginationService.page_queryset(
+                Notification.objects.filter(user=self.user, **filters), limit=20
+            ).query)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_bulk_mark_read(self):
+        unread = self.expected(is_read=False)
+        headers = auth_headers(self.user)
+        response = self.client.post('/api/notifications/read', {'ids': unread[:5] + [self.foreign.id]},
+                                    content_type='application/json', secure=True, **headers)
+        self.assertEqual(response.json()['updated'], 5)
+        self.assertFalse(Notification.objects.get(id=self.foreign.id).is_read)
+        self.assertEqual(UnreadService.get_unread(self.user)['total_notifications'], len(unread) - 5)
+
+        response = self.client.post('/api/notifications/read-all', secure=True, **headers)
+        self.assertEqual(response.json()['updated'], len(unread) - 5)
+        self.assertEqual(self.expected(is_read=False), [])
+        self.assertEqual(UnreadService.get_unread(self.user)['total_notifications'], 0)
+        self.assertEqual(UnreadService.get_unread(self.other)['total_notifications'], 1)
+
+        response = self.client.post('/api/notifications/read', {'ids': list(range(501))},
+                                    content_type='application/json', secure=True, **headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_marking_same_ids_twice_decrements_once(self):
+        unread = self.expected(is_read=False)
+        ids = unread[:6]
+        self.assertEqual(NotificationService.mark_many_as_read(self.user, ids), 6)
+        self.assertEqual(NotificationService.mark_many_as_read(self.user, ids), 0)
+        self.assertEqual(UnreadService.get_unread(self.user)['total_notifications'], len(unread) - 6)
+
+        # Гонка: другая вкладка отмечает те же ids между чтением строк и UPDATE
+        ids = unread[6:12]
+        update, raced = QuerySet.update, []
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is Notification and not raced:
+                raced.append(True)
+                NotificationService.mark_many_as_read(self.user, ids)
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(NotificationService.mark_many_as_read(self.user, ids), 0)
+        self.assertEqual(UnreadService.get_unread(self.user)['total_notifications'], len(unread) - 12)
+        self.assertEqual(UnreadService.get_unread(self.user)['total_notifications'],
+                         len(self.expected(is_read=False)))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create(username='outbox_customer')
+        self.worker = User.objects.create(username='outbox_worker')
+        UserListService.get_or_create_user_lists(self.worker)
+        self.repair = RepairRequest.objects.create(
+            title='Холодильник', description='-', device_type='fridge', address='-', created_by=self.customer
+        )
+
+    def listed(self):
+        return set(ListItem.objects.filter(user_list__user=self.worker).values_list('user_list__name', flat=True))
+
+    def test_side_effects_run_in_worker(self):
+        response = ResponseService.create_response(self.repair.id, ResponseSchemaIn(message='Могу'), self.worker)
+        ChatService.send_message(self.repair.id, 'Здравствуйте', self.worker)
+        # Запрос записал только отклик, сообщение и события outbox
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(list(OutboxEvent.objects.values_list('event_type', flat=True).order_by('id')),
+                         ['response_created', 'chat_message_sent'])
+
+        self.assertEqual(OutboxService.process_pending(), 2)
+        self.assertEqual(set(Notification.objects.filter(user=self.customer).values_list('notification_type', flat=True)),
+                         {'new_response', 'new_message'})
+        self.assertEqual(self.listed(), {'watching'})
+        self.assertTrue(UserActivity.objects.filter(user=self.worker, activity_type='response_create').exists())
+
+        ResponseService.accept_response(response.id, self.customer)
+        RepairRequestService.complete_request(self.repair.id, self.customer)
+        self.assertEqual(OutboxService.process_pending(), 2)
+        self.assertTrue(Notification.objects.filter(user=self.worker, notification_type='response_accepted').exists())
+        self.assertEqual(self.listed(), {'completed'})
+        self.assertEqual(OutboxService.stats()['done'], 4)
+        self.assertEqual(OutboxService.process_pending(), 0)
+
+    def test_rolled_back_write_leaves_no_event(self):
+        Response.objects.create(repair_request=self.repair, worker=self.worker, message='-', status='accepted')
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                ChatService.send_message(self.repair.id, 'черновик', self.customer)
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertFalse(ChatMessage.objects.exists())
+
+    def test_failed_handler_is_rolled_back_and_retried(self):
+        ResponseService.create_response(self.repair.id, ResponseSchemaIn(message='Могу'), self.worker)
+        # Уведомление уже создано, потом падает перенос в список - откатывается все
+        with mock.patch('back.services.userlist_service.AutoListService.handle_response_created',
+                        side_effect=RuntimeError('lists are down')):
+            self.assertEqual(OutboxService.process_pending(), 1)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertIn('lists are down', event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertFalse(Notification.objects.exists())
+
+        # До available_at не берется, потом выполняется один раз
+        self.assertEqual(OutboxService.process_pending(), 0)
+        OutboxEvent.objects.update(available_at=timezone.now())
+        call_command('run_outbox_worker', '--once', '--without-broker', stdout=io.StringIO())
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts, event.last_error), ('done', 2, ''))
+        self.assertEqual(Notification.objects.filter(user=self.customer).count(), 1)
+        self.assertEqual(self.listed(), {'watching'})
+
+    def test_gives_up_after_max_attempts(self):
+        event = OutboxService.enqueue('request_completed', repair_request_id=self.repair.id)
+        with mock.patch('back.services.userlist_service.AutoListService.handle_request_completed',
+                        side_effect=RuntimeError):
+            for _ in range(settings.OUTBOX_MAX_ATTEMPTS):
+                OutboxEvent.objects.filter(id=event.id).update(available_at=timezone.now())
+                OutboxService.process_batch()
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', settings.OUTBOX_MAX_ATTEMPTS))
+        with self.assertRaises(ValueError):
+            OutboxService.enqueue('unknown')
+
+    def test_claimed_events_are_leased(self):
+        first = OutboxService.enqueue('request_completed', repair_request_id=self.repair.id)
+        second = OutboxService.enqueue('request_completed', repair_request_id=self.repair.id)
+        # Воркер взял пачку и упал, не выполнив ее: другие не берут события до конца аренды
+        self.assertEqual([event.id for event in OutboxService.claim()], [first.id, second.id])
+        self.assertEqual(OutboxService.process_pending(), 0)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        with mock.patch('back.services.userlist_service.AutoListService.handle_request_completed',
+                        side_effect=[RuntimeError, None]):
+            self.assertEqual(OutboxService.process_pending(), 2)
+        # Каждое событие отмечается отдельно: упавшее не откатило выполненное
+        self.assertEqual(dict(OutboxEvent.objects.values_list('id', 'status')),
+                         {first.id: 'pending', second.id: 'done'})
+
+    def test_check_reports_lagging_queue(self):
+        call_command('run_outbox_worker', '--check', stdout=io.StringIO())
+
+        event = OutboxService.enqueue('request_completed', repair_request_id=self.repair.id)
+        OutboxEvent.objects.filter(id=event.id).update(
+            created_at=timezone.now() - timedelta(seconds=settings.OUTBOX_ALERT_AGE + 60)
+        )
+        self.assertTrue(OutboxService.is_lagging())
+        with self.assertRaises(CommandError):
+            call_command('run_outbox_worker', '--check', stdout=io.StringIO())
+
+        OutboxService.process_pending()
+        call_command('run_outbox_worker', '--check', stdout=io.StringIO())
+
+
+class GeohashTests(TestCase):
+    def test_encode(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        lat_min, lat_max, lon_min, lon_max = geohash.decode_bounds('u4pruydqqvj')
+        self.assertTrue(lat_min <= 57.64911 < lat_max and lon_min <= 10.40744 < lon_max)
+
+    def test_geohash_maintained_on_save(self):
+        user = User.objects.create_user('hashuser', 'hash@test.com', 'testpass')
+        location = UserLocation.objects.create(user=user, latitude=57.64911, longitude=10.40744)
+        self.assertEqual(location.geohash, 'u4pruydqq')
+
+        location.latitude, location.longitude = 43.25, 76.95
+        location.save(update_fields=['latitude', 'longitude'])
+        location.refresh_from_db()
+        self.assertEqual(location.geohash, geohash.encode(43.25, 76.95))
+
+    def test_near_covers_whole_radius(self):
+        # Центр почти на границе ячеек, точки вокруг на разных расстояниях
+        center = (43.2421875, 76.9921875)
+        users = User.objects.bulk_create([User(username=f'hash{i}') for i in range(400)])
+        locations = []
+        for i, user in enumerate(users):
+            # Спираль: расстояния от 0 до ~20 км во всех направлениях
+            distance_km, angle = (i % 100) * 0.2, radians(i * 137.5)
+            location = UserLocation(
+                user=user,
+                latitude=center[0] + distance_km * cos(angle) / 111.32,
+                longitude=center[1] + distance_km * sin(angle) / (111.32 * cos(radians(center[0]))),
+            )
+            location.refresh_geohash()
+            locations.append(location)
+        UserLocation.objects.bulk_create(locations)
+
+        for radius in (1, 2, 3):
+            inside = {
+                loc.user_id for loc in locations
+                if DistanceService.haversine_km(*center, loc.latitude, loc.longitude) <= radius
+            }
+            candidates = set(UserLocation.objects.near(*center, radius).values_list('user_id', flat=True))
+            self.assertTrue(inside)
+            self.assertLessEqual(inside, candidates)
+            self.assertLess(len(candidates), len(locations))
@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Поток событий /api/events/stream (SSE) требует ASGI-сервера, например
+``uvicorn core.asgi:application --workers 4``: под WSGI каждое открытое соединение
+занимает поток. При нескольких процессах события между ними передает брокер:
+``python manage.py run_event_broker --url unix:///run/repair/events.sock``
+и тот же адрес в EVENTS_BROKER_URL у каждого процесса.
 """
 
 import os
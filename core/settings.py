@@ -97,6 +97,122 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Локальный кэш на процесс; при нескольких воркерах gunicorn стоит перейти на общий backend
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'repair-platform',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
+# Общий для всех процессов кэш 'shared' (Redis, в docker-compose - сервис redis): то, что сбрасывается
+# из других процессов (решения о доступе к чату). Без REDIS_URL алиаса нет и такие кэши выключены
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Время жизни кэша публичных списков заявок (секунды, 0 - без кэша)
+REPAIRS_CACHE_TIMEOUT = int(os.getenv('REPAIRS_CACHE_TIMEOUT', 300))
+
+# Граница устаревания индекса работников в памяти процесса (секунды, 0 - искать через БД)
+WORKER_INDEX_MAX_AGE = int(os.getenv('WORKER_INDEX_MAX_AGE', 60))
+
+# Кэш геокодирования 2GIS: LRU в памяти + таблица в БД (секунды, 0 - без кэша)
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', 3600))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 10000))
+
+# Запросы к 2GIS: таймаут попытки, число повторов и общий дедлайн вызова (секунды);
+# после DGIS_BREAKER_THRESHOLD неудачных вызовов подряд запросы не отправляются DGIS_BREAKER_RESET_TIMEOUT секунд
+DGIS_HTTP_TIMEOUT = float(os.getenv('DGIS_HTTP_TIMEOUT', 5))
+DGIS_HTTP_RETRIES = int(os.getenv('DGIS_HTTP_RETRIES', 2))
+DGIS_HTTP_DEADLINE = float(os.getenv('DGIS_HTTP_DEADLINE', 8))
+DGIS_BREAKER_THRESHOLD = int(os.getenv('DGIS_BREAKER_THRESHOLD', 5))
+DGIS_BREAKER_RESET_TIMEOUT = float(os.getenv('DGIS_BREAKER_RESET_TIMEOUT', 30))
+
+# Пакетное геокодирование: одновременные запросы и квота 2GIS (запросов в секунду, допустимый всплеск)
+DGIS_GEOCODE_CONCURRENCY = int(os.getenv('DGIS_GEOCODE_CONCURRENCY', 8))
+DGIS_RATE_LIMIT = float(os.getenv('DGIS_RATE_LIMIT', 10))
+DGIS_RATE_BURST = int(os.getenv('DGIS_RATE_BURST', 10))
+
+# Геокодирование адресов заявок: background - фоновым потоком процесса, manual - только команда geocode_repairs
+REPAIR_GEOCODING_MODE = os.getenv('REPAIR_GEOCODING_MODE', 'background')
+
+# Кэш поиска магазинов запчастей по тайлам (секунды, 0 - без кэша)
+PARTS_SHOPS_CACHE_TIMEOUT = int(os.getenv('PARTS_SHOPS_CACHE_TIMEOUT', 6 * 3600))
+
+# Индекс зон обслуживания (в каждом процессе, в т.ч. в воркере outbox) раз в CHECK_INTERVAL секунд
+# сверяет версию зон в БД и пересобирается после добавления или удаления зоны в любом процессе;
+# изменения координат и специализаций работников подхватывает не позже чем через MAX_AGE секунд
+SERVICE_AREA_INDEX_MAX_AGE = int(os.getenv('SERVICE_AREA_INDEX_MAX_AGE', 300))
+SERVICE_AREA_INDEX_CHECK_INTERVAL = float(os.getenv('SERVICE_AREA_INDEX_CHECK_INTERVAL', 5))
+# Наибольший радиус зоны обслуживания, км (API отвечает 400, индекс ограничивает радиус тем же значением)
+SERVICE_AREA_MAX_RADIUS_KM = int(os.getenv('SERVICE_AREA_MAX_RADIUS_KM', 100))
+
+# Рассылка новых заявок работникам (выполняет воркер outbox): радиус (км) и максимум получателей на заявку
+REPAIR_DISPATCH_RADIUS_KM = int(os.getenv('REPAIR_DISPATCH_RADIUS_KM', 10))
+REPAIR_DISPATCH_MAX_WORKERS = int(os.getenv('REPAIR_DISPATCH_MAX_WORKERS', 200))
+
+# Лента работника: полная перестройка индекса открытых заявок (секунды)
+REPAIR_FEED_INDEX_MAX_AGE = int(os.getenv('REPAIR_FEED_INDEX_MAX_AGE', 300))
+# Как часто подтягивать новые/измененные заявки по updated_at (секунды)
+REPAIR_FEED_REFRESH_INTERVAL = int(os.getenv('REPAIR_FEED_REFRESH_INTERVAL', 1))
+# Кэш оценок: сколько работников держать в памяти и сколько секунд
+REPAIR_FEED_CACHE_SIZE = int(os.getenv('REPAIR_FEED_CACHE_SIZE', 256))
+REPAIR_FEED_CACHE_TTL = int(os.getenv('REPAIR_FEED_CACHE_TTL', 300))
+
+# Маршрут работника: предельное время на улучшение 2-opt (мс) и максимум точек
+ROUTE_TIME_BUDGET_MS = int(os.getenv('ROUTE_TIME_BUDGET_MS', 500))
+ROUTE_MAX_STOPS = int(os.getenv('ROUTE_MAX_STOPS', 1000))
+
+# Кэш проверки доступа к чату по (заявка, пользователь), секунды (0 - проверять каждый раз).
+# Новый отклик и удаление заявки сбрасывают решение только в том кэше, где оно лежит, поэтому
+# CHAT_ACCESS_CACHE - алиас общего для всех процессов backend из CACHES (по умолчанию 'shared' - Redis);
+# если алиаса нет или это кэш в памяти процесса (LocMemCache), доступ проверяется каждый раз
+CHAT_ACCESS_CACHE = os.getenv('CHAT_ACCESS_CACHE', 'shared')
+CHAT_ACCESS_CACHE_TTL = int(os.getenv('CHAT_ACCESS_CACHE_TTL', 30))
+
+# Склейка повторяющихся уведомлений (чат, отклики на заявку) в одну строку со счетчиком, секунды (0 - выкл)
+NOTIFICATIONS_COALESCE_WINDOW = int(os.getenv('NOTIFICATIONS_COALESCE_WINDOW', 300))
+# Дайджест: такие уведомления откладываются событиями outbox и пишутся пачкой раз в интервал (секунды, 0 - сразу)
+NOTIFICATIONS_DIGEST_INTERVAL = int(os.getenv('NOTIFICATIONS_DIGEST_INTERVAL', 0))
+
+# Outbox: побочные эффекты записей выполняет отдельный процесс `python manage.py run_outbox_worker`
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+# Аренда взятой пачки: если воркер упал, ее события снова доступны через столько секунд
+OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', 300))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+# Повторы: пауза удваивается от OUTBOX_RETRY_DELAY до OUTBOX_MAX_RETRY_DELAY (секунды)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', 5))
+OUTBOX_MAX_RETRY_DELAY = int(os.getenv('OUTBOX_MAX_RETRY_DELAY', 3600))
+# Сколько хранить выполненные события (секунды)
+OUTBOX_RETENTION = int(os.getenv('OUTBOX_RETENTION', 24 * 3600))
+# Предупреждение (лог воркера, `run_outbox_worker --check`), если событие ждет дольше (секунды, 0 - выкл)
+OUTBOX_ALERT_AGE = int(os.getenv('OUTBOX_ALERT_AGE', 300))
+
+# Поток событий (SSE, только под ASGI): очередь на соединение и интервал ping (секунды)
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+EVENTS_KEEPALIVE = int(os.getenv('EVENTS_KEEPALIVE', 15))
+# Билет для EventSource (POST /api/events/ticket, затем /api/events/stream?ticket=), секунды
+EVENTS_TICKET_TTL = int(os.getenv('EVENTS_TICKET_TTL', 60))
+# Брокер для нескольких процессов (manage.py run_event_broker): unix:///path.sock или tcp://127.0.0.1:port.
+# Нужен и с одним процессом web: уведомления создает воркер outbox, без брокера он не запускается
+EVENTS_BROKER_URL = os.getenv('EVENTS_BROKER_URL', '')
+EVENTS_BROKER_TIMEOUT = int(os.getenv('EVENTS_BROKER_TIMEOUT', 2))
+# Общий секрет брокера для всех процессов (пусто - производный от SECRET_KEY)
+EVENTS_BROKER_SECRET = os.getenv('EVENTS_BROKER_SECRET', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 